@@ -1,12 +1,43 @@
+import json
+import logging
 import os
+from array import array
 from typing import Any
 
-from ai.clients import CohereClient
+from ai.answer_cache import ANSWER_CACHE
+from ai.clients import (
+    PARTIAL_ANSWER_MESSAGE,
+    PROVIDER_UNAVAILABLE_MESSAGE,
+    CohereClient,
+)
+from ai.deadline import Deadline, DeadlineExceeded, current_deadline, use_deadline
+from ai.metering import HARD_LIMITED, METER, NORMAL, current_organization
+from ai.prompts import DEGRADED_POLICY_ANSWER, POLICY_PROMPT, ROUTED_TOOL_PROMPT
 from ai.rag import RAGClient
-from ai.prompts import POLICY_PROMPT
+from ai.resilience import CHAT_CALL, CircuitOpenError
+from ai.router import IntentRouter
+from ai.speculation import SpeculativeRetrieval
+from ai.tools import is_personal_tool
+from ai.transcripts import TRANSCRIPTS
+from ai.utils import cosine_similarity, normalize_question
+from application.cache import TTLCache
+from application.metrics import METRICS
+from application.singleflight import SingleFlight
+from application.tracing import start_span
+
+logger = logging.getLogger(__name__)
 
 SESSION_MEMORY: dict[str, list[dict[str, str]]] = {}
 MAX_HISTORY = 20
+ANSWER_FLIGHT = SingleFlight("answer")
+# Last turn's retrieval per session: query vector plus candidate chunks and vectors.
+# Vectors are kept as float32 arrays (4 KB per 1024-dim vector instead of ~32 KB as
+# a list of floats), so an entry with 10 candidates takes roughly 50 KB.
+SESSION_RETRIEVAL = TTLCache(
+    ttl=float(os.getenv("AI_SESSION_RETRIEVAL_TTL_SECONDS", "1800")),
+    max_size=int(os.getenv("AI_SESSION_RETRIEVAL_SIZE", "1000")),
+)
+DEGRADED_ANSWER_PREFIX = DEGRADED_POLICY_ANSWER.split("{excerpts_text}")[0]
 POLICY_KEYWORDS = {
     "policy",
     "leave",
@@ -33,30 +64,208 @@ class PolicyAgent:
         question: str,
         session_id: str | None = None,
         user_id: str | None = None,
+        deadline: Deadline | None = None,
     ):
         self.question = question
         self.session_id = session_id
         self.user_id = user_id
+        self.deadline = deadline
         self.max_steps = int(os.getenv("AI_AGENT_MAX_STEPS", "8"))
+        self.use_router = os.getenv("AI_ROUTER_ENABLED", "false").lower() == "true"
+        self.speculative_retrieval = (
+            os.getenv("AI_SPECULATIVE_RETRIEVAL", "false").lower() == "true"
+        )
+        self.coalesce_answers = (
+            os.getenv("AI_COALESCE_ANSWERS", "false").lower() == "true"
+        )
+        self.cache_answers = (
+            os.getenv("AI_ANSWER_CACHE_ENABLED", "false").lower() == "true"
+        )
+        self.reuse_session_retrieval = (
+            os.getenv("AI_SESSION_RETRIEVAL_REUSE", "false").lower() == "true"
+        )
+        self.session_reuse_similarity = float(
+            os.getenv("AI_SESSION_REUSE_SIMILARITY", "0.75")
+        )
+        self.session_candidate_multiplier = int(
+            os.getenv("AI_SESSION_CANDIDATE_MULTIPLIER", "2")
+        )
+        self._query_vector: list[float] | None = None
+        # Over its daily token budget an organization gets cheaper answers: fewer
+        # excerpts, and past the hard budget no multi-step tool planning either.
+        self.budget_mode = METER.budget_mode(current_organization())
+        if self.budget_mode == HARD_LIMITED:
+            self.max_steps = min(
+                self.max_steps, int(os.getenv("AI_BUDGET_HARD_MAX_STEPS", "2"))
+            )
+            self.speculative_retrieval = False
         self.client = CohereClient(user_id=user_id)
 
+    def _top_k(self) -> int:
+        top_k = int(os.getenv("POLICY_RAG_TOP_K", "5"))
+        if self.budget_mode != NORMAL:
+            top_k = min(top_k, int(os.getenv("AI_BUDGET_TOP_K", "2")))
+        return top_k
+
     def _trim_history(self, history: list[dict[str, str]]) -> list[dict[str, str]]:
         if len(history) <= MAX_HISTORY:
             return history
         return history[-MAX_HISTORY:]
 
+    def _new_messages(
+        self,
+        previous: list[dict[str, str]],
+        history: list[dict[str, str]],
+        response_text: str,
+    ) -> list[dict[str, str]]:
+        """Messages this turn added on top of ``previous``."""
+        if history[: len(previous)] == previous:
+            return history[len(previous) :]
+        return [
+            {"role": "USER", "message": self.question},
+            {"role": "CHATBOT", "message": response_text},
+        ]
+
     def _is_policy_question(self, question: str) -> bool:
         lowered = question.lower()
         return any(keyword in lowered for keyword in POLICY_KEYWORDS)
 
+    def _is_retrieval_follow_up(self) -> bool:
+        """
+        A follow-up without policy keywords ("and for part-time staff?") that is
+        close to the policy question the session just asked.
+        """
+        if not (self.session_id and self.reuse_session_retrieval):
+            return False
+        if SESSION_RETRIEVAL.get(self.session_id) is None:
+            return False
+        try:
+            return self._similar_to_previous_retrieval(RAGClient(), self.question)
+        except Exception:
+            logger.exception("Could not compare follow-up with the previous retrieval")
+            return False
+
     def _answer_policy_question(
         self,
         question: str,
         history: list[dict[str, str]],
     ) -> tuple[str, list] | None:
         rag_client = RAGClient()
-        top_k = int(os.getenv("POLICY_RAG_TOP_K", "5"))
-        matches = rag_client.query_policy_index(question, top_k=top_k)
+        organization_ids = (
+            self.client.context.organization_ids if self.user_id else None
+        )
+        # Set when the router or the follow-up check already embedded the question.
+        query_vector = self._query_vector or None
+        if history or not (self.coalesce_answers or self.cache_answers):
+            result = self._generate_policy_answer(
+                rag_client, question, history, organization_ids, query_vector
+            )
+            return result[:2] if result else None
+
+        # Shared by everyone in the same organizations; answers built from a user's
+        # own data are never cached (see _generate_policy_answer).
+        namespace = (rag_client.embed_model, self._scope(organization_ids))
+        generation = ANSWER_CACHE.generation(organization_ids)
+        if self.cache_answers:
+            cached = ANSWER_CACHE.get(question, namespace, generation)
+            if cached is None and query_vector is None:
+                try:
+                    query_vector = next(
+                        iter(rag_client.embed_queries([question])), None
+                    )
+                except CircuitOpenError:
+                    return None
+                if query_vector:
+                    cached = ANSWER_CACHE.get_similar(
+                        query_vector, namespace, generation
+                    )
+            if cached is not None:
+                return cached, [
+                    {"role": "USER", "message": question},
+                    {"role": "CHATBOT", "message": cached},
+                ]
+
+        def generate():
+            return self._generate_policy_answer(
+                rag_client, question, history, organization_ids, query_vector
+            )
+
+        if self.coalesce_answers:
+            # Sessionless duplicates asked at the same moment within the same
+            # organizations share one retrieval + LLM run. An answer that may depend on
+            # who asked (e.g. it called the leader's get_my_* tools) is only handed to
+            # the same user; anyone else runs the question themselves.
+            deadline = current_deadline()
+            try:
+                owner, result = ANSWER_FLIGHT.do(
+                    (normalize_question(question), *namespace),
+                    lambda: (self.user_id, generate()),
+                    timeout=deadline.budget() if deadline else None,
+                )
+            except TimeoutError as exc:
+                raise DeadlineExceeded(
+                    "Deadline exceeded waiting for a shared answer"
+                ) from exc
+            if result is not None and not result[2] and owner != self.user_id:
+                METRICS.counter("answer_flight.personal_reruns").inc()
+                result = generate()
+        else:
+            result = generate()
+        if result is None:
+            return None
+        response_text, shared_history, cacheable = result
+        if (
+            self.cache_answers
+            and cacheable
+            and self._is_complete_answer(response_text, shared_history)
+        ):
+            ANSWER_CACHE.set(
+                question, namespace, generation, response_text, vector=query_vector
+            )
+        return response_text, list(shared_history)
+
+    def _scope(self, organization_ids: list[str] | None) -> tuple | None:
+        return tuple(sorted(organization_ids)) if organization_ids else None
+
+    def _is_complete_answer(
+        self, response_text: str, history: list[dict[str, str]]
+    ) -> bool:
+        """Errors and timeouts come back as text too; only a real model reply is cached."""
+        return (
+            bool(response_text)
+            and response_text != PARTIAL_ANSWER_MESSAGE
+            and bool(history)
+            and history[-1] == {"role": "CHATBOT", "message": response_text}
+        )
+
+    def _generate_policy_answer(
+        self,
+        rag_client: RAGClient,
+        question: str,
+        history: list[dict[str, str]],
+        organization_ids: list[str] | None,
+        query_vector: list[float] | None = None,
+    ) -> tuple[str, list, bool] | None:
+        """
+        Returns (answer, history, whether the answer may be cached): only model
+        replies that did not call a tool reading the user's own data are cached.
+        """
+        top_k = self._top_k()
+        try:
+            if self.session_id and self.reuse_session_retrieval:
+                matches = self._retrieve_for_session(
+                    rag_client, question, top_k, organization_ids, query_vector
+                )
+            else:
+                search_kwargs = {"query_vector": query_vector} if query_vector else {}
+                matches = rag_client.query_policy_index(
+                    question,
+                    top_k=top_k,
+                    organization_ids=organization_ids,
+                    **search_kwargs,
+                )
+        except CircuitOpenError:
+            return None
         if not matches:
             return None
 
@@ -72,38 +281,229 @@ class PolicyAgent:
             return None
 
         excerpts_text = os.linesep.join(excerpts)
+        if CHAT_CALL.breaker.is_open:
+            # Degraded mode: the chat provider is failing, so answer with the excerpts.
+            response_text = DEGRADED_POLICY_ANSWER.format(excerpts_text=excerpts_text)
+            return (
+                response_text,
+                [
+                    *history,
+                    {"role": "USER", "message": question},
+                    {"role": "CHATBOT", "message": response_text},
+                ],
+                False,
+            )
         prompt = POLICY_PROMPT.format(excerpts_text=excerpts_text, question=question)
+        if self.budget_mode == HARD_LIMITED:
+            response_text, history = self.client.generate(
+                message=prompt, chat_history=history
+            )
+            return response_text, history, True
+        personal_tools_used = self._track_personal_tools()
         response_text, history = self.client.ask_llm(
             message=prompt,
             chat_history=history,
             max_steps=self.max_steps,
         )
-        return response_text, history
+        return response_text, history, not personal_tools_used
 
-    def run(self) -> dict[str, Any]:
-        history = []
-        if self.session_id:
-            history = list(SESSION_MEMORY.get(self.session_id, []))
-        if self._is_policy_question(self.question):
+    def _track_personal_tools(self) -> list[str]:
+        """Wrap the user's personal tools; the returned list collects the ones called."""
+        used: list[str] = []
+
+        def _tracked(name, tool):
+            def _fn(**kwargs):
+                used.append(name)
+                return tool(**kwargs)
+
+            return _fn
+
+        for name, tool in list(self.client.function_map.items()):
+            if is_personal_tool(name):
+                self.client.function_map[name] = _tracked(name, tool)
+        return used
+
+    def _question_vector(self, rag_client: RAGClient, question: str) -> list[float]:
+        if self._query_vector is None:
+            self._query_vector = next(iter(rag_client.embed_queries([question])), [])
+        return self._query_vector
+
+    def _similar_to_previous_retrieval(
+        self, rag_client: RAGClient, question: str
+    ) -> bool:
+        """True when the session's last retrieval is close enough to serve this question."""
+        previous = SESSION_RETRIEVAL.get(self.session_id)
+        if previous is None or previous["embed_model"] != rag_client.embed_model:
+            return False
+        vector = self._question_vector(rag_client, question)
+        return (
+            cosine_similarity(vector, previous["query_vector"])
+            >= self.session_reuse_similarity
+        )
+
+    def _retrieve_for_session(
+        self,
+        rag_client: RAGClient,
+        question: str,
+        top_k: int,
+        organization_ids: list[str] | None,
+        query_vector: list[float] | None = None,
+    ) -> list[dict]:
+        """
+        Re-rank the previous turn's candidate chunks when the follow-up is close to the
+        previous query; otherwise search afresh and keep a wider candidate set.
+        """
+        if query_vector is not None:
+            self._query_vector = query_vector
+        scope = self._scope(organization_ids)
+        if self._similar_to_previous_retrieval(rag_client, question):
+            previous = SESSION_RETRIEVAL.get(self.session_id)
+            if previous and previous["scope"] == scope:
+                METRICS.counter("session_retrieval.reused").inc()
+                vector = self._question_vector(rag_client, question)
+                ranked = sorted(
+                    previous["matches"],
+                    key=lambda match: cosine_similarity(vector, match["embedding"]),
+                    reverse=True,
+                )
+                return [self._without_vectors(match) for match in ranked[:top_k]]
+
+        METRICS.counter("session_retrieval.searched").inc()
+        vector = self._question_vector(rag_client, question)
+        candidates = rag_client.query_policy_index(
+            question,
+            top_k=top_k * self.session_candidate_multiplier,
+            organization_ids=organization_ids,
+            query_vector=vector or None,
+            include_vectors=True,
+        )
+        if vector and candidates:
+            SESSION_RETRIEVAL.set(
+                self.session_id,
+                {
+                    "embed_model": rag_client.embed_model,
+                    "scope": scope,
+                    "query_vector": array("f", vector),
+                    "matches": [
+                        {**match, "embedding": array("f", match["embedding"])}
+                        for match in candidates
+                    ],
+                },
+            )
+        return [self._without_vectors(match) for match in candidates[:top_k]]
+
+    def _without_vectors(self, match: dict) -> dict:
+        return {key: value for key, value in match.items() if key != "embedding"}
+
+    def _answer_routed_question(
+        self,
+        question: str,
+        history: list[dict[str, str]],
+    ) -> tuple[str, list] | None:
+        router = IntentRouter(available_tools=self.client.function_map.keys())
+        decision = router.route(question)
+        if router.query_vector:
+            # Reused by the policy fallback instead of embedding the question again.
+            self._query_vector = router.query_vector
+        if decision is None:
+            return None
+
+        try:
+            output = self.client.function_map[decision.tool_name](**decision.parameters)
+        except Exception:
+            logger.exception("Routed tool %s failed", decision.tool_name)
+            return None
+
+        prompt = ROUTED_TOOL_PROMPT.format(
+            tool_name=decision.tool_name,
+            tool_output=json.dumps(output, default=str),
+            question=question,
+        )
+        return self.client.generate(message=prompt, chat_history=history)
+
+    def _respond(self, history: list[dict[str, str]]) -> tuple[str, list]:
+        routed_result = None
+        if self.use_router:
+            routed_result = self._answer_routed_question(self.question, history)
+        if routed_result:
+            return routed_result
+        if self._is_policy_question(self.question) or self._is_retrieval_follow_up():
             policy_result = self._answer_policy_question(self.question, history)
             if policy_result:
-                response_text, history = policy_result
-            else:
-                response_text, history = self.client.ask_llm(
-                    message=self.question,
-                    chat_history=history,
-                    max_steps=self.max_steps,
-                )
-        else:
-            response_text, history = self.client.ask_llm(
+                return policy_result
+            return self.client.ask_llm(
                 message=self.question,
                 chat_history=history,
                 max_steps=self.max_steps,
             )
+
+        speculation = None
+        if self.speculative_retrieval:
+            speculation = SpeculativeRetrieval(
+                self.question,
+                user_id=self.user_id,
+                top_k=self._top_k(),
+            )
+            speculation.install(self.client.function_map)
+        try:
+            return self.client.ask_llm(
+                message=self.question,
+                chat_history=history,
+                max_steps=self.max_steps,
+            )
+        finally:
+            if speculation:
+                speculation.discard()
+
+    def _is_degraded(self, response_text: str) -> bool:
+        """Partial, unavailable or excerpt-only answers, which a retry may improve on."""
+        deadline = current_deadline()
+        return (
+            response_text in (PARTIAL_ANSWER_MESSAGE, PROVIDER_UNAVAILABLE_MESSAGE)
+            or response_text.startswith(DEGRADED_ANSWER_PREFIX)
+            or (deadline is not None and deadline.expired)
+        )
+
+    def run(self) -> dict[str, Any]:
+        history = []
+        if self.session_id:
+            history = list(SESSION_MEMORY.get(self.session_id, []))
+        previous = list(history)
+        with (
+            use_deadline(self.deadline or current_deadline()),
+            start_span(
+                "agent.run",
+                session_id=self.session_id,
+                user_id=self.user_id,
+                question_chars=len(self.question),
+                history_messages=len(history),
+            ) as span,
+        ):
+            try:
+                response_text, history = self._respond(history)
+            except DeadlineExceeded:
+                span.set_attribute("deadline_exceeded", True)
+                response_text = PARTIAL_ANSWER_MESSAGE
+                history = [
+                    *history,
+                    {"role": "USER", "message": self.question},
+                    {"role": "CHATBOT", "message": response_text},
+                ]
+            span.set_attribute("response_chars", len(response_text or ""))
+            degraded = self._is_degraded(response_text or "")
+        METER.record(requests=1)
+        new_messages = self._new_messages(previous, history, response_text)
+        history_cursor = None
         if self.session_id:
             SESSION_MEMORY[self.session_id] = self._trim_history(history)
+            history_cursor = TRANSCRIPTS.append(
+                self.user_id, self.session_id, new_messages
+            )
         return {
             "response": response_text,
             "messages": history,
+            "new_messages": new_messages,
+            "history_cursor": history_cursor,
             "session_id": self.session_id,
+            "degraded": degraded,
         }
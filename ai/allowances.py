@@ -0,0 +1,66 @@
+import re
+
+from users.choices import LeaveType
+
+# Phrases a policy uses for each leave type, most specific first.
+LEAVE_TYPE_PATTERNS = {
+    LeaveType.SICK_LEAVE: r"sick(?:\s+leaves?|\s+days?)?|medical\s+leaves?",
+    LeaveType.PRIVILEGE_LEAVE: (
+        r"privilege(?:d)?\s+leaves?|earned\s+leaves?|annual\s+leaves?|"
+        r"paid\s+time\s+off|pto|vacation(?:\s+days?|\s+leaves?)?"
+    ),
+}
+PERIOD_PATTERN = r"(?:per|a|each|every|in\s+a)\s+(?:calendar\s+)?(year|annum|month)"
+NUMBER_PATTERN = r"(\d+(?:\.\d+)?)\s*(?:working\s+|calendar\s+|paid\s+)?days?"
+# Verbs that state an entitlement; a number of days anywhere else is usually a rule
+# ("a certificate is required for sick leave of more than 3 days"), not an allowance.
+ENTITLEMENT_VERBS = (
+    r"(?:are|is)\s+entitled\s+to|entitled\s+to|receives?|accrues?(?:\s+at)?|"
+    r"(?:are|is)\s+granted|gets?"
+)
+QUANTIFIER = r"(?:up\s+to\s+|a\s+total\s+of\s+)?"
+# Words that introduce a condition ("certificate after 2 days") rather than an allowance.
+CONDITION_WORDS = r"after|within|beyond|exceed|more\s+than|consecutive|notice"
+MAX_GAP = rf"(?:(?!{CONDITION_WORDS})[^.;\n]){{0,60}}?"
+
+
+def _period(match: str | None) -> str:
+    if match and match.lower() == "month":
+        return "month"
+    return "year"
+
+
+def extract_leave_allowances(text: str) -> list[dict]:
+    """
+    Pull "leave type -> days per period" statements out of a policy document. Only
+    entitlements are read: "Employees receive 12 days of sick leave per year",
+    "Earned leave accrues at 1.5 days per month", or a "Privilege leave: 1.5 days per
+    month" label with its period. Returns at most one allowance per leave type (the
+    first one stated).
+    """
+    allowances: dict[LeaveType, dict] = {}
+    for leave_type, type_pattern in LEAVE_TYPE_PATTERNS.items():
+        patterns = [
+            # "are entitled to 12 days of sick leave per year"
+            rf"\b(?:{ENTITLEMENT_VERBS})\s+{QUANTIFIER}{NUMBER_PATTERN}\s+(?:of\s+)?"
+            rf"(?:{type_pattern})(?:{MAX_GAP}{PERIOD_PATTERN})?",
+            # "Earned leave accrues at 1.5 days per month"
+            rf"(?:{type_pattern})\s+(?:{ENTITLEMENT_VERBS})\s+{QUANTIFIER}"
+            rf"{NUMBER_PATTERN}\s*(?:{PERIOD_PATTERN})?",
+            # "Sick leave: 12 days per year"
+            rf"(?:{type_pattern})\s*:\s*{NUMBER_PATTERN}\s*{PERIOD_PATTERN}",
+        ]
+        found = []
+        for pattern in patterns:
+            for match in re.finditer(pattern, text, flags=re.IGNORECASE):
+                found.append(match)
+        if not found:
+            continue
+        match = min(found, key=lambda m: m.start())
+        allowances[leave_type] = {
+            "leave_type": leave_type,
+            "days": float(match.group(1)),
+            "period": _period(match.group(2)),
+            "source_text": match.group(0).strip(),
+        }
+    return list(allowances.values())
@@ -0,0 +1,132 @@
+import math
+import os
+import threading
+import time
+from array import array
+from typing import Hashable
+
+from ai.utils import normalize_question
+from application.cache import TTLCache
+from application.metrics import METRICS
+
+
+class AnswerCache:
+    """
+    Two-tier cache of generated policy answers. Tier one matches the normalized
+    question exactly; tier two matches earlier questions whose embedding is at least
+    ``similarity_threshold`` similar. Keys include the policy index generation of the
+    organizations in scope, so reindexing or removing a policy retires their answers.
+    The semantic tier keeps at most ``max_candidates`` answers per namespace and
+    generation, so a miss compares against a bounded set rather than every entry.
+    """
+
+    def __init__(
+        self,
+        ttl: float | None = None,
+        max_size: int | None = None,
+        similarity_threshold: float | None = None,
+        max_candidates: int | None = None,
+    ):
+        self.ttl = (
+            ttl
+            if ttl is not None
+            else float(os.getenv("AI_ANSWER_CACHE_TTL_SECONDS", "3600"))
+        )
+        max_size = max_size or int(os.getenv("AI_ANSWER_CACHE_SIZE", "1000"))
+        self.similarity_threshold = similarity_threshold or float(
+            os.getenv("AI_ANSWER_CACHE_SIMILARITY", "0.95")
+        )
+        self.max_candidates = max_candidates or int(
+            os.getenv("AI_ANSWER_CACHE_SEMANTIC_CANDIDATES", "64")
+        )
+        self._exact = TTLCache(ttl=self.ttl, max_size=max_size)
+        # (namespace, generation) -> ((question, expires_at, vector, norm, answer), ...)
+        self._semantic = TTLCache(ttl=self.ttl, max_size=max_size)
+        self._generations: dict[str, int] = {}
+        self._global_generation = 0
+        self._lock = threading.Lock()
+
+    def generation(self, organization_ids: list[str] | None) -> tuple:
+        """Current index generation for a retrieval scope (``None`` = every organization)."""
+        with self._lock:
+            if not organization_ids:
+                return ("*", self._global_generation)
+            return tuple(
+                (org_id, self._generations.get(org_id, 0))
+                for org_id in sorted(organization_ids)
+            )
+
+    def invalidate(self, organization_ids: list[str] | None = None) -> None:
+        """Retire answers built from these organizations' policies (all when ``None``)."""
+        with self._lock:
+            self._global_generation += 1
+            for org_id in organization_ids or []:
+                self._generations[org_id] = self._generations.get(org_id, 0) + 1
+        if organization_ids is None:
+            self._exact.clear()
+            self._semantic.clear()
+
+    def get(self, question: str, namespace: Hashable, generation: tuple) -> str | None:
+        answer = self._exact.get((normalize_question(question), namespace, generation))
+        METRICS.counter(f"answer_cache.exact_{'hits' if answer else 'misses'}").inc()
+        return answer
+
+    def get_similar(
+        self, vector: list[float], namespace: Hashable, generation: tuple
+    ) -> str | None:
+        best_score, best_answer = self.similarity_threshold, None
+        candidates = self._semantic.get((namespace, generation), ())
+        norm = math.sqrt(sum(value * value for value in vector))
+        now = time.monotonic()
+        for _, expires_at, entry_vector, entry_norm, answer in candidates:
+            if expires_at <= now or not norm or not entry_norm:
+                continue
+            dot = sum(a * b for a, b in zip(vector, entry_vector))
+            score = dot / (norm * entry_norm)
+            if score >= best_score:
+                best_score, best_answer = score, answer
+        METRICS.counter(
+            f"answer_cache.semantic_{'hits' if best_answer else 'misses'}"
+        ).inc()
+        return best_answer
+
+    def set(
+        self,
+        question: str,
+        namespace: Hashable,
+        generation: tuple,
+        answer: str,
+        vector: list[float] | None = None,
+    ) -> None:
+        normalized = normalize_question(question)
+        self._exact.set((normalized, namespace, generation), answer)
+        if not vector:
+            return
+        now = time.monotonic()
+        entry = (
+            normalized,
+            now + self.ttl,
+            array("f", vector),
+            math.sqrt(sum(value * value for value in vector)),
+            answer,
+        )
+        bucket_key = (namespace, generation)
+        with self._lock:
+            candidates = [
+                candidate
+                for candidate in self._semantic.get(bucket_key, ())
+                if candidate[0] != normalized and candidate[1] > now
+            ]
+            candidates.append(entry)
+            # Readers scan the tuple without a lock; writers replace it whole.
+            self._semantic.set(bucket_key, tuple(candidates[-self.max_candidates :]))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generations.clear()
+            self._global_generation = 0
+        self._exact.clear()
+        self._semantic.clear()
+
+
+ANSWER_CACHE = AnswerCache()
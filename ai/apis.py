@@ -1,14 +1,135 @@
+import os
 import uuid
+from datetime import date
 
-from fastapi import Depends, Query, status
-from sqlalchemy.orm import Session
+from fastapi import Depends, Header, HTTPException, Query, Request, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from ai.agent import PolicyAgent
-from ai.db import PolicyEmbedding
-from ai.models import QNARequestBody, QNAResponseBody
+from ai.context import get_agent_context
+from ai.db import OrganizationUsage, PolicyEmbedding
+from ai.deadline import Deadline, use_deadline
+from ai.metering import METER, metering_organization
+from ai.models import QNARequestBody, QNAResponseBody, SessionMessagesResponse
+from ai.transcripts import TRANSCRIPTS
+from application.admission import (
+    AdmissionRejected,
+    FairAdmissionQueue,
+    RateLimiter,
+    retry_after_header,
+)
 from application.app import app
+from application.executors import AI_LANE, run_in_lane
+from application.idempotency import (
+    IDEMPOTENCY_KEY_HEADER,
+    IdempotencyStore,
+    Unstored,
+    request_fingerprint,
+    validate_idempotency_key,
+)
 from auth.dependencies import require_authenticated_user
 from database.db import get_db
+from users.utils import require_admin
+
+AI_ADMISSION = FairAdmissionQueue(
+    "ai",
+    max_concurrency=int(os.getenv("AI_MAX_CONCURRENT_RUNS", "8")),
+    max_queue=int(os.getenv("AI_MAX_QUEUED_RUNS", "100")),
+    retry_after=float(os.getenv("AI_ADMISSION_RETRY_AFTER_SECONDS", "5")),
+)
+AI_IDEMPOTENCY = IdempotencyStore(
+    "ai", ttl=float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+)
+AI_USER_RATE_LIMIT = RateLimiter(
+    "ai.user",
+    rate_per_minute=float(os.getenv("AI_USER_RATE_PER_MINUTE", "30")),
+    burst=float(os.getenv("AI_USER_RATE_BURST", "10")),
+)
+AI_ORG_RATE_LIMIT = RateLimiter(
+    "ai.organization",
+    rate_per_minute=float(os.getenv("AI_ORG_RATE_PER_MINUTE", "0")),
+    burst=float(os.getenv("AI_ORG_RATE_BURST", "50")),
+)
+
+
+def _run_agent(
+    deadline: Deadline,
+    question: str,
+    session_id: str,
+    user_id: str | None,
+    organization_id: str | None = None,
+):
+    with use_deadline(deadline), metering_organization(organization_id):
+        return PolicyAgent(
+            question=question,
+            session_id=session_id,
+            user_id=user_id,
+        ).run()
+
+
+def _organization_ids(user_id: str) -> list[str]:
+    """Runs in the AI lane: without membership claims the lookup queries the database."""
+    return sorted(get_agent_context(user_id).organization_ids)
+
+
+async def _answer(
+    request: QNARequestBody, user_id: str | None, request_timeout: float | None
+) -> tuple[dict, bool]:
+    """Returns the response body and whether the answer is degraded."""
+    session_id = request.session_id or str(uuid.uuid4())
+    timeout = float(os.getenv("AI_REQUEST_TIMEOUT_SECONDS", "30"))
+    if request_timeout is not None:
+        timeout = min(timeout, request_timeout)
+    deadline = Deadline(timeout)
+
+    organization_ids = []
+    if user_id:
+        organization_ids = await run_in_lane(AI_LANE, _organization_ids, user_id)
+    organization_id = organization_ids[0] if organization_ids else None
+    retry_after = AI_USER_RATE_LIMIT.check(user_id)
+    if not retry_after:
+        retry_after = AI_ORG_RATE_LIMIT.check(organization_id)
+        if retry_after:
+            # A request the organization limit rejects does not use up the user's quota.
+            AI_USER_RATE_LIMIT.refund(user_id)
+    if retry_after:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many AI requests; please retry later.",
+            headers=retry_after_header(retry_after),
+        )
+
+    try:
+        async with AI_ADMISSION.slot(
+            organization_id, user_id, timeout=deadline.remaining()
+        ):
+            result = await run_in_lane(
+                AI_LANE,
+                _run_agent,
+                deadline,
+                request.question,
+                session_id,
+                user_id,
+                organization_id,
+            )
+    except AdmissionRejected as exc:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="The assistant is busy; please retry shortly.",
+            headers=retry_after_header(exc.retry_after),
+        ) from exc
+    messages = result.get("messages")
+    if request.response_mode == "delta":
+        messages = result.get("new_messages", messages)
+    body = {
+        "question": request.question,
+        "response": result["response"],
+        "session_id": result.get("session_id") or session_id,
+        "messages": messages,
+        "history_cursor": result.get("history_cursor"),
+    }
+    return body, bool(result.get("degraded"))
 
 
 @app.post(
@@ -20,26 +141,66 @@ from database.db import get_db
 async def ai_assistant(
     request: QNARequestBody,
     current_user=Depends(require_authenticated_user),
+    request_timeout: float | None = Header(None, alias="X-Request-Timeout", gt=0),
+    idempotency_key: str | None = Header(None, alias=IDEMPOTENCY_KEY_HEADER),
 ) -> QNAResponseBody:
     """
     Payload for the endpoint:
     {
         "question": "give me date of birth of Dr. ruso lamba"
     }
+
+    With "response_mode": "delta" the response carries only the messages added this
+    turn plus ``history_cursor``; earlier messages come from
+    GET /ai_assistant/sessions/{session_id}/messages.
+
+    The optional X-Request-Timeout header (seconds) shortens the answer deadline
+    below AI_REQUEST_TIMEOUT_SECONDS so the agent stops before the client gives up.
+
+    Runs are rate limited per user (and optionally per organization) and admitted
+    through a bounded, fair queue; the agent itself runs in the AI executor lane,
+    with its own threads and DB connections, so it cannot starve CRUD endpoints.
+
+    Retries that repeat an Idempotency-Key get the first response back (waiting
+    for it if it is still running) instead of running the agent again. Partial or
+    degraded answers are not kept, so a retry after a timeout or outage reruns it.
     """
-    session_id = request.session_id or str(uuid.uuid4())
     user_id = current_user.user_id if current_user else None
-    result = PolicyAgent(
-        question=request.question,
-        session_id=session_id,
-        user_id=user_id,
-    ).run()
-    return {
-        "question": request.question,
-        "response": result["response"],
-        "session_id": result.get("session_id") or session_id,
-        "messages": result.get("messages"),
-    }
+    validate_idempotency_key(idempotency_key)
+    if idempotency_key is None:
+        body, _ = await _answer(request, user_id, request_timeout)
+        return body
+
+    async def handler():
+        body, degraded = await _answer(request, user_id, request_timeout)
+        return Unstored(body) if degraded else body
+
+    return await AI_IDEMPOTENCY.respond(
+        (user_id, idempotency_key),
+        request_fingerprint(request),
+        handler,
+    )
+
+
+@app.get(
+    "/ai_assistant/sessions/{session_id}/messages",
+    response_model=SessionMessagesResponse,
+)
+async def get_session_messages(
+    session_id: str,
+    cursor: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=200),
+    current_user=Depends(require_authenticated_user),
+):
+    """
+    Full history of one of the caller's assistant sessions, ``limit`` messages
+    from ``cursor`` on; follow ``next_cursor`` until it is null.
+    """
+    user_id = current_user.user_id if current_user else None
+    page = TRANSCRIPTS.page(user_id, session_id, cursor=cursor, limit=limit)
+    if page is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return page
 
 
 @app.get("/ai/policy-embeddings")
@@ -48,16 +209,18 @@ async def get_policy_embeddings(
     organization_id: str | None = None,
     limit: int = Query(50, ge=1, le=200),
     offset: int = Query(0, ge=0),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
-    query = db.query(PolicyEmbedding)
+    query = select(PolicyEmbedding)
     if policy_id:
-        query = query.filter(PolicyEmbedding.policy_id == policy_id)
+        query = query.where(PolicyEmbedding.policy_id == policy_id)
     if organization_id:
-        query = query.filter(PolicyEmbedding.organization_id == organization_id)
+        query = query.where(PolicyEmbedding.organization_id == organization_id)
     rows = (
-        query.order_by(PolicyEmbedding.created.desc()).offset(offset).limit(limit).all()
-    )
+        await db.scalars(
+            query.order_by(PolicyEmbedding.created.desc()).offset(offset).limit(limit)
+        )
+    ).all()
     embeddings = []
     for row in rows:
         item = {
@@ -79,3 +242,57 @@ async def get_policy_embeddings(
         "limit": limit,
         "offset": offset,
     }
+
+
+@app.get("/admin/ai_usage")
+async def get_ai_usage(
+    request: Request,
+    organization_id: str | None = None,
+    start: date | None = None,
+    end: date | None = None,
+    db: AsyncSession = Depends(get_db),
+):
+    """Daily provider usage per organization (admins only), newest day first."""
+    require_admin(request.user.user_type)
+    await run_in_lane(AI_LANE, METER.flush)
+    query = select(OrganizationUsage)
+    if organization_id:
+        try:
+            query = query.where(
+                OrganizationUsage.organization_id == uuid.UUID(organization_id)
+            )
+        except ValueError:
+            raise HTTPException(status_code=422, detail="Invalid organization_id")
+    if start:
+        query = query.where(OrganizationUsage.day >= start)
+    if end:
+        query = query.where(OrganizationUsage.day <= end)
+    rows = (
+        await db.scalars(
+            query.order_by(
+                OrganizationUsage.day.desc(), OrganizationUsage.organization_id
+            )
+        )
+    ).all()
+    return {
+        "items": [
+            {
+                "organization_id": str(row.organization_id),
+                "day": row.day,
+                "requests": row.requests,
+                "chat_calls": row.chat_calls,
+                "input_tokens": row.input_tokens,
+                "output_tokens": row.output_tokens,
+                "embed_calls": row.embed_calls,
+                "embed_texts": row.embed_texts,
+                "embed_tokens": row.embed_tokens,
+                "provider_latency_ms": row.provider_latency_ms,
+            }
+            for row in rows
+        ],
+        "total": len(rows),
+        "budgets": {
+            "soft_daily_tokens": METER.soft_budget or None,
+            "hard_daily_tokens": METER.hard_budget or None,
+        },
+    }
@@ -0,0 +1,124 @@
+import os
+import threading
+import uuid
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from ai.utils import estimate_tokens
+from application.cache import TTLCache
+from application.metrics import METRICS
+from database.db import SessionLocal
+from organizations.models import Organization, Policy
+
+# Tools whose answers the catalog already contains for the user's organizations.
+CATALOG_TOOLS = (
+    "get_my_organization_details",
+    "get_policies_for_organization",
+    "get_policy_details",
+)
+NO_ORGANIZATION_CATALOG = "The user does not belong to any organization."
+
+CATALOGS = TTLCache(
+    ttl=float(os.getenv("AI_CATALOG_TTL_SECONDS", "300")),
+    max_size=int(os.getenv("AI_CATALOG_CACHE_SIZE", "1000")),
+)
+_generation = 0
+_generation_lock = threading.Lock()
+
+
+def _field(label: str, value) -> str | None:
+    return f"{label}: {value}" if value else None
+
+
+def build_catalog(organization_ids: list[str]) -> str:
+    """Compact text listing the organizations and their active policies."""
+    if not organization_ids:
+        return NO_ORGANIZATION_CATALOG
+    ids = [uuid.UUID(str(org_id)) for org_id in organization_ids]
+    with SessionLocal() as db:
+        organizations = db.scalars(
+            select(Organization)
+            .where(Organization.id.in_(ids))
+            .order_by(Organization.name)
+        ).all()
+        policies = db.scalars(
+            select(Policy)
+            .where(
+                Policy.organization_id.in_(ids),
+                Policy.is_active.is_(True),
+            )
+            .order_by(Policy.name)
+        ).all()
+    by_organization: dict[str, list[Policy]] = {}
+    for policy in policies:
+        by_organization.setdefault(str(policy.organization_id), []).append(policy)
+
+    lines = []
+    for org in organizations:
+        details = [
+            _field("description", org.description),
+            _field("address", org.address),
+            _field("email", org.email),
+            _field("phone", org.phone),
+        ]
+        lines.append(
+            f"- Organization {org.name}"
+            + "".join(f"; {detail}" for detail in details if detail)
+        )
+        org_policies = by_organization.get(str(org.id), [])
+        if not org_policies:
+            lines.append("  - No active policies.")
+        for policy in org_policies:
+            line = f"  - Policy {policy.name}"
+            if policy.description:
+                line += f": {policy.description}"
+            if policy.document_name:
+                line += f" (document: {policy.document_name})"
+            lines.append(line)
+    return "\n".join(lines)
+
+
+def get_catalog(organization_ids: list[str], token_budget: int) -> str | None:
+    """Cached catalog for these organizations, or None when it exceeds the budget."""
+    key = tuple(sorted(organization_ids))
+    catalog = CATALOGS.get(key)
+    if catalog is None:
+        METRICS.counter("ai.catalog.miss").inc()
+        generation = _generation
+        catalog = build_catalog(list(key))
+        with _generation_lock:
+            # A commit during the build may have changed what we just read.
+            if generation == _generation:
+                CATALOGS.set(key, catalog)
+    else:
+        METRICS.counter("ai.catalog.hit").inc()
+    if estimate_tokens(catalog) > token_budget:
+        METRICS.counter("ai.catalog.over_budget").inc()
+        return None
+    return catalog
+
+
+def invalidate_catalogs() -> None:
+    global _generation
+    with _generation_lock:
+        _generation += 1
+        CATALOGS.clear()
+
+
+@event.listens_for(Session, "after_flush")
+def _note_catalog_changes(session, flush_context):
+    changed = (*session.new, *session.dirty, *session.deleted)
+    if any(isinstance(obj, (Organization, Policy)) for obj in changed):
+        session.info["catalog_changed"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session):
+    if session.info.pop("catalog_changed", False):
+        invalidate_catalogs()
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_after_rollback(session):
+    session.info.pop("catalog_changed", None)
@@ -1,11 +1,35 @@
+import logging
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from contextvars import copy_context
 
 import cohere
 
-from ai.prompts import PREAMBLE
-from ai.tools import AI_TOOLS, get_ai_function_map
-from organizations.constants import get_organization_function_map
-from organizations.tools import ORGANIZATION_TOOLS
+from ai.catalog import CATALOG_TOOLS, get_catalog
+from ai.compaction import compact_tool_output, payload_size
+from ai.context import get_agent_context
+from ai.deadline import DeadlineExceeded, current_deadline
+from ai.metering import METER
+from ai.prompts import CATALOG_PREAMBLE, PREAMBLE
+from ai.provider import get_cohere_client
+from ai.resilience import CHAT_CALL, CircuitOpenError
+from application.tracing import start_span
+
+logger = logging.getLogger(__name__)
+
+PARTIAL_ANSWER_MESSAGE = (
+    "I ran out of time before I could finish answering. Please try again or "
+    "ask a more specific question."
+)
+PROVIDER_UNAVAILABLE_MESSAGE = (
+    "The assistant is temporarily unavailable. Please try again in a few minutes."
+)
+TOOL_EXECUTOR = ThreadPoolExecutor(
+    max_workers=int(os.getenv("AI_TOOL_WORKERS", "8")),
+    thread_name_prefix="ai-tool",
+)
 
 
 class CohereClient:
@@ -15,57 +39,142 @@ class CohereClient:
         model: str | None = None,
         user_id: str | None = None,
     ):
-        self.client = cohere.Client(os.getenv("COHERE_API_KEY"))
+        self.client = get_cohere_client()
         self.model = model or os.getenv("COHERE_LLM_MODEL")
         self.preamble = PREAMBLE
-        self.function_map = {
-            **get_organization_function_map(user_id=user_id),
-            **get_ai_function_map(user_id=user_id),
-        }
-        tools = [*ORGANIZATION_TOOLS, *AI_TOOLS]
-        if user_id is None:
-            tools = [
-                t
-                for t in tools
-                if t.get("name")
-                not in (
-                    "get_my_organization_details",
-                    "search_my_organization_policies",
-                    "get_my_pending_leaves",
-                )
-            ]
-        self.tools = tools
+        self.context = get_agent_context(user_id)
+        # Copied so per-request overrides (e.g. speculative retrieval) stay local.
+        self.function_map = dict(self.context.function_map)
+        self.tools = self.context.tools
+        self.catalog = None
+        if (
+            user_id is not None
+            and os.getenv("AI_PREAMBLE_CATALOG", "false").lower() == "true"
+        ):
+            self._use_catalog()
         self.message = message or ""
+        self.compact_tool_outputs = (
+            os.getenv("AI_TOOL_OUTPUT_COMPACTION", "true").lower() == "true"
+        )
+        self.compaction_stats: list[dict[str, int]] = []
+        self.provider_timeout = float(os.getenv("AI_PROVIDER_TIMEOUT_SECONDS", "60"))
+        self.tool_timeout = float(os.getenv("AI_TOOL_TIMEOUT_SECONDS", "10"))
+
+    def _use_catalog(self) -> None:
+        """
+        Put the user's organizations and policies in the preamble when they fit the
+        token budget, and drop the tools that would only look them up.
+        """
+        budget = int(os.getenv("AI_PREAMBLE_CATALOG_TOKEN_BUDGET", "400"))
+        self.catalog = get_catalog(self.context.organization_ids, budget)
+        if self.catalog is None:
+            return
+        self.preamble = PREAMBLE + CATALOG_PREAMBLE.format(catalog=self.catalog)
+        self.tools = [tool for tool in self.tools if tool["name"] not in CATALOG_TOOLS]
 
     def chat(
         self,
         message: str,
         tool_results: list | None = None,
         chat_history: list | None = None,
+        use_tools: bool = True,
     ) -> str:
-        response = self.client.chat(
-            message=message,
-            tools=self.tools,
-            preamble=self.preamble,
+        kwargs = {"tools": self.tools} if use_tools else {}
+        with start_span(
+            "llm.chat",
             model=self.model,
-            tool_results=tool_results,
-            chat_history=chat_history,
-        )
+            use_tools=use_tools,
+            message_chars=len(message or ""),
+            history_messages=len(chat_history or []),
+            tool_results=len(tool_results or []),
+            tool_results_bytes=payload_size(tool_results) if tool_results else 0,
+        ) as span:
+            started = time.perf_counter()
+            response = CHAT_CALL.call(
+                lambda timeout: self.client.chat(
+                    message=message,
+                    preamble=self.preamble,
+                    model=self.model,
+                    tool_results=tool_results,
+                    chat_history=chat_history,
+                    request_options={"timeout_in_seconds": timeout, "max_retries": 0},
+                    **kwargs,
+                ),
+                timeout_cap=self.provider_timeout,
+            )
+            latency_ms = (time.perf_counter() - started) * 1000
+            billed = getattr(getattr(response, "meta", None), "billed_units", None)
+            input_tokens = getattr(billed, "input_tokens", None)
+            output_tokens = getattr(billed, "output_tokens", None)
+            METER.record(
+                chat_calls=1,
+                input_tokens=input_tokens,
+                output_tokens=output_tokens,
+                provider_latency_ms=latency_ms,
+            )
+            span.set_attributes(
+                input_tokens=input_tokens,
+                output_tokens=output_tokens,
+                tool_calls=len(getattr(response, "tool_calls", None) or []),
+                response_chars=len(getattr(response, "text", None) or ""),
+            )
         return response
 
+    def _run_tool(self, name: str, function, parameters: dict):
+        with start_span("tool.call", tool=name) as span:
+            output = function(**parameters)
+            span.set_attribute("output_bytes", payload_size(output))
+        return output
+
     def update_tools_results(self, response: cohere.ChatResponse) -> list:
         tool_results = []
+        bytes_before = bytes_after = 0
+        deadline = current_deadline()
+        pending = []
         for tool_call in response.tool_calls or []:
             raw_parameters = tool_call.parameters or {}
             parameters = dict(raw_parameters)
+            function = self.function_map.get(tool_call.name)
+            future = None
+            if function is not None:
+                future = TOOL_EXECUTOR.submit(
+                    copy_context().run,
+                    self._run_tool,
+                    tool_call.name,
+                    function,
+                    parameters,
+                )
+            pending.append((tool_call, parameters, future))
+
+        for tool_call, parameters, future in pending:
             try:
-                output = self.function_map[tool_call.name](**parameters)
+                if future is None:
+                    raise KeyError(tool_call.name)
+                timeout = (
+                    deadline.budget(cap=self.tool_timeout)
+                    if deadline
+                    else self.tool_timeout
+                )
+                output = future.result(timeout=timeout)
+            except DeadlineExceeded:
+                raise
+            except FutureTimeoutError:
+                output = {
+                    "error": "Tool timed out",
+                    "tool": tool_call.name,
+                    "parameters": parameters,
+                }
             except Exception as exc:
                 output = {
                     "error": str(exc),
                     "tool": tool_call.name,
                     "parameters": parameters,
                 }
+            if self.compact_tool_outputs:
+                compacted = compact_tool_output(tool_call.name, output)
+                bytes_before += payload_size(output)
+                bytes_after += payload_size(compacted)
+                output = compacted
             tool_results.append(
                 {
                     "call": tool_call,
@@ -73,6 +182,21 @@ class CohereClient:
                 }
             )
 
+        if self.compact_tool_outputs and tool_results:
+            self.compaction_stats.append(
+                {
+                    "bytes_before": bytes_before,
+                    "bytes_after": bytes_after,
+                    "bytes_saved": bytes_before - bytes_after,
+                }
+            )
+            logger.info(
+                "Compacted %s tool output(s): %s -> %s bytes (%s saved)",
+                len(tool_results),
+                bytes_before,
+                bytes_after,
+                bytes_before - bytes_after,
+            )
         return tool_results
 
     def ask_llm(
@@ -81,10 +205,10 @@ class CohereClient:
         chat_history: list | None = None,
         max_steps: int = 8,
     ) -> tuple[str, list]:
+        history = list(chat_history or [])
+        prompt = self.message if message is None else message
+        response = None
         try:
-            history = list(chat_history or [])
-            prompt = self.message if message is None else message
-            response = None
             tool_results = None
             steps = 0
             while steps < max_steps:
@@ -112,11 +236,52 @@ class CohereClient:
                     "confirm details or try a specific date/time.",
                     history,
                 )
-        except Exception as e:
-            return str(e), chat_history or []
+        except DeadlineExceeded:
+            if response is None and prompt:
+                history.append({"role": "USER", "message": prompt})
+            return self._partial_answer(response, history)
+        except CircuitOpenError:
+            return PROVIDER_UNAVAILABLE_MESSAGE, chat_history or []
+        except Exception:
+            logger.exception("Chat provider call failed")
+            return PROVIDER_UNAVAILABLE_MESSAGE, chat_history or []
 
         return (response.text if response else ""), history
 
+    def _partial_answer(self, response, history: list) -> tuple[str, list]:
+        """Answer with whatever the model produced before the deadline ran out."""
+        text = response.text if response is not None and response.text else None
+        if text is None:
+            text = PARTIAL_ANSWER_MESSAGE
+            history.append({"role": "CHATBOT", "message": text})
+        return text, history
+
+    def generate(
+        self,
+        message: str,
+        chat_history: list | None = None,
+    ) -> tuple[str, list]:
+        """Single chat call without tools, for prompts that already carry the data."""
+        history = list(chat_history or [])
+        try:
+            response = self.chat(
+                message=message,
+                chat_history=history,
+                use_tools=False,
+            )
+            history.append({"role": "USER", "message": message})
+            if response.text:
+                history.append({"role": "CHATBOT", "message": response.text})
+        except DeadlineExceeded:
+            return self._partial_answer(None, history)
+        except CircuitOpenError:
+            return PROVIDER_UNAVAILABLE_MESSAGE, chat_history or []
+        except Exception:
+            logger.exception("Chat provider call failed")
+            return PROVIDER_UNAVAILABLE_MESSAGE, chat_history or []
+
+        return response.text or "", history
+
     def embed_texts(self, texts: list[str], input_type: str) -> list[list[float]]:
         response = self.client.embed(
             texts=texts,
@@ -0,0 +1,152 @@
+import json
+import os
+from typing import Any
+
+MATCH_FIELDS = ("policy_name", "document_name", "chunk_index", "text")
+TEXT_FIELDS = ("text", "description")
+TRUNCATION_MARKER = "..."
+
+# Per-tool output schemas: which list holds the repeated items (None when the
+# output itself is the list), which item fields the model needs, which top-level
+# fields to drop, and whether adjacent chunks of one document can be merged.
+TOOL_OUTPUT_SCHEMAS: dict[str, dict[str, Any]] = {
+    "search_my_organization_policies": {
+        "list_key": "matches",
+        "item_fields": MATCH_FIELDS,
+        "merge_chunks": True,
+    },
+    "search_policy_embeddings": {
+        "list_key": None,
+        "item_fields": MATCH_FIELDS,
+        "merge_chunks": True,
+    },
+    "get_my_pending_leaves": {
+        "list_key": "policy_excerpts",
+        "item_fields": ("policy_name", "text"),
+    },
+    "get_policies_for_organization": {
+        "list_key": "policies",
+        "item_fields": ("name", "description", "document_name"),
+    },
+    "get_my_organization_details": {
+        "list_key": "organizations",
+        "item_fields": ("name", "description", "address", "email", "phone"),
+    },
+    "get_organization_details": {"drop_fields": ("id",)},
+    "get_policy_details": {"drop_fields": ("id", "file_path")},
+}
+
+
+def payload_size(output: Any) -> int:
+    return len(json.dumps(output, default=str))
+
+
+def _join_overlapping(left: str, right: str, max_overlap: int = 400) -> str:
+    """Join two consecutive chunks, dropping the overlap _chunk_text adds between them."""
+    for size in range(min(len(left), len(right), max_overlap), 0, -1):
+        if left.endswith(right[:size]):
+            return left + right[size:]
+    return f"{left} {right}"
+
+
+def _merge_adjacent_chunks(items: list[dict]) -> list[dict]:
+    merged: list[dict] = []
+    for item in items:
+        key = (
+            item.get("policy_id")
+            or item.get("document_name")
+            or item.get("policy_name")
+        )
+        index = item.get("chunk_index")
+        target = None
+        if key is not None and isinstance(index, int):
+            for candidate in merged:
+                if candidate["_key"] != key:
+                    continue
+                if index == candidate["_last"] + 1 or index == candidate["_first"] - 1:
+                    target = candidate
+                    break
+        if target is None:
+            entry = dict(item)
+            entry.update({"_key": key, "_first": index, "_last": index})
+            merged.append(entry)
+            continue
+        text = item.get("text") or ""
+        if index == target["_last"] + 1:
+            target["text"] = _join_overlapping(target.get("text") or "", text)
+            target["_last"] = index
+        else:
+            target["text"] = _join_overlapping(text, target.get("text") or "")
+            target["_first"] = index
+    for entry in merged:
+        if entry["_first"] != entry["_last"]:
+            entry["chunk_index"] = f"{entry['_first']}-{entry['_last']}"
+        for private in ("_key", "_first", "_last"):
+            entry.pop(private)
+    return merged
+
+
+def _project(item: dict, fields: tuple[str, ...]) -> dict:
+    return {field: item[field] for field in fields if item.get(field) is not None}
+
+
+def _truncate_items(items: list[dict], char_budget: int) -> tuple[list[dict], int]:
+    """Trim text fields in rank order until the budget is spent; return kept items and omitted count."""
+    kept = []
+    remaining = char_budget
+    for position, item in enumerate(items):
+        if remaining <= 0:
+            return kept, len(items) - position
+        trimmed = dict(item)
+        for field in TEXT_FIELDS:
+            value = trimmed.get(field)
+            if not isinstance(value, str):
+                continue
+            if len(value) > remaining:
+                value = value[: max(remaining, 0)].rstrip() + TRUNCATION_MARKER
+            trimmed[field] = value
+            remaining -= len(value)
+        kept.append(trimmed)
+    return kept, 0
+
+
+def compact_tool_output(
+    tool_name: str, output: Any, token_budget: int | None = None
+) -> Any:
+    """
+    Shrink a tool output before it is sent back to the model: project each item
+    to the fields declared in TOOL_OUTPUT_SCHEMAS, merge adjacent chunks of the
+    same document and truncate text to the token budget. The input is not mutated.
+    """
+    schema = TOOL_OUTPUT_SCHEMAS.get(tool_name)
+    if schema is None or not isinstance(output, (dict, list)) or "error" in output:
+        return output
+    if token_budget is None:
+        token_budget = int(os.getenv("AI_TOOL_OUTPUT_TOKEN_BUDGET", "1200"))
+
+    list_key = schema.get("list_key")
+    if isinstance(output, list):
+        if list_key is not None:
+            return output
+        items = output
+    else:
+        items = output.get(list_key) if list_key else None
+
+    if not isinstance(items, list):
+        if isinstance(output, dict):
+            drop = set(schema.get("drop_fields", ()))
+            return {k: v for k, v in output.items() if k not in drop and v is not None}
+        return output
+
+    if schema.get("merge_chunks"):
+        items = _merge_adjacent_chunks([i for i in items if isinstance(i, dict)])
+    items = [_project(i, schema["item_fields"]) for i in items if isinstance(i, dict)]
+    items, omitted = _truncate_items(items, token_budget * 4)
+
+    if isinstance(output, list):
+        return items
+    compacted = {k: v for k, v in output.items() if v is not None}
+    compacted[list_key] = items
+    if omitted:
+        compacted["omitted"] = omitted
+    return compacted
@@ -0,0 +1,70 @@
+import os
+import threading
+
+from ai.tools import AI_TOOLS, get_ai_function_map
+from application.cache import TTLCache
+from auth.principals import principal_organization_ids
+from organizations.constants import get_organization_function_map
+from organizations.db import get_my_organization_details
+from organizations.tools import ORGANIZATION_TOOLS
+
+USER_SCOPED_TOOLS = (
+    "get_my_organization_details",
+    "search_my_organization_policies",
+    "get_my_pending_leaves",
+)
+ALL_TOOLS = [*ORGANIZATION_TOOLS, *AI_TOOLS]
+ANONYMOUS_TOOLS = [t for t in ALL_TOOLS if t.get("name") not in USER_SCOPED_TOOLS]
+
+AGENT_CONTEXTS = TTLCache(
+    ttl=float(os.getenv("AI_CONTEXT_TTL_SECONDS", "60")),
+    max_size=int(os.getenv("AI_CONTEXT_CACHE_SIZE", "1000")),
+)
+
+
+class AgentContext:
+    """
+    Per-user state shared by the agent's tools across requests: tool definitions,
+    the function map and (lazily) the user's active organization memberships.
+    """
+
+    def __init__(self, user_id: str | None = None):
+        self.user_id = user_id
+        self.tools = ALL_TOOLS if user_id is not None else ANONYMOUS_TOOLS
+        self.function_map = {
+            **get_organization_function_map(user_id=user_id, context=self),
+            **get_ai_function_map(user_id=user_id, context=self),
+        }
+        self._organization_details: dict | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def organization_details(self) -> dict:
+        with self._lock:
+            if self._organization_details is None:
+                self._organization_details = get_my_organization_details(self.user_id)
+            return self._organization_details
+
+    @property
+    def organization_ids(self) -> list[str]:
+        claimed = principal_organization_ids(self.user_id)
+        if claimed is not None:
+            return claimed
+        return [org["id"] for org in self.organization_details.get("organizations", [])]
+
+
+ANONYMOUS_CONTEXT = AgentContext()
+
+
+def get_agent_context(user_id: str | None) -> AgentContext:
+    if user_id is None:
+        return ANONYMOUS_CONTEXT
+    return AGENT_CONTEXTS.get_or_set(str(user_id), lambda: AgentContext(str(user_id)))
+
+
+def invalidate_agent_context(user_id: str | None = None) -> None:
+    """Drop the cached context for one user, or for everyone when user_id is None."""
+    if user_id is None:
+        AGENT_CONTEXTS.clear()
+    else:
+        AGENT_CONTEXTS.pop(str(user_id))
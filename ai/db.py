@@ -2,7 +2,16 @@ import os
 import uuid
 
 from pgvector.sqlalchemy import Vector
-from sqlalchemy import Column, DateTime, Integer, String, Text
+from sqlalchemy import (
+    Column,
+    Date,
+    DateTime,
+    Float,
+    Integer,
+    String,
+    Text,
+    UniqueConstraint,
+)
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.sql import func
 
@@ -25,3 +34,27 @@ class PolicyEmbedding(Base):
     text = Column(Text, nullable=False)
     embedding = Column(Vector(DEFAULT_EMBED_DIM), nullable=False)
     created = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class OrganizationUsage(Base):
+    """Daily rollup of provider usage per organization, written by ``ai.metering``."""
+
+    __tablename__ = "organization_usage"
+    __table_args__ = (
+        UniqueConstraint("organization_id", "day", name="uq_organization_usage_day"),
+    )
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    organization_id = Column(UUID(as_uuid=True), nullable=False, index=True)
+    day = Column(Date, nullable=False)
+    requests = Column(Integer, nullable=False, default=0)
+    chat_calls = Column(Integer, nullable=False, default=0)
+    input_tokens = Column(Integer, nullable=False, default=0)
+    output_tokens = Column(Integer, nullable=False, default=0)
+    embed_calls = Column(Integer, nullable=False, default=0)
+    embed_texts = Column(Integer, nullable=False, default=0)
+    embed_tokens = Column(Integer, nullable=False, default=0)
+    provider_latency_ms = Column(Float, nullable=False, default=0)
+    updated = Column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
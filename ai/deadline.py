@@ -0,0 +1,47 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class Deadline:
+    """Absolute time limit for one request; each stage asks it for a remaining budget."""
+
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self.expires_at = time.monotonic() + timeout
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def budget(self, cap: float | None = None) -> float:
+        """Seconds available to the next stage (at most ``cap``); raises once time is up."""
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded(f"Request deadline of {self.timeout:.1f}s exceeded")
+        return remaining if cap is None else min(remaining, cap)
+
+
+_CURRENT_DEADLINE: ContextVar[Deadline | None] = ContextVar("deadline", default=None)
+
+
+def current_deadline() -> Deadline | None:
+    return _CURRENT_DEADLINE.get()
+
+
+@contextmanager
+def use_deadline(deadline: Deadline | None) -> Iterator[Deadline | None]:
+    """Make ``deadline`` visible to the clients and tools called inside the block."""
+    token = _CURRENT_DEADLINE.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _CURRENT_DEADLINE.reset(token)
@@ -0,0 +1,211 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import date, datetime, timezone
+from typing import Iterator
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from ai.db import OrganizationUsage
+from application.cache import TTLCache
+from application.metrics import METRICS
+from database.db import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+COUNTERS = (
+    "requests",
+    "chat_calls",
+    "input_tokens",
+    "output_tokens",
+    "embed_calls",
+    "embed_texts",
+    "embed_tokens",
+    "provider_latency_ms",
+)
+BUDGET_COUNTERS = ("input_tokens", "output_tokens", "embed_tokens")
+UPSERT_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+NORMAL = "normal"
+SOFT_LIMITED = "soft_limited"
+HARD_LIMITED = "hard_limited"
+
+_ORGANIZATION: ContextVar[str | None] = ContextVar("metering_org", default=None)
+
+
+@contextmanager
+def metering_organization(organization_id: str | None) -> Iterator[None]:
+    """Attribute provider usage inside the block to ``organization_id``."""
+    token = _ORGANIZATION.set(str(organization_id) if organization_id else None)
+    try:
+        yield
+    finally:
+        _ORGANIZATION.reset(token)
+
+
+def current_organization() -> str | None:
+    return _ORGANIZATION.get()
+
+
+def _today() -> date:
+    return datetime.now(timezone.utc).date()
+
+
+class Meter:
+    """
+    Aggregates provider usage per (organization, UTC day) in memory and upserts the
+    totals into ``organization_usage`` in one batch every ``flush_interval`` seconds.
+    Optional daily token budgets put an organization into cheaper answer modes.
+    """
+
+    def __init__(
+        self,
+        enabled: bool,
+        flush_interval: float = 10,
+        soft_budget: int = 0,
+        hard_budget: int = 0,
+        budget_cache_seconds: float = 30,
+    ):
+        self.enabled = enabled
+        self.flush_interval = flush_interval
+        self.soft_budget = soft_budget
+        self.hard_budget = hard_budget
+        self._pending: dict[tuple[str, date], dict[str, float]] = {}
+        self._stored_tokens = TTLCache(ttl=budget_cache_seconds, max_size=10000)
+        self._lock = threading.Lock()
+        self._flusher: threading.Thread | None = None
+
+    def record(self, **deltas: float) -> None:
+        if not self.enabled:
+            return
+        organization_id = current_organization()
+        if organization_id is None:
+            METRICS.counter("metering.unattributed").inc()
+            return
+        key = (organization_id, _today())
+        with self._lock:
+            totals = self._pending.setdefault(key, dict.fromkeys(COUNTERS, 0))
+            for name, value in deltas.items():
+                totals[name] += value or 0
+        self._start_flusher()
+
+    def _start_flusher(self) -> None:
+        # A zero interval leaves flushing to the caller (shutdown hook, tests).
+        if self._flusher is not None or not self.flush_interval:
+            return
+        with self._lock:
+            if self._flusher is None:
+                self._flusher = threading.Thread(
+                    target=self._flush_forever, name="metering-flush", daemon=True
+                )
+                self._flusher.start()
+
+    def _flush_forever(self) -> None:
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def flush(self) -> int:
+        """Write pending usage; returns the number of rows upserted."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        rows = [
+            {
+                "organization_id": uuid.UUID(organization_id),
+                "day": day,
+                **{name: totals[name] for name in COUNTERS},
+            }
+            for (organization_id, day), totals in pending.items()
+        ]
+        try:
+            with SessionLocal() as db:
+                insert = UPSERT_INSERTS[db.get_bind().dialect.name]
+                stmt = insert(OrganizationUsage).values(rows)
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=["organization_id", "day"],
+                    set_={
+                        name: getattr(OrganizationUsage, name)
+                        + getattr(stmt.excluded, name)
+                        for name in COUNTERS
+                    },
+                )
+                db.execute(stmt)
+                db.commit()
+        except Exception:
+            logger.exception("Failed to write %s usage row(s); will retry", len(rows))
+            self._restore(pending)
+            return 0
+        for organization_id, day in pending:
+            self._stored_tokens.pop((organization_id, day))
+        METRICS.counter("metering.rows_written").inc(len(rows))
+        return len(rows)
+
+    def _restore(self, pending: dict[tuple[str, date], dict[str, float]]) -> None:
+        with self._lock:
+            for key, totals in pending.items():
+                current = self._pending.setdefault(key, dict.fromkeys(COUNTERS, 0))
+                for name, value in totals.items():
+                    current[name] += value
+
+    def _load_tokens(self, organization_id: str, day: date) -> int:
+        with SessionLocal() as db:
+            used = db.scalar(
+                select(
+                    func.sum(
+                        OrganizationUsage.input_tokens
+                        + OrganizationUsage.output_tokens
+                        + OrganizationUsage.embed_tokens
+                    )
+                ).where(
+                    OrganizationUsage.organization_id == uuid.UUID(organization_id),
+                    OrganizationUsage.day == day,
+                )
+            )
+        return int(used or 0)
+
+    def tokens_today(self, organization_id: str) -> int:
+        key = (str(organization_id), _today())
+        stored = self._stored_tokens.get_or_set(key, lambda: self._load_tokens(*key))
+        with self._lock:
+            totals = self._pending.get(key, {})
+            pending = sum(totals.get(name, 0) for name in BUDGET_COUNTERS)
+        return int(stored + pending)
+
+    def budget_mode(self, organization_id: str | None) -> str:
+        if not (self.enabled and organization_id):
+            return NORMAL
+        if not (self.soft_budget or self.hard_budget):
+            return NORMAL
+        try:
+            used = self.tokens_today(organization_id)
+        except Exception:
+            logger.exception("Could not read usage for budget check")
+            return NORMAL
+        mode = NORMAL
+        if self.hard_budget and used >= self.hard_budget:
+            mode = HARD_LIMITED
+        elif self.soft_budget and used >= self.soft_budget:
+            mode = SOFT_LIMITED
+        if mode != NORMAL:
+            METRICS.counter(f"metering.budget.{mode}").inc()
+        return mode
+
+    def clear(self) -> None:
+        with self._lock:
+            self._pending.clear()
+        self._stored_tokens.clear()
+
+
+METER = Meter(
+    enabled=os.getenv("AI_METERING_ENABLED", "false").lower() == "true",
+    flush_interval=float(os.getenv("AI_METERING_FLUSH_SECONDS", "10")),
+    soft_budget=int(os.getenv("AI_ORG_DAILY_SOFT_TOKEN_BUDGET", "0")),
+    hard_budget=int(os.getenv("AI_ORG_DAILY_HARD_TOKEN_BUDGET", "0")),
+)
@@ -1,9 +1,13 @@
+from typing import Literal
+
 from pydantic import BaseModel
 
 
 class QNARequestBody(BaseModel):
     question: str
     session_id: str | None = None
+    # "delta" returns only this turn's messages; fetch the rest from the history endpoint.
+    response_mode: Literal["full", "delta"] = "full"
 
 
 class QNAResponseBody(BaseModel):
@@ -11,3 +15,12 @@ class QNAResponseBody(BaseModel):
     response: str
     session_id: str | None = None
     messages: list[dict[str, str]] | None = None
+    history_cursor: int | None = None
+
+
+class SessionMessagesResponse(BaseModel):
+    session_id: str
+    messages: list[dict[str, str]]
+    cursor: int
+    next_cursor: int | None = None
+    total: int
@@ -21,10 +21,31 @@ Unless the user asks for a different style of answer, you should answer in full
 using proper grammar and spelling.
 """
 
+CATALOG_PREAMBLE = """
+## The User's Organizations
+The organizations the user belongs to and their active policies are listed below.
+Answer questions about them from this list instead of calling tools; use the
+policy search tools for what the documents actually say.
+
+{catalog}
+"""
+
 POLICY_PROMPT = """You are a policy assistant. Answer the question using only the policy excerpts below. If the answer is not contained in the excerpts, say you couldn't find it in the policy documents.
 
 Policy excerpts:
 {excerpts_text}
 
 Question: {question}
-"""
\ No newline at end of file
+"""
+ROUTED_TOOL_PROMPT = """Answer the question using only the result of the {tool_name} tool below. If the result does not contain the answer, say so briefly.
+
+Tool result:
+{tool_output}
+
+Question: {question}
+"""
+
+DEGRADED_POLICY_ANSWER = """The assistant is temporarily unable to write a full answer. These are the most relevant excerpts from your policy documents:
+
+{excerpts_text}
+"""
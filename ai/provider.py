@@ -0,0 +1,43 @@
+import os
+import threading
+
+import cohere
+
+from ai.replay import RecordingClient, build_mock_client, build_replay_client
+
+_CLIENTS: dict[tuple[str, str | None], object] = {}
+_CLIENTS_LOCK = threading.Lock()
+
+
+def build_cohere_client(api_key: str | None = None, mode: str | None = None):
+    """
+    Provider client for ``COHERE_MODE``: ``live`` (default) talks to Cohere,
+    ``record`` does the same and appends every call to ``COHERE_RECORDING_PATH``,
+    ``replay`` answers from that file offline and ``mock`` answers from a script
+    (see ``ai/replay.py``).
+    """
+    mode = (mode or os.getenv("COHERE_MODE", "live")).lower()
+    if mode == "mock":
+        return build_mock_client()
+    if mode == "replay":
+        return build_replay_client()
+    client = cohere.Client(api_key)
+    if mode == "record":
+        return RecordingClient(
+            client, os.getenv("COHERE_RECORDING_PATH", "cohere_recording.jsonl")
+        )
+    return client
+
+
+def get_cohere_client(api_key: str | None = None):
+    """
+    Process-wide Cohere client, so requests reuse one pooled HTTP connection
+    (and its TLS session) instead of opening a new one per client object.
+    """
+    api_key = api_key or os.getenv("COHERE_API_KEY")
+    mode = os.getenv("COHERE_MODE", "live").lower()
+    with _CLIENTS_LOCK:
+        client = _CLIENTS.get((mode, api_key))
+        if client is None:
+            client = _CLIENTS[(mode, api_key)] = build_cohere_client(api_key, mode)
+        return client
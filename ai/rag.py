@@ -1,23 +1,47 @@
 import logging
 import os
 import re
+import time
 import uuid
 from typing import Iterable
 
-import cohere
 import httpx
-from sqlalchemy import delete, select
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.orm import Session
+from ai.allowances import extract_leave_allowances
+from ai.answer_cache import ANSWER_CACHE
 from ai.db import PolicyEmbedding
+from ai.deadline import Deadline, DeadlineExceeded, current_deadline
+from ai.metering import METER, metering_organization
+from ai.provider import get_cohere_client
+from ai.resilience import EMBED_CALL
+from ai.utils import normalize_question
+from application.singleflight import SingleFlight
+from application.tracing import start_span
 from database.db import SessionLocal
+from organizations.models import PolicyLeaveAllowance
 
 
 logger = logging.getLogger(__name__)
 
+EMBED_FLIGHT = SingleFlight("embed")
+RETRIEVAL_FLIGHT = SingleFlight("retrieval")
+# Query embeddings computed ahead of time (e.g. at startup), keyed by (model, query).
+PINNED_QUERY_EMBEDDINGS: dict[tuple[str, str], list[float]] = {}
+
 
 class RAGClient:
-    def __init__(self, embed_model: str | None = None):
+    def __init__(self, embed_model: str | None = None, deadline: Deadline | None = None):
         self.embed_model = embed_model or os.getenv("COHERE_EMBED_MODEL", "embed-english-v3.0")
-        self.client = cohere.Client(os.getenv("COHERE_API_KEY"))
+        self.client = get_cohere_client()
+        self.deadline = deadline
+        self.embed_timeout = float(os.getenv("RAG_EMBED_TIMEOUT_SECONDS", "30"))
+        self.fetch_timeout = float(os.getenv("RAG_FETCH_TIMEOUT_SECONDS", "20"))
+
+    def _budget(self, cap: float) -> float:
+        """Seconds available for the next call, bounded by the request deadline if any."""
+        deadline = self.deadline or current_deadline()
+        return deadline.budget(cap=cap) if deadline else cap
 
     def _looks_like_text(self, raw: bytes) -> bool:
         if not raw:
@@ -53,7 +77,7 @@ class RAGClient:
     def _read_text_from_source(self, file_path: str) -> str:
         if file_path.startswith("http://") or file_path.startswith("https://"):
             try:
-                response = httpx.get(file_path, timeout=20.0)
+                response = httpx.get(file_path, timeout=self._budget(self.fetch_timeout))
                 response.raise_for_status()
                 raw = response.content
             except Exception:
@@ -94,16 +118,74 @@ class RAGClient:
             start = max(0, end - overlap)
         return chunks
 
+    def _coalesce(self, flight: SingleFlight, key: tuple, fn):
+        """Share one in-flight computation between concurrent identical requests."""
+        deadline = self.deadline or current_deadline()
+        try:
+            return flight.do(key, fn, timeout=deadline.budget() if deadline else None)
+        except TimeoutError as exc:
+            raise DeadlineExceeded(f"Deadline exceeded waiting for {flight.name}") from exc
+
     def _embed_texts(self, texts: Iterable[str], input_type: str) -> list[list[float]]:
-        response = self.client.embed(
-            texts=list(texts),
+        texts = list(texts)
+        if input_type == "search_query":
+            pinned = [
+                PINNED_QUERY_EMBEDDINGS.get((self.embed_model, normalize_question(text)))
+                for text in texts
+            ]
+            if texts and all(pinned):
+                return pinned
+            key = (
+                self.embed_model,
+                input_type,
+                tuple(normalize_question(text) for text in texts),
+            )
+            return self._coalesce(
+                EMBED_FLIGHT, key, lambda: self._call_embed(texts, input_type)
+            )
+        return self._call_embed(texts, input_type)
+
+    def _call_embed(self, texts: list[str], input_type: str) -> list[list[float]]:
+        with start_span(
+            "rag.embed",
             model=self.embed_model,
             input_type=input_type,
-        )
+            texts=len(texts),
+            input_chars=sum(len(text) for text in texts),
+        ) as span:
+            started = time.perf_counter()
+            response = EMBED_CALL.call(
+                lambda timeout: self.client.embed(
+                    texts=texts,
+                    model=self.embed_model,
+                    input_type=input_type,
+                    request_options={"timeout_in_seconds": timeout, "max_retries": 0},
+                ),
+                timeout_cap=self.embed_timeout,
+            )
+            billed = getattr(getattr(response, "meta", None), "billed_units", None)
+            input_tokens = getattr(billed, "input_tokens", None)
+            METER.record(
+                embed_calls=1,
+                embed_texts=len(texts),
+                embed_tokens=input_tokens,
+                provider_latency_ms=(time.perf_counter() - started) * 1000,
+            )
+            span.set_attribute("input_tokens", input_tokens)
 
         logger.info(f"Embedded {len(texts)} texts with model {self.embed_model} & response: {response}")
         return response.embeddings or []
 
+    def embed_queries(self, texts: list[str]) -> list[list[float]]:
+        return self._embed_texts(texts, input_type="search_query")
+
+    def pin_query_embeddings(self, queries: list[str]) -> int:
+        """Embed fixed queries once and serve them from memory from then on."""
+        vectors = self.embed_queries(queries)
+        for query, vector in zip(queries, vectors, strict=False):
+            PINNED_QUERY_EMBEDDINGS[(self.embed_model, normalize_question(query))] = vector
+        return len(vectors)
+
     def index_policy_document(
         self,
         policy_id: str,
@@ -121,7 +203,8 @@ class RAGClient:
         if not chunks:
             return {"status": "skipped", "reason": "no_chunks_created"}
 
-        embeddings = self._embed_texts(chunks, input_type="search_document")
+        with metering_organization(organization_id):
+            embeddings = self._embed_texts(chunks, input_type="search_document")
         if not embeddings:
             return {"status": "skipped", "reason": "no_embeddings_created"}
 
@@ -145,31 +228,126 @@ class RAGClient:
                         embedding=embedding,
                     )
                 )
+            # Stored with the chunks, so a failed embed leaves no allowances behind.
+            self._store_leave_allowances(db, policy_id, organization_id, text)
             db.commit()
+        ANSWER_CACHE.invalidate([str(organization_id)])
         return {"status": "indexed", "chunks": len(chunks)}
 
+    def _store_leave_allowances(
+        self, db: Session, policy_id: str, organization_id: str, text: str
+    ) -> int:
+        """
+        Replace the policy's structured leave allowances with those stated in ``text``;
+        the caller commits ``db``.
+        """
+        allowances = extract_leave_allowances(text)
+        db.execute(
+            delete(PolicyLeaveAllowance).where(
+                PolicyLeaveAllowance.policy_id == uuid.UUID(str(policy_id))
+            )
+        )
+        for allowance in allowances:
+            db.add(
+                PolicyLeaveAllowance(
+                    policy_id=uuid.UUID(str(policy_id)),
+                    organization_id=uuid.UUID(str(organization_id)),
+                    **allowance,
+                )
+            )
+        logger.info(f"Extracted {len(allowances)} leave allowance(s) for policy {policy_id}")
+        return len(allowances)
+
     def remove_policy_from_index(self, policy_id: str) -> dict:
         with SessionLocal() as db:
+            organization_ids = db.execute(
+                select(PolicyEmbedding.organization_id)
+                .where(PolicyEmbedding.policy_id == policy_id)
+                .distinct()
+            ).scalars().all()
             result = db.execute(
                 delete(PolicyEmbedding).where(PolicyEmbedding.policy_id == policy_id)
             )
             db.commit()
+        if organization_ids:
+            ANSWER_CACHE.invalidate([str(org_id) for org_id in organization_ids])
         if result.rowcount == 0:
             return {"status": "skipped", "reason": "policy_not_found"}
         return {"status": "removed", "count": result.rowcount}
 
+    def move_policy_in_index(self, policy_id: str, organization_id: str) -> dict:
+        """Re-scope a policy's indexed chunks to another organization."""
+        with SessionLocal() as db:
+            previous_ids = db.execute(
+                select(PolicyEmbedding.organization_id)
+                .where(PolicyEmbedding.policy_id == uuid.UUID(str(policy_id)))
+                .distinct()
+            ).scalars().all()
+            result = db.execute(
+                update(PolicyEmbedding)
+                .where(PolicyEmbedding.policy_id == uuid.UUID(str(policy_id)))
+                .values(organization_id=uuid.UUID(str(organization_id)))
+            )
+            db.commit()
+        ANSWER_CACHE.invalidate(
+            [str(org_id) for org_id in previous_ids] + [str(organization_id)]
+        )
+        if result.rowcount == 0:
+            return {"status": "skipped", "reason": "policy_not_found"}
+        return {"status": "moved", "count": result.rowcount}
+
     def query_policy_index(
         self,
         query: str,
         top_k: int = 5,
         organization_ids: list[str] | None = None,
+        query_vector: list[float] | None = None,
+        include_vectors: bool = False,
     ) -> list[dict]:
-        query_embedding = self._embed_texts([query], input_type="search_query")
-        if not query_embedding:
-            return []
-        query_vector = query_embedding[0]
+        """
+        ``query_vector`` skips embedding ``query`` when the caller already has it;
+        ``include_vectors`` adds each chunk's ``id`` and ``embedding`` to the matches.
+        """
+        scope = tuple(sorted(organization_ids)) if organization_ids else None
+        key = (normalize_question(query), scope, self.embed_model, top_k, include_vectors)
+        with start_span(
+            "rag.query",
+            top_k=top_k,
+            organizations=len(organization_ids or []),
+            precomputed_vector=query_vector is not None,
+        ) as span:
+            matches = self._coalesce(
+                RETRIEVAL_FLIGHT,
+                key,
+                lambda: self._search_policy_index(
+                    query, top_k, organization_ids, query_vector, include_vectors
+                ),
+            )
+            span.set_attributes(
+                matches=len(matches),
+                matched_chars=sum(len(match.get("text") or "") for match in matches),
+            )
+        return [dict(match) for match in matches]
+
+    def _search_policy_index(
+        self,
+        query: str,
+        top_k: int,
+        organization_ids: list[str] | None,
+        query_vector: list[float] | None = None,
+        include_vectors: bool = False,
+    ) -> list[dict]:
+        if query_vector is None:
+            query_embedding = self.embed_queries([query])
+            if not query_embedding:
+                return []
+            query_vector = query_embedding[0]
 
         with SessionLocal() as db:
+            deadline = self.deadline or current_deadline()
+            if deadline is not None and db.get_bind().dialect.name == "postgresql":
+                timeout_ms = int(deadline.budget() * 1000)
+                db.execute(select(func.set_config("statement_timeout", str(timeout_ms), True)))
             stmt = (
                 select(PolicyEmbedding)
                 .order_by(PolicyEmbedding.embedding.cosine_distance(query_vector))
@@ -184,17 +362,19 @@ class RAGClient:
             results = db.execute(stmt).scalars().all()
         response = []
         for record in results:
-            response.append(
-                {
-                    "policy_id": str(record.policy_id),
-                    "organization_id": str(record.organization_id),
-                    "policy_name": record.policy_name,
-                    "description": record.description,
-                    "document_name": record.document_name,
-                    "file_path": record.file_path,
-                    "chunk_index": record.chunk_index,
-                    "text": record.text,
-                    "score": None,
-                }
-            )
+            match = {
+                "policy_id": str(record.policy_id),
+                "organization_id": str(record.organization_id),
+                "policy_name": record.policy_name,
+                "description": record.description,
+                "document_name": record.document_name,
+                "file_path": record.file_path,
+                "chunk_index": record.chunk_index,
+                "text": record.text,
+                "score": None,
+            }
+            if include_vectors:
+                match["id"] = str(record.id)
+                match["embedding"] = [float(value) for value in record.embedding]
+            response.append(match)
         return response
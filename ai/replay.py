@@ -0,0 +1,324 @@
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+from typing import Any
+
+import cohere
+import httpx
+from cohere.types.embed_response import (
+    EmbeddingsByTypeEmbedResponse,
+    EmbeddingsFloatsEmbedResponse,
+)
+
+logger = logging.getLogger(__name__)
+
+NO_RECORDING_MESSAGE = "No recorded answer matches this request."
+
+
+def _jsonable(value: Any) -> Any:
+    if hasattr(value, "dict") and callable(value.dict):
+        return _jsonable(value.dict())
+    if isinstance(value, dict):
+        return {str(key): _jsonable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(item) for item in value]
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+
+def _digest(value: Any) -> str:
+    payload = json.dumps(_jsonable(value), sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def request_keys(method: str, request: dict) -> tuple[str, str]:
+    """
+    Exact and loose fingerprints of a provider request. The loose one ignores the
+    preamble, history and tool definitions, so a recording made for one user still
+    replays for another asking the same thing.
+    """
+    request = {k: v for k, v in request.items() if k != "request_options"}
+    exact = _digest([method, request])
+    if method == "embed":
+        loose = _digest([method, request.get("texts"), request.get("input_type")])
+    else:
+        called = sorted(
+            _jsonable(result.get("call", {})).get("name", "")
+            for result in request.get("tool_results") or []
+        )
+        loose = _digest([method, request.get("message"), called])
+    return exact, loose
+
+
+class LatencyModel:
+    """
+    Provider latency for replayed calls, parsed from a spec:
+    ``recorded`` (the latency captured with the response), ``none``,
+    ``fixed:MS``, ``uniform:LOW_MS,HIGH_MS``, ``normal:MEAN_MS,STDDEV_MS`` or
+    ``lognormal:MEDIAN_MS,SIGMA``.
+    """
+
+    KINDS = {"recorded", "none", "fixed", "uniform", "normal", "lognormal"}
+
+    def __init__(self, spec: str = "recorded", scale: float = 1.0, seed=None):
+        kind, _, params = spec.strip().lower().partition(":")
+        if kind not in self.KINDS:
+            raise ValueError(f"Unknown latency distribution: {spec!r}")
+        self.kind = kind
+        self.params = [float(param) for param in params.split(",") if param]
+        self.scale = scale
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self, recorded_ms: float | None = None) -> float:
+        """Seconds to wait before answering."""
+        with self._lock:
+            if self.kind == "recorded":
+                ms = recorded_ms or 0.0
+            elif self.kind == "none":
+                ms = 0.0
+            elif self.kind == "fixed":
+                ms = self.params[0]
+            elif self.kind == "uniform":
+                ms = self._random.uniform(*self.params[:2])
+            elif self.kind == "normal":
+                ms = self._random.gauss(*self.params[:2])
+            else:
+                median, sigma = self.params[:2]
+                ms = median * self._random.lognormvariate(0, sigma)
+        return max(ms, 0.0) * self.scale / 1000
+
+
+def _simulate_latency(
+    latency: LatencyModel, recorded_ms: float | None, request: dict
+) -> None:
+    delay = latency.sample(recorded_ms)
+    timeout = (request.get("request_options") or {}).get("timeout_in_seconds")
+    if timeout is not None and delay > timeout:
+        time.sleep(timeout)
+        raise httpx.ReadTimeout("Simulated provider call timed out")
+    time.sleep(delay)
+
+
+def fake_embedding(text: str, size: int = 0) -> list[float]:
+    """Deterministic pseudo-embedding, so equal texts always get equal vectors."""
+    size = size or int(os.getenv("RAG_EMBED_DIM", "1024"))
+    rng = random.Random(hashlib.sha256(text.encode("utf-8")).digest())
+    return [rng.uniform(-1, 1) for _ in range(size)]
+
+
+class RecordingClient:
+    """
+    Wraps a live Cohere client and appends every chat/embed request, response and
+    latency to a JSON-lines file that ``ReplayClient`` can serve later.
+    """
+
+    def __init__(self, client, path: str):
+        self.client = client
+        self.path = path
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name: str):
+        return getattr(self.client, name)
+
+    def _record(self, method: str, **request):
+        started = time.perf_counter()
+        response = getattr(self.client, method)(**request)
+        latency_ms = (time.perf_counter() - started) * 1000
+        exact, loose = request_keys(method, request)
+        entry = {
+            "method": method,
+            "key": exact,
+            "loose_key": loose,
+            "latency_ms": round(latency_ms, 3),
+            "request": _jsonable(
+                {k: v for k, v in request.items() if k != "request_options"}
+            ),
+            "response": _jsonable(response),
+        }
+        line = json.dumps(entry, default=str)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as handle:
+                handle.write(line + "\n")
+        return response
+
+    def chat(self, **request):
+        return self._record("chat", **request)
+
+    def embed(self, **request):
+        return self._record("embed", **request)
+
+
+class ReplayClient:
+    """
+    Offline stand-in for the Cohere client that answers chat/embed calls from a
+    recording, after a delay drawn from ``chat_latency``/``embed_latency``.
+
+    Requests are matched exactly first, then loosely (see ``request_keys``);
+    repeated requests cycle through their recorded responses. Unmatched requests
+    raise ``KeyError`` when ``strict``, otherwise they get a tool-free chat answer
+    or deterministic embeddings so the agent loop still completes.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        chat_latency: LatencyModel | None = None,
+        embed_latency: LatencyModel | None = None,
+        strict: bool = False,
+    ):
+        self.path = path
+        self.chat_latency = chat_latency or LatencyModel()
+        self.embed_latency = embed_latency or LatencyModel()
+        self.strict = strict
+        self._entries: dict[str, list[dict]] = {}
+        self._cursor: dict[str, int] = {}
+        self._embedding_size = 0
+        self._lock = threading.Lock()
+        self.misses = 0
+        with open(path, encoding="utf-8") as handle:
+            for line in handle:
+                if line.strip():
+                    self._add(json.loads(line))
+
+    def _add(self, entry: dict) -> None:
+        self._entries.setdefault(entry["key"], []).append(entry)
+        self._entries.setdefault(entry["loose_key"], []).append(entry)
+        if entry["method"] == "embed" and not self._embedding_size:
+            embeddings = entry["response"].get("embeddings") or [[]]
+            if isinstance(embeddings, list):
+                self._embedding_size = len(embeddings[0])
+
+    def _lookup(self, method: str, request: dict) -> dict | None:
+        with self._lock:
+            for key in request_keys(method, request):
+                entries = self._entries.get(key)
+                if entries:
+                    cursor = self._cursor.get(key, 0)
+                    self._cursor[key] = cursor + 1
+                    return entries[cursor % len(entries)]
+            self.misses += 1
+        if self.strict:
+            raise KeyError(f"No recorded {method} response for this request")
+        return None
+
+    def chat(self, **request):
+        entry = self._lookup("chat", request)
+        _simulate_latency(
+            self.chat_latency, entry["latency_ms"] if entry else None, request
+        )
+        if entry is None:
+            return cohere.NonStreamedChatResponse(text=NO_RECORDING_MESSAGE)
+        return cohere.NonStreamedChatResponse.model_validate(entry["response"])
+
+    def embed(self, **request):
+        entry = self._lookup("embed", request)
+        _simulate_latency(
+            self.embed_latency, entry["latency_ms"] if entry else None, request
+        )
+        if entry is None:
+            texts = list(request.get("texts") or [])
+            return EmbeddingsFloatsEmbedResponse(
+                response_type="embeddings_floats",
+                id="replay",
+                texts=texts,
+                embeddings=[
+                    fake_embedding(text, self._embedding_size) for text in texts
+                ],
+            )
+        response = entry["response"]
+        if response.get("response_type") == "embeddings_by_type":
+            return EmbeddingsByTypeEmbedResponse.model_validate(response)
+        return EmbeddingsFloatsEmbedResponse.model_validate(response)
+
+
+class MockCohereClient:
+    """
+    Scripted stand-in for the Cohere client, for load tests without a recording.
+    With tools, the first chat step calls the tool the question points at and the
+    next one answers from its output; embeddings are ``fake_embedding`` vectors.
+    """
+
+    TOOL_KEYWORDS = (
+        (("balance", "remaining", "pending", "leaves left"), "get_my_pending_leaves"),
+        (
+            ("policy", "policies", "leave", "allowance"),
+            "search_my_organization_policies",
+        ),
+        (("organization", "company", "employer"), "get_my_organization_details"),
+    )
+
+    def __init__(
+        self,
+        chat_latency: LatencyModel | None = None,
+        embed_latency: LatencyModel | None = None,
+    ):
+        self.chat_latency = chat_latency or LatencyModel("none")
+        self.embed_latency = embed_latency or LatencyModel("none")
+
+    def _pick_tool(self, message: str, tools: list) -> dict | None:
+        available = {tool.get("name") for tool in tools}
+        lowered = message.lower()
+        for keywords, name in self.TOOL_KEYWORDS:
+            if name in available and any(word in lowered for word in keywords):
+                if name == "search_my_organization_policies":
+                    return {"name": name, "parameters": {"query": message}}
+                return {"name": name, "parameters": {}}
+        return None
+
+    def chat(self, message: str = "", tools=None, tool_results=None, **request):
+        _simulate_latency(self.chat_latency, None, request)
+        if tools and not tool_results:
+            tool = self._pick_tool(message or "", tools)
+            if tool is not None:
+                return cohere.NonStreamedChatResponse(
+                    text="", tool_calls=[cohere.ToolCall(**tool)]
+                )
+        if tool_results:
+            outputs = json.dumps(_jsonable(tool_results[0]["outputs"]), default=str)
+            return cohere.NonStreamedChatResponse(
+                text=f"Based on {len(tool_results)} tool result(s): {outputs[:200]}"
+            )
+        return cohere.NonStreamedChatResponse(text=f"Mock answer to: {message[:200]}")
+
+    def embed(self, texts=None, **request):
+        _simulate_latency(self.embed_latency, None, request)
+        texts = list(texts or [])
+        return EmbeddingsFloatsEmbedResponse(
+            response_type="embeddings_floats",
+            id="mock",
+            texts=texts,
+            embeddings=[fake_embedding(text) for text in texts],
+        )
+
+
+def _latency_models(default: str) -> tuple[LatencyModel, LatencyModel]:
+    default = os.getenv("COHERE_REPLAY_LATENCY", default)
+    scale = float(os.getenv("COHERE_REPLAY_LATENCY_SCALE", "1"))
+    seed = os.getenv("COHERE_REPLAY_SEED")
+    return (
+        LatencyModel(os.getenv("COHERE_REPLAY_CHAT_LATENCY", default), scale, seed),
+        LatencyModel(os.getenv("COHERE_REPLAY_EMBED_LATENCY", default), scale, seed),
+    )
+
+
+def build_replay_client(path: str | None = None) -> ReplayClient:
+    """Replay client configured from the ``COHERE_REPLAY_*`` environment variables."""
+    chat_latency, embed_latency = _latency_models("recorded")
+    return ReplayClient(
+        path or os.getenv("COHERE_RECORDING_PATH", "cohere_recording.jsonl"),
+        chat_latency=chat_latency,
+        embed_latency=embed_latency,
+        strict=os.getenv("COHERE_REPLAY_STRICT", "false").lower() == "true",
+    )
+
+
+def build_mock_client() -> MockCohereClient:
+    """Mock client with latencies from the ``COHERE_REPLAY_*`` environment variables."""
+    chat_latency, embed_latency = _latency_models("none")
+    return MockCohereClient(chat_latency=chat_latency, embed_latency=embed_latency)
@@ -0,0 +1,238 @@
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextvars import copy_context
+from typing import Callable, TypeVar
+
+import httpx
+
+from ai.deadline import DeadlineExceeded, current_deadline
+from application.metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+HEDGE_EXECUTOR = ThreadPoolExecutor(
+    max_workers=int(os.getenv("AI_PROVIDER_HEDGE_WORKERS", "8")),
+    thread_name_prefix="provider-hedge",
+)
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+def is_retryable(exc: Exception) -> bool:
+    if isinstance(exc, httpx.TransportError):
+        return True
+    return getattr(exc, "status_code", None) in RETRYABLE_STATUS_CODES
+
+
+class CircuitBreaker:
+    """
+    Opens after ``failure_threshold`` consecutive failures and rejects calls until
+    ``reset_timeout`` has passed; then one trial call decides whether it closes.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int | None = None,
+        reset_timeout: float | None = None,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold or int(
+            os.getenv("AI_CIRCUIT_FAILURE_THRESHOLD", "5")
+        )
+        self.reset_timeout = (
+            reset_timeout
+            if reset_timeout is not None
+            else float(os.getenv("AI_CIRCUIT_RESET_SECONDS", "30"))
+        )
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        """True while calls are being rejected (open and not yet due for a trial)."""
+        with self._lock:
+            return (
+                self.state == self.OPEN
+                and time.monotonic() - self.opened_at < self.reset_timeout
+            )
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if (
+                self.state == self.OPEN
+                and time.monotonic() - self.opened_at >= self.reset_timeout
+            ):
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def abandon_trial(self) -> None:
+        """
+        A call ended without telling whether the provider recovered (e.g. the
+        request deadline ran out); a half-open breaker lets the next call try.
+        """
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self.state = self.OPEN
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+        METRICS.gauge(f"provider.{self.name}.circuit_open").set(0)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning("Circuit for provider %s opened", self.name)
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                opened = True
+            else:
+                opened = False
+        if opened:
+            METRICS.gauge(f"provider.{self.name}.circuit_open").set(1)
+
+
+class ResilientCall:
+    """
+    Wraps one kind of provider call (chat, embed) with jittered exponential backoff
+    on retryable errors, optional hedging after the observed p95 latency and a
+    circuit breaker. Every attempt is bounded by the request deadline.
+    """
+
+    def __init__(self, name: str, breaker: CircuitBreaker | None = None):
+        self.name = name
+        self.breaker = breaker or CircuitBreaker(name)
+        self.max_retries = int(os.getenv("AI_PROVIDER_MAX_RETRIES", "2"))
+        self.backoff_base = float(os.getenv("AI_PROVIDER_BACKOFF_BASE_SECONDS", "0.2"))
+        self.backoff_max = float(os.getenv("AI_PROVIDER_BACKOFF_MAX_SECONDS", "2"))
+        self.hedge = os.getenv("AI_PROVIDER_HEDGE_ENABLED", "false").lower() == "true"
+        self.hedge_min_samples = int(os.getenv("AI_PROVIDER_HEDGE_MIN_SAMPLES", "20"))
+        self.latency = METRICS.histogram(f"provider.{name}.latency_seconds")
+
+    def _timeout(self, cap: float) -> float:
+        deadline = current_deadline()
+        return deadline.budget(cap=cap) if deadline else cap
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+
+    def _attempt(self, fn: Callable[[float], T], timeout: float) -> T:
+        started = time.monotonic()
+        result = fn(timeout)
+        self.latency.observe(time.monotonic() - started)
+        return result
+
+    def _hedged_attempt(self, fn: Callable[[float], T], timeout: float) -> T:
+        hedge_delay = self.latency.percentile(95)
+        if (
+            not self.hedge
+            or hedge_delay is None
+            or self.latency.count < self.hedge_min_samples
+        ):
+            return self._attempt(fn, timeout)
+
+        primary = HEDGE_EXECUTOR.submit(copy_context().run, self._attempt, fn, timeout)
+        done, _ = wait([primary], timeout=min(hedge_delay, timeout))
+        if done:
+            return primary.result()
+
+        METRICS.counter(f"provider.{self.name}.hedges").inc()
+        remaining = self._timeout(max(timeout - hedge_delay, 0.001))
+        hedge = HEDGE_EXECUTOR.submit(copy_context().run, self._attempt, fn, remaining)
+        pending = {primary, hedge}
+        error: Exception | None = None
+        while pending:
+            done, pending = wait(
+                pending, timeout=remaining, return_when=FIRST_COMPLETED
+            )
+            if not done:
+                break
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        METRICS.counter(f"provider.{self.name}.hedge_wins").inc()
+                    return future.result()
+                error = future.exception()
+        raise error or httpx.TimeoutException(f"Hedged {self.name} call timed out")
+
+    def call(self, fn: Callable[[float], T], timeout_cap: float) -> T:
+        """Run ``fn(timeout)`` with retries; raises CircuitOpenError when failing fast."""
+        attempt = 0
+        while True:
+            # An expired deadline raises here, before a half-open trial is claimed.
+            timeout = self._timeout(timeout_cap)
+            if not self.breaker.allow():
+                METRICS.counter(f"provider.{self.name}.circuit_rejections").inc()
+                raise CircuitOpenError(f"Provider {self.name} circuit is open")
+            settled = False
+            try:
+                result = self._hedged_attempt(fn, timeout)
+            except DeadlineExceeded:
+                raise
+            except Exception as exc:
+                deadline = current_deadline()
+                if (
+                    isinstance(exc, httpx.TimeoutException)
+                    and deadline
+                    and deadline.expired
+                ):
+                    raise DeadlineExceeded(
+                        f"Request deadline exceeded during {self.name}"
+                    ) from exc
+                if not is_retryable(exc):
+                    # The provider answered, so it is reachable; the request itself was bad.
+                    self.breaker.record_success()
+                    settled = True
+                    raise
+                self.breaker.record_failure()
+                settled = True
+                METRICS.counter(f"provider.{self.name}.failures").inc()
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+                if deadline is not None and deadline.remaining() <= delay:
+                    raise
+                METRICS.counter(f"provider.{self.name}.retries").inc()
+                logger.warning(
+                    "Retrying provider %s call after %s (attempt %s)",
+                    self.name,
+                    exc,
+                    attempt + 1,
+                )
+                time.sleep(delay)
+                attempt += 1
+                continue
+            else:
+                self.breaker.record_success()
+                settled = True
+                return result
+            finally:
+                if not settled:
+                    self.breaker.abandon_trial()
+
+
+CHAT_CALL = ResilientCall("chat")
+EMBED_CALL = ResilientCall("embed")
@@ -0,0 +1,145 @@
+import logging
+import os
+import threading
+from typing import Iterable
+
+from ai.rag import RAGClient
+from ai.utils import cosine_similarity
+
+logger = logging.getLogger(__name__)
+
+PLANNING_ROUTE = "needs_planning"
+
+# Example questions per route. Routes other than PLANNING_ROUTE are tool names
+# that can be called with arguments derived from the question alone.
+ROUTE_EXEMPLARS: dict[str, list[str]] = {
+    "search_my_organization_policies": [
+        "What is our leave policy?",
+        "How many sick days do we get per year?",
+        "What does the company policy say about working from home?",
+        "Is there a parental leave policy?",
+        "What are the rules for bereavement leave?",
+        "Can I carry over unused vacation days?",
+    ],
+    "get_my_pending_leaves": [
+        "How many leaves are pending of mine?",
+        "How many leave days do I have left?",
+        "What is my leave balance?",
+        "How many sick leaves remain for me this year?",
+    ],
+    "get_my_organization_details": [
+        "Tell me about my organization",
+        "Which organization do I belong to?",
+        "What is the address of my company?",
+        "Give me the contact details of my organization",
+    ],
+    PLANNING_ROUTE: [
+        "Show the policies for Acme Corp",
+        "Compare the leave policies of two organizations",
+        "Tell me about the organization named Globex",
+        "What are the details of the travel policy at Initech?",
+        "Hello, what can you do?",
+    ],
+}
+
+# Routed tools that take the user's question as their search query.
+QUERY_ROUTES = {"search_my_organization_policies", "search_policy_embeddings"}
+
+_EXEMPLAR_VECTORS: dict[tuple[str, str], list[float]] = {}
+_EXEMPLAR_LOCK = threading.Lock()
+
+
+class RouteDecision:
+    def __init__(self, tool_name: str, parameters: dict, score: float) -> None:
+        self.tool_name = tool_name
+        self.parameters = parameters
+        self.score = score
+
+
+class IntentRouter:
+    """
+    Classify a question against exemplar embeddings so that confident, single-tool
+    questions can skip the LLM tool-planning round trip.
+    """
+
+    def __init__(
+        self,
+        available_tools: Iterable[str],
+        rag_client: RAGClient | None = None,
+        exemplars: dict[str, list[str]] | None = None,
+        threshold: float | None = None,
+        margin: float | None = None,
+    ):
+        self.available_tools = set(available_tools)
+        self.rag_client = rag_client or RAGClient()
+        self.exemplars = exemplars or ROUTE_EXEMPLARS
+        self.threshold = (
+            threshold
+            if threshold is not None
+            else float(os.getenv("AI_ROUTER_THRESHOLD", "0.6"))
+        )
+        self.margin = (
+            margin
+            if margin is not None
+            else float(os.getenv("AI_ROUTER_MARGIN", "0.05"))
+        )
+        # The question's embedding from the last route() call, for callers to reuse.
+        self.query_vector: list[float] | None = None
+
+    def _routes(self) -> list[str]:
+        return [
+            route
+            for route in self.exemplars
+            if route == PLANNING_ROUTE or route in self.available_tools
+        ]
+
+    def exemplar_vectors(self) -> list[tuple[str, list[float]]]:
+        """Return (route, vector) pairs, embedding any exemplar not cached yet."""
+        model = self.rag_client.embed_model
+        pairs = [
+            (route, text) for route in self._routes() for text in self.exemplars[route]
+        ]
+        with _EXEMPLAR_LOCK:
+            missing = [
+                text for _, text in pairs if (model, text) not in _EXEMPLAR_VECTORS
+            ]
+        if missing:
+            vectors = self.rag_client.embed_queries(missing)
+            with _EXEMPLAR_LOCK:
+                for text, vector in zip(missing, vectors, strict=False):
+                    _EXEMPLAR_VECTORS[(model, text)] = vector
+        with _EXEMPLAR_LOCK:
+            return [
+                (route, _EXEMPLAR_VECTORS[(model, text)])
+                for route, text in pairs
+                if (model, text) in _EXEMPLAR_VECTORS
+            ]
+
+    def route(self, question: str) -> RouteDecision | None:
+        """Return a tool to call directly, or None when the LLM should plan."""
+        try:
+            exemplar_vectors = self.exemplar_vectors()
+            query_vectors = self.rag_client.embed_queries([question])
+        except Exception:
+            logger.exception("Intent routing failed; falling back to planning")
+            return None
+        if not exemplar_vectors or not query_vectors:
+            return None
+
+        query_vector = self.query_vector = query_vectors[0]
+        scores: dict[str, float] = {}
+        for route, vector in exemplar_vectors:
+            score = cosine_similarity(query_vector, vector)
+            if score > scores.get(route, -1.0):
+                scores[route] = score
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        best_route, best_score = ranked[0]
+        runner_up = ranked[1][1] if len(ranked) > 1 else -1.0
+        if best_route == PLANNING_ROUTE:
+            return None
+        if best_score < self.threshold or best_score - runner_up < self.margin:
+            return None
+
+        parameters = {"query": question} if best_route in QUERY_ROUTES else {}
+        return RouteDecision(best_route, parameters, best_score)
@@ -0,0 +1,101 @@
+import logging
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from contextvars import copy_context
+
+from ai.context import get_agent_context
+from ai.deadline import current_deadline
+from ai.rag import RAGClient
+from ai.tools import format_organization_policy_matches
+from ai.utils import normalize_question
+from application.metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+SPECULATIVE_EXECUTOR = ThreadPoolExecutor(
+    max_workers=int(os.getenv("AI_SPECULATIVE_WORKERS", "4")),
+    thread_name_prefix="speculative-retrieval",
+)
+
+
+class SpeculativeRetrieval:
+    """
+    Policy search started concurrently with the first LLM call. If the model then
+    searches for the same question, the already-computed matches are handed over
+    instead of searching again; a rewritten query, or a speculative search still
+    running after ``wait_seconds`` (or the request deadline), runs the real search.
+    """
+
+    def __init__(self, question: str, user_id: str | None = None, top_k: int = 5):
+        self.question = question
+        self.user_id = user_id
+        self.top_k = top_k
+        self.wait_seconds = float(os.getenv("AI_SPECULATIVE_WAIT_SECONDS", "2"))
+        self.tool_name = (
+            "search_my_organization_policies" if user_id else "search_policy_embeddings"
+        )
+        self._lock = threading.Lock()
+        self._used = False
+        self.future: Future = SPECULATIVE_EXECUTOR.submit(
+            copy_context().run, self._search
+        )
+
+    def _search(self) -> list[dict] | None:
+        organization_ids = None
+        if self.user_id:
+            organization_ids = get_agent_context(self.user_id).organization_ids
+            if not organization_ids:
+                return None
+        return RAGClient().query_policy_index(
+            self.question,
+            top_k=self.top_k,
+            organization_ids=organization_ids,
+        )
+
+    def _claim(self, query: str, top_k: int) -> list[dict] | None:
+        """Return the speculative matches once, or None if they cannot be used."""
+        if normalize_question(query) != normalize_question(self.question):
+            return None
+        with self._lock:
+            if self._used or top_k > self.top_k:
+                return None
+            self._used = True
+        deadline = current_deadline()
+        timeout = (
+            deadline.budget(cap=self.wait_seconds) if deadline else self.wait_seconds
+        )
+        try:
+            matches = self.future.result(timeout=timeout)
+        except FutureTimeoutError:
+            self.future.cancel()
+            METRICS.counter("speculative_retrieval.timeouts").inc()
+            logger.warning("Speculative retrieval is still running; searching instead")
+            return None
+        except Exception:
+            logger.exception("Speculative retrieval failed; running the tool instead")
+            return None
+        if matches is None:
+            return None
+        return matches[: max(top_k, 1)]
+
+    def install(self, function_map: dict) -> None:
+        """Wrap the search tool so its first call for the question uses the speculative result."""
+        tool = function_map.get(self.tool_name)
+        if tool is None:
+            self.discard()
+            return
+
+        def _fn(query: str, top_k: int = 5, **kwargs):
+            matches = self._claim(query, top_k)
+            if matches is None:
+                return tool(query=query, top_k=top_k, **kwargs)
+            if self.tool_name == "search_my_organization_policies":
+                return format_organization_policy_matches(matches)
+            return matches
+
+        function_map[self.tool_name] = _fn
+
+    def discard(self) -> None:
+        self.future.cancel()
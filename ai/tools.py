@@ -1,5 +1,14 @@
 from ai.rag import RAGClient
-from organizations.db import get_my_approved_leaves_summary, get_organization_ids_for_user
+from organizations.db import (
+    get_my_approved_leaves_summary,
+    get_my_leave_balances,
+    get_organization_ids_for_user,
+)
+
+# Fixed search query behind get_my_pending_leaves; its embedding is pinned at warmup.
+PENDING_LEAVES_POLICY_QUERY = (
+    "leave policy days allowance sick leave privilege leave PTO annual vacation"
+)
 
 AI_TOOLS = [
     {
@@ -43,11 +52,12 @@ AI_TOOLS = [
     {
         "name": "get_my_pending_leaves",
         "description": (
-            "Returns the requesting user's approved leaves summary and leave policy excerpts "
-            "to determine how many leaves are pending/remaining. Use when the user asks "
-            "'how many leaves are pending of mine?', 'leaves remaining', 'my leave balance', "
-            "'how many days do I have left?', or similar. Combines approved leave count from "
-            "the database with leave policy from the organization to compute pending leaves."
+            "Returns the requesting user's leave balances for this year (allowed, used and "
+            "remaining days per leave type) along with their approved leaves summary. Use "
+            "when the user asks 'how many leaves are pending of mine?', 'leaves remaining', "
+            "'my leave balance', 'how many days do I have left?', or similar. When no "
+            "allowance could be read from the policies, leave policy excerpts are returned "
+            "instead so pending = allowance - approved can be worked out from them."
         ),
         "parameter_definitions": {},
     },
@@ -58,11 +68,30 @@ def search_policy_embeddings(query: str, top_k: int = 5):
     return RAGClient().query_policy_index(query, top_k=top_k)
 
 
-def _make_search_my_organization_policies(user_id: str):
+def format_organization_policy_matches(matches: list[dict]) -> dict:
+    """Shape policy search matches as the search_my_organization_policies tool output."""
+    if not matches:
+        return {
+            "detail": "No matching policy content found in your organization's policies.",
+            "matches": [],
+        }
+    return {
+        "detail": f"Found {len(matches)} relevant excerpt(s) from your organization's policies.",
+        "matches": matches,
+    }
+
+
+def _organization_ids(user_id: str, context=None) -> list[str]:
+    if context is not None:
+        return context.organization_ids
+    return get_organization_ids_for_user(user_id)
+
+
+def _make_search_my_organization_policies(user_id: str, context=None):
     """Return a callable that searches policy content scoped to the user's organizations."""
 
     def _fn(query: str, top_k: int = 5, **kwargs):
-        org_ids = get_organization_ids_for_user(user_id)
+        org_ids = _organization_ids(user_id, context)
         if not org_ids:
             return {
                 "detail": "You are not a member of any organization. No policies to search.",
@@ -71,33 +100,35 @@ def _make_search_my_organization_policies(user_id: str):
         matches = RAGClient().query_policy_index(
             query, top_k=top_k, organization_ids=org_ids
         )
-        if not matches:
-            return {
-                "detail": "No matching policy content found in your organization's policies.",
-                "matches": [],
-            }
-        return {
-            "detail": f"Found {len(matches)} relevant excerpt(s) from your organization's policies.",
-            "matches": matches,
-        }
+        return format_organization_policy_matches(matches)
 
     return _fn
 
 
-def _make_get_my_pending_leaves(user_id: str):
-    """Return a callable that fetches approved leaves + leave policy for the user."""
+def _make_get_my_pending_leaves(user_id: str, context=None):
+    """Return a callable that fetches leave balances (or approved leaves + policy) for the user."""
 
     def _fn(**kwargs):
         approved = get_my_approved_leaves_summary(user_id)
-        org_ids = get_organization_ids_for_user(user_id)
+        org_ids = _organization_ids(user_id, context)
         if not org_ids:
             return {
                 "detail": "You are not a member of any organization. No leave data available.",
                 "approved_leaves": [],
                 "policy_excerpts": [],
             }
+        balances = get_my_leave_balances(user_id)
+        if balances["balances"]:
+            # Allowances were extracted when the policies were indexed: no search needed.
+            return {
+                "detail": f"Your leave balances for {balances['year']}, computed from your organization's leave policies.",
+                "balances": balances["balances"],
+                "approved_leaves": approved.get("approved_leaves", []),
+                "total_approved_days": approved.get("total_approved_days", 0),
+                "policy_excerpts": [],
+            }
         policy_matches = RAGClient().query_policy_index(
-            "leave policy days allowance sick leave privilege leave PTO annual vacation",
+            PENDING_LEAVES_POLICY_QUERY,
             top_k=5,
             organization_ids=org_ids,
         )
@@ -114,13 +145,18 @@ def _make_get_my_pending_leaves(user_id: str):
     return _fn
 
 
-def get_ai_function_map(user_id: str | None = None):
+def is_personal_tool(name: str) -> bool:
+    """Tools whose output is the requesting user's own data, not shared policy content."""
+    return name.startswith("get_my_")
+
+
+def get_ai_function_map(user_id: str | None = None, context=None):
     mapping = {
         "search_policy_embeddings": search_policy_embeddings,
     }
     if user_id is not None:
         mapping["search_my_organization_policies"] = _make_search_my_organization_policies(
-            user_id
+            user_id, context
         )
-        mapping["get_my_pending_leaves"] = _make_get_my_pending_leaves(user_id)
+        mapping["get_my_pending_leaves"] = _make_get_my_pending_leaves(user_id, context)
     return mapping
@@ -0,0 +1,71 @@
+import os
+import threading
+
+from application.cache import TTLCache
+
+
+class Transcript:
+    def __init__(self) -> None:
+        self.messages: list[dict[str, str]] = []
+        # Messages dropped from the front; cursors stay absolute across trimming.
+        self.offset = 0
+
+    @property
+    def cursor(self) -> int:
+        return self.offset + len(self.messages)
+
+
+class TranscriptStore:
+    """
+    Full message history per (owner, session), unlike SESSION_MEMORY which keeps
+    only the recent turns sent to the model. Cursors are absolute message indexes.
+    """
+
+    def __init__(self, ttl: float, max_sessions: int, max_messages: int):
+        self.max_messages = max_messages
+        self._transcripts = TTLCache(ttl=ttl, max_size=max_sessions)
+        self._lock = threading.Lock()
+
+    def append(
+        self, owner: str | None, session_id: str, messages: list[dict[str, str]]
+    ) -> int:
+        """Add this turn's messages; returns the cursor after them."""
+        key = (owner, session_id)
+        with self._lock:
+            transcript = self._transcripts.get(key) or Transcript()
+            transcript.messages.extend(messages)
+            overflow = len(transcript.messages) - self.max_messages
+            if overflow > 0:
+                del transcript.messages[:overflow]
+                transcript.offset += overflow
+            self._transcripts.set(key, transcript)
+            return transcript.cursor
+
+    def page(
+        self, owner: str | None, session_id: str, cursor: int = 0, limit: int = 50
+    ) -> dict | None:
+        with self._lock:
+            transcript = self._transcripts.get((owner, session_id))
+            if transcript is None:
+                return None
+            start = max(cursor, transcript.offset)
+            index = start - transcript.offset
+            messages = transcript.messages[index : index + limit]
+            end = start + len(messages)
+            return {
+                "session_id": session_id,
+                "messages": [dict(message) for message in messages],
+                "cursor": start,
+                "next_cursor": end if end < transcript.cursor else None,
+                "total": transcript.cursor,
+            }
+
+    def clear(self) -> None:
+        self._transcripts.clear()
+
+
+TRANSCRIPTS = TranscriptStore(
+    ttl=float(os.getenv("AI_TRANSCRIPT_TTL_SECONDS", "86400")),
+    max_sessions=int(os.getenv("AI_TRANSCRIPT_MAX_SESSIONS", "10000")),
+    max_messages=int(os.getenv("AI_TRANSCRIPT_MAX_MESSAGES", "1000")),
+)
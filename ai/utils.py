@@ -0,0 +1,23 @@
+import math
+import re
+from typing import Sequence
+
+
+def cosine_similarity(left: Sequence[float], right: Sequence[float]) -> float:
+    """Return the cosine similarity of two vectors (0.0 when either is empty)."""
+    dot = sum(a * b for a, b in zip(left, right))
+    left_norm = math.sqrt(sum(a * a for a in left))
+    right_norm = math.sqrt(sum(b * b for b in right))
+    if not left_norm or not right_norm:
+        return 0.0
+    return dot / (left_norm * right_norm)
+
+
+def normalize_question(text: str) -> str:
+    """Canonical form of a question for coalescing and cache keys."""
+    return re.sub(r"\s+", " ", text).strip().lower().rstrip("?!. ")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token)."""
+    return math.ceil(len(text) / 4)
@@ -0,0 +1,216 @@
+import asyncio
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Hashable
+
+from application.cache import TTLCache
+from application.metrics import METRICS
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    def __init__(self, rate_per_second: float, capacity: float):
+        self.rate = rate_per_second
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Take one token; returns 0 on success, else seconds until one is available."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.updated) * self.rate
+            )
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+    def refund(self) -> None:
+        """Give back a token taken by a request that was rejected further on."""
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + 1)
+
+
+class RateLimiter:
+    """One token bucket per key; ``rate_per_minute <= 0`` disables the limit."""
+
+    def __init__(self, name: str, rate_per_minute: float, burst: float):
+        self.name = name
+        self.rate_per_minute = rate_per_minute
+        self.burst = max(burst, 1)
+        # Idle buckets refill completely within this window, so they can be dropped.
+        idle_ttl = 60 * self.burst / rate_per_minute if rate_per_minute > 0 else 60
+        self._buckets = TTLCache(ttl=max(idle_ttl, 60), max_size=100_000)
+
+    def check(self, key: Hashable) -> float:
+        if self.rate_per_minute <= 0 or key is None:
+            return 0.0
+        bucket = self._buckets.get_or_set(
+            key, lambda: TokenBucket(self.rate_per_minute / 60, self.burst)
+        )
+        self._buckets.set(key, bucket)
+        retry_after = bucket.acquire()
+        if retry_after:
+            METRICS.counter(f"admission.{self.name}.rate_limited").inc()
+        return retry_after
+
+    def refund(self, key: Hashable) -> None:
+        if self.rate_per_minute <= 0 or key is None:
+            return
+        bucket = self._buckets.get(key)
+        if bucket is not None:
+            bucket.refund()
+
+
+class _Waiter:
+    def __init__(self, group: Hashable, member: Hashable):
+        self.loop = asyncio.get_running_loop()
+        self.future = self.loop.create_future()
+        self.group = group
+        self.member = member
+        self.admitted = False
+
+
+def _wake(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class FairAdmissionQueue:
+    """
+    Bounded concurrency gate with a wait queue. Freed slots go round-robin across
+    groups (organizations), then across members (users) within the group, so one
+    busy user or tenant cannot monopolize the slots.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_concurrency: int,
+        max_queue: int,
+        retry_after: float = 5,
+    ):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self.depth = 0
+        self._queues: OrderedDict[Hashable, OrderedDict[Hashable, deque[_Waiter]]] = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+        self._wait_seconds = METRICS.histogram(f"admission.{name}.wait_seconds")
+
+    def _publish(self) -> None:
+        METRICS.gauge(f"admission.{self.name}.in_flight").set(self.in_flight)
+        METRICS.gauge(f"admission.{self.name}.queue_depth").set(self.depth)
+
+    def _enqueue(self, waiter: _Waiter) -> None:
+        members = self._queues.setdefault(waiter.group, OrderedDict())
+        members.setdefault(waiter.member, deque()).append(waiter)
+        self.depth += 1
+
+    def _remove(self, waiter: _Waiter) -> None:
+        members = self._queues.get(waiter.group, {})
+        waiters = members.get(waiter.member)
+        if waiters is None or waiter not in waiters:
+            return
+        waiters.remove(waiter)
+        self.depth -= 1
+        if not waiters:
+            del members[waiter.member]
+        if not members:
+            self._queues.pop(waiter.group, None)
+
+    def _next_waiter(self) -> _Waiter | None:
+        if not self._queues:
+            return None
+        group, members = next(iter(self._queues.items()))
+        member, waiters = next(iter(members.items()))
+        waiter = waiters.popleft()
+        self.depth -= 1
+        # Rotate: this member and this group go to the back of their lines.
+        if waiters:
+            members.move_to_end(member)
+        else:
+            del members[member]
+        if members:
+            self._queues.move_to_end(group)
+        else:
+            del self._queues[group]
+        return waiter
+
+    async def acquire(
+        self, group: Hashable, member: Hashable, timeout: float | None = None
+    ) -> None:
+        """Wait for a slot; raises AdmissionRejected when the queue is full or times out."""
+        with self._lock:
+            if self.in_flight < self.max_concurrency and not self.depth:
+                self.in_flight += 1
+                self._publish()
+                self._wait_seconds.observe(0.0)
+                return
+            if self.depth >= self.max_queue:
+                METRICS.counter(f"admission.{self.name}.rejected").inc()
+                raise AdmissionRejected("queue_full", self.retry_after)
+            waiter = _Waiter(group, member)
+            self._enqueue(waiter)
+            self._publish()
+
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as exc:
+            with self._lock:
+                admitted = waiter.admitted
+                if not admitted:
+                    self._remove(waiter)
+                    self._publish()
+            if isinstance(exc, asyncio.CancelledError):
+                if admitted:
+                    self.release()
+                raise
+            if not admitted:
+                METRICS.counter(f"admission.{self.name}.timed_out").inc()
+                raise AdmissionRejected("queue_timeout", self.retry_after) from exc
+        self._wait_seconds.observe(time.monotonic() - started)
+
+    def release(self) -> None:
+        with self._lock:
+            waiter = self._next_waiter()
+            if waiter is None:
+                self.in_flight -= 1
+            else:
+                # The slot passes straight to the waiter; in_flight stays the same.
+                waiter.admitted = True
+            self._publish()
+        if waiter is not None:
+            waiter.loop.call_soon_threadsafe(_wake, waiter.future)
+
+    @asynccontextmanager
+    async def slot(
+        self, group: Hashable, member: Hashable, timeout: float | None = None
+    ) -> AsyncIterator[None]:
+        await self.acquire(group, member, timeout)
+        try:
+            yield
+        finally:
+            self.release()
+
+
+def retry_after_header(seconds: float) -> dict[str, str]:
+    return {"Retry-After": str(max(1, math.ceil(seconds)))}
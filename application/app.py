@@ -1,12 +1,18 @@
+import asyncio
 from datetime import datetime
 
-from fastapi import Depends, FastAPI
+from fastapi import Depends, FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from starlette.middleware.authentication import AuthenticationMiddleware
 
+from application.executors import configure_crud_lane
+from application.metrics import METRICS
+from application.tracing import RequestIdMiddleware, instrument_sqlalchemy
 from auth.backend import JWTAuthBackend
 from auth.dependencies import require_authenticated_user
-from database.db import drop_db, init_db
+from database.db import check_connection_budget, drop_db, engine, init_db
+from users.utils import require_admin
 
 app = FastAPI(
     title="Policy AI Agent API",
@@ -23,17 +29,31 @@ app.add_middleware(
     allow_headers=["*"],
 )
 app.add_middleware(AuthenticationMiddleware, backend=JWTAuthBackend())
+app.add_middleware(RequestIdMiddleware)
+instrument_sqlalchemy()
 
 import ai.apis
 import ai.db
 import auth.apis
 import organizations.apis
 import users.apis
+from ai.metering import METER
+from application.warmup import WARMUP
+from auth.principals import start_invalidation_listener
 
 
 @app.on_event("startup")
 def on_startup():
+    configure_crud_lane()
     init_db()
+    check_connection_budget()
+    WARMUP.start(loop=asyncio.get_running_loop())
+    start_invalidation_listener(engine)
+
+
+@app.on_event("shutdown")
+def on_shutdown():
+    METER.flush()
 
 
 @app.delete("/admin/drop-db")
@@ -42,6 +62,12 @@ async def drop_database():
     return {"status": "ok", "message": "Database tables dropped"}
 
 
+@app.get("/admin/metrics")
+async def get_metrics(request: Request):
+    require_admin(request.user.user_type)
+    return METRICS.snapshot()
+
+
 @app.get("/")
 async def root():
     return {
@@ -54,3 +80,9 @@ async def root():
 @app.get("/health")
 async def health_check():
     return {"status": "healthy", "timestamp": datetime.now().isoformat()}
+
+
+@app.get("/ready")
+async def readiness_check():
+    status_code = 200 if WARMUP.ready.is_set() else 503
+    return JSONResponse(status_code=status_code, content=WARMUP.status())
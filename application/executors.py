@@ -0,0 +1,91 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar, copy_context
+from functools import partial
+from typing import Any, Callable, TypeVar
+
+import anyio.to_thread
+
+from application.metrics import METRICS
+
+T = TypeVar("T")
+
+AI_LANE = "ai"
+INDEXING_LANE = "indexing"
+HASHING_LANE = "hashing"
+CRUD_LANE = "crud"
+
+_CURRENT_LANE: ContextVar[str] = ContextVar("lane", default=CRUD_LANE)
+
+
+class Lane:
+    """
+    A separately sized worker pool (bulkhead) for one class of work. Work queued
+    here cannot take threads from another lane, and DB sessions opened inside it
+    use the lane's own connection pool (see ``database.db``).
+    """
+
+    def __init__(self, name: str, max_workers: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix=f"lane-{name}"
+        )
+        self.active = 0
+        self.queued = 0
+        self._lock = threading.Lock()
+
+    def _publish(self) -> None:
+        METRICS.gauge(f"lane.{self.name}.active").set(self.active)
+        METRICS.gauge(f"lane.{self.name}.queued").set(self.queued)
+
+    def _run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        with self._lock:
+            self.queued -= 1
+            self.active += 1
+            self._publish()
+        token = _CURRENT_LANE.set(self.name)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _CURRENT_LANE.reset(token)
+            with self._lock:
+                self.active -= 1
+                self._publish()
+
+    def submit(self, fn: Callable[..., T], *args: Any, **kwargs: Any):
+        with self._lock:
+            self.queued += 1
+            self._publish()
+        return self.executor.submit(copy_context().run, self._run, fn, *args, **kwargs)
+
+
+LANES = {
+    AI_LANE: Lane(AI_LANE, int(os.getenv("AI_LANE_WORKERS", "16"))),
+    INDEXING_LANE: Lane(INDEXING_LANE, int(os.getenv("INDEXING_LANE_WORKERS", "2"))),
+    # bcrypt is CPU-bound, so more threads than cores only lengthens each hash.
+    HASHING_LANE: Lane(
+        HASHING_LANE, int(os.getenv("HASHING_LANE_WORKERS", str(os.cpu_count() or 2)))
+    ),
+}
+
+
+def current_lane() -> str:
+    return _CURRENT_LANE.get()
+
+
+async def run_in_lane(lane: str, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run blocking ``fn`` on ``lane``'s pool, keeping the caller's context (deadline, spans)."""
+    future = LANES[lane].submit(partial(fn, *args, **kwargs))
+    return await asyncio.wrap_future(future)
+
+
+def configure_crud_lane() -> None:
+    """
+    CRUD endpoints run sync dependencies and handlers on AnyIO's default thread
+    pool; size it on its own so it is independent of the AI and indexing lanes.
+    """
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    limiter.total_tokens = int(os.getenv("CRUD_LANE_WORKERS", "40"))
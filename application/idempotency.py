@@ -0,0 +1,135 @@
+import asyncio
+import hashlib
+import json
+from typing import Any, Awaitable, Callable, Hashable
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from application.cache import TTLCache
+from application.metrics import METRICS
+
+IDEMPOTENCY_KEY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+
+
+def request_fingerprint(*parts: Any) -> str:
+    payload = json.dumps(jsonable_encoder(parts), sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class _Completed:
+    def __init__(self, fingerprint: str, status_code: int, content: Any):
+        self.fingerprint = fingerprint
+        self.status_code = status_code
+        self.content = content
+
+
+class Unstored:
+    """A handler result that is returned but not kept for replay."""
+
+    def __init__(self, content: Any):
+        self.content = content
+
+
+class IdempotencyStore:
+    """
+    Runs a POST handler at most once per idempotency key. Successful responses are
+    kept for ``ttl`` seconds and replayed for repeats of the key; a repeat that
+    arrives while the first request is still running waits for its response.
+    Failures are not stored, so a retry after an error runs the handler again; a
+    handler can return ``Unstored(content)`` for results a retry should not get back
+    (e.g. a degraded answer).
+    """
+
+    def __init__(self, name: str, ttl: float, max_size: int = 10000):
+        self.name = name
+        self._completed = TTLCache(ttl=ttl, max_size=max_size)
+        self._in_flight: dict[Hashable, tuple[str, asyncio.Future]] = {}
+
+    def _replay(self, completed: _Completed) -> JSONResponse:
+        METRICS.counter(f"idempotency.{self.name}.replayed").inc()
+        return JSONResponse(
+            status_code=completed.status_code,
+            content=completed.content,
+            headers={REPLAYED_HEADER: "true"},
+        )
+
+    def _conflict(self) -> HTTPException:
+        METRICS.counter(f"idempotency.{self.name}.conflicts").inc()
+        return HTTPException(
+            status_code=422,
+            detail=f"{IDEMPOTENCY_KEY_HEADER} was already used for a different request",
+        )
+
+    async def respond(
+        self,
+        key: Hashable,
+        fingerprint: str,
+        handler: Callable[[], Awaitable[Any]],
+        status_code: int = 200,
+    ) -> JSONResponse:
+        """
+        ``key`` should include the caller's identity so keys never collide across
+        users; ``fingerprint`` identifies the request body the key was first used with.
+        """
+        completed = self._completed.get(key)
+        if completed is not None:
+            if completed.fingerprint != fingerprint:
+                raise self._conflict()
+            return self._replay(completed)
+
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            in_flight_fingerprint, future = in_flight
+            if in_flight_fingerprint != fingerprint:
+                raise self._conflict()
+            METRICS.counter(f"idempotency.{self.name}.waited").inc()
+            try:
+                completed = await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # The first request was cancelled (client went away); run it now.
+                return await self.respond(key, fingerprint, handler, status_code)
+            return self._replay(completed)
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = (fingerprint, future)
+        METRICS.counter(f"idempotency.{self.name}.executed").inc()
+        try:
+            result = await handler()
+            store = not isinstance(result, Unstored)
+            content = jsonable_encoder(result if store else result.content)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as exc:
+            future.set_exception(exc)
+            # Waiters get the error; nobody else needs to retrieve it.
+            future.exception()
+            raise
+        else:
+            completed = _Completed(fingerprint, status_code, content)
+            if store:
+                self._completed.set(key, completed)
+            else:
+                METRICS.counter(f"idempotency.{self.name}.not_stored").inc()
+            future.set_result(completed)
+            return JSONResponse(status_code=status_code, content=content)
+        finally:
+            self._in_flight.pop(key, None)
+
+    def clear(self) -> None:
+        self._completed.clear()
+
+
+def validate_idempotency_key(value: str | None) -> str | None:
+    if value is not None and not 0 < len(value) <= MAX_KEY_LENGTH:
+        raise HTTPException(
+            status_code=400,
+            detail=f"{IDEMPOTENCY_KEY_HEADER} must be 1-{MAX_KEY_LENGTH} characters",
+        )
+    return value
@@ -0,0 +1,53 @@
+import threading
+from typing import Any, Callable, Hashable
+
+from application.metrics import METRICS
+
+
+class _Call:
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException | None = None
+
+
+class SingleFlight:
+    """
+    Collapse concurrent calls that share a key into one execution. The first caller
+    runs ``fn``; callers arriving while it is in flight wait and get the same result
+    (or exception). Nothing is cached once the call completes.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(
+        self, key: Hashable, fn: Callable[[], Any], timeout: float | None = None
+    ) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            METRICS.counter(f"singleflight.{self.name}.shared").inc()
+            if not call.done.wait(timeout):
+                raise TimeoutError(f"Timed out waiting for in-flight {self.name} call")
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        METRICS.counter(f"singleflight.{self.name}.executed").inc()
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
@@ -0,0 +1,381 @@
+import json
+import logging
+import os
+import queue
+import secrets
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator
+
+import httpx
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+REQUEST_ID_HEADER = "X-Request-ID"
+MAX_STATEMENT_CHARS = 300
+
+
+class Span:
+    def __init__(
+        self,
+        name: str,
+        trace_id: str,
+        parent_id: str | None = None,
+        request_id: str | None = None,
+        attributes: dict[str, Any] | None = None,
+    ):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.request_id = request_id
+        self.attributes = dict(attributes or {})
+        self.status = "ok"
+        self.error: str | None = None
+        self.start_time = time.time()
+        self._started = time.perf_counter()
+        self.duration_ms: float | None = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def set_attributes(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def record_error(self, exc: BaseException) -> None:
+        self.status = "error"
+        self.error = f"{type(exc).__name__}: {exc}"
+
+    def end(self) -> None:
+        if self.duration_ms is None:
+            self.duration_ms = (time.perf_counter() - self._started) * 1000
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "request_id": self.request_id,
+            "start_time": self.start_time,
+            "duration_ms": self.duration_ms,
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+class _NoopSpan:
+    """Returned while tracing is off, so instrumented code never checks for it."""
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def set_attributes(self, **attributes: Any) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class LogExporter:
+    def export(self, span: Span) -> None:
+        logger.info("span %s", json.dumps(span.to_dict(), default=str))
+
+
+class InMemoryExporter:
+    """Keeps finished spans in a list; meant for tests."""
+
+    def __init__(self) -> None:
+        self.spans: list[Span] = []
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def find(self, name: str) -> list[Span]:
+        with self._lock:
+            return [span for span in self.spans if span.name == name]
+
+    def clear(self) -> None:
+        with self._lock:
+            self.spans.clear()
+
+
+class OTLPHttpExporter:
+    """
+    Sends spans as OTLP/HTTP JSON to ``{endpoint}/v1/traces`` from a background
+    thread, in batches, so request threads never wait on the collector.
+    """
+
+    def __init__(
+        self,
+        endpoint: str | None = None,
+        service_name: str | None = None,
+        batch_size: int = 100,
+        flush_interval: float = 2.0,
+    ):
+        endpoint = endpoint or os.getenv(
+            "OTEL_EXPORTER_OTLP_ENDPOINT", "http://localhost:4318"
+        )
+        self.url = endpoint.rstrip("/") + "/v1/traces"
+        self.service_name = service_name or os.getenv(
+            "OTEL_SERVICE_NAME", "policy-ai-agent"
+        )
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: queue.Queue[Span] = queue.Queue(maxsize=10000)
+        self._client = httpx.Client(timeout=5)
+        threading.Thread(target=self._worker, name="otlp-exporter", daemon=True).start()
+
+    def export(self, span: Span) -> None:
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            logger.warning("Dropping span %s: exporter queue is full", span.name)
+
+    def _worker(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size and time.monotonic() < deadline:
+                try:
+                    batch.append(
+                        self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                    )
+                except queue.Empty:
+                    break
+            try:
+                self._client.post(self.url, json=self._payload(batch))
+            except httpx.HTTPError as exc:
+                logger.warning("Failed to export %s span(s): %s", len(batch), exc)
+
+    def _attribute(self, key: str, value: Any) -> dict:
+        if isinstance(value, bool):
+            return {"key": key, "value": {"boolValue": value}}
+        if isinstance(value, int):
+            return {"key": key, "value": {"intValue": str(value)}}
+        if isinstance(value, float):
+            return {"key": key, "value": {"doubleValue": value}}
+        return {"key": key, "value": {"stringValue": str(value)}}
+
+    def _payload(self, spans: list[Span]) -> dict:
+        otlp_spans = []
+        for span in spans:
+            start_ns = int(span.start_time * 1e9)
+            attributes = {**span.attributes, "request_id": span.request_id}
+            otlp_spans.append(
+                {
+                    "traceId": span.trace_id,
+                    "spanId": span.span_id,
+                    "parentSpanId": span.parent_id or "",
+                    "name": span.name,
+                    "kind": 1,
+                    "startTimeUnixNano": str(start_ns),
+                    "endTimeUnixNano": str(
+                        start_ns + int((span.duration_ms or 0) * 1e6)
+                    ),
+                    "attributes": [
+                        self._attribute(key, value)
+                        for key, value in attributes.items()
+                        if value is not None
+                    ],
+                    "status": (
+                        {"code": 2, "message": span.error}
+                        if span.status == "error"
+                        else {"code": 1}
+                    ),
+                }
+            )
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": [
+                            self._attribute("service.name", self.service_name)
+                        ]
+                    },
+                    "scopeSpans": [
+                        {"scope": {"name": "policy-ai-agent"}, "spans": otlp_spans}
+                    ],
+                }
+            ]
+        }
+
+
+EXPORTERS = {
+    "log": LogExporter,
+    "otlp": OTLPHttpExporter,
+    "memory": InMemoryExporter,
+}
+
+_CURRENT_SPAN: ContextVar[Span | None] = ContextVar("span", default=None)
+_REQUEST_ID: ContextVar[str | None] = ContextVar("request_id", default=None)
+
+
+class Tracer:
+    def __init__(self, exporter=None):
+        self.exporter = exporter
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None
+
+    def start(self, name: str, **attributes: Any) -> Span | None:
+        """Start a span under the current one without making it current (see ``span``)."""
+        if self.exporter is None:
+            return None
+        parent = _CURRENT_SPAN.get()
+        request_id = _REQUEST_ID.get()
+        if parent is not None:
+            trace_id = parent.trace_id
+        else:
+            # The request id doubles as the trace id when it has the OTLP shape.
+            trace_id = request_id if _is_trace_id(request_id) else secrets.token_hex(16)
+        return Span(
+            name,
+            trace_id=trace_id,
+            parent_id=parent.span_id if parent else None,
+            request_id=request_id,
+            attributes=attributes,
+        )
+
+    def finish(self, span: Span | None) -> None:
+        if span is None or self.exporter is None:
+            return
+        span.end()
+        try:
+            self.exporter.export(span)
+        except Exception:
+            logger.exception("Span exporter failed")
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Span | _NoopSpan]:
+        span = self.start(name, **attributes)
+        if span is None:
+            yield NOOP_SPAN
+            return
+        token = _CURRENT_SPAN.set(span)
+        try:
+            yield span
+        except BaseException as exc:
+            span.record_error(exc)
+            raise
+        finally:
+            _CURRENT_SPAN.reset(token)
+            self.finish(span)
+
+
+def _is_trace_id(value: str | None) -> bool:
+    if not value or len(value) != 32:
+        return False
+    try:
+        int(value, 16)
+    except ValueError:
+        return False
+    return True
+
+
+def build_exporter(name: str | None = None):
+    name = (name or os.getenv("TRACING_EXPORTER", "none")).lower()
+    exporter_class = EXPORTERS.get(name)
+    return exporter_class() if exporter_class else None
+
+
+TRACER = Tracer(build_exporter())
+
+
+def start_span(name: str, **attributes: Any):
+    """Context manager for a child span of the current one; a no-op when tracing is off."""
+    return TRACER.span(name, **attributes)
+
+
+def current_request_id() -> str | None:
+    return _REQUEST_ID.get()
+
+
+class RequestIdMiddleware:
+    """
+    Assigns every HTTP request an id (the incoming X-Request-ID or a new one),
+    echoes it on the response and wraps the request in a root span.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope.get("headers") or [])
+        incoming = headers.get(REQUEST_ID_HEADER.lower().encode(), b"").decode(
+            "latin-1"
+        )
+        request_id = incoming[:128] or uuid.uuid4().hex
+        token = _REQUEST_ID.set(request_id)
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = [
+                    *message["headers"],
+                    (REQUEST_ID_HEADER.lower().encode(), request_id.encode("latin-1")),
+                ]
+                span.set_attribute("http.status_code", message["status"])
+            await send(message)
+
+        try:
+            with start_span(
+                "http.request",
+                **{"http.method": scope.get("method"), "http.path": scope.get("path")},
+            ) as span:
+                await self.app(scope, receive, send_with_request_id)
+        finally:
+            _REQUEST_ID.reset(token)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    span = TRACER.start(
+        "db.query",
+        **{
+            "db.system": conn.dialect.name,
+            "db.statement": statement[:MAX_STATEMENT_CHARS],
+        },
+    )
+    if span is not None:
+        conn.info.setdefault("trace_spans", []).append(span)
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    spans = conn.info.get("trace_spans")
+    if spans:
+        span = spans.pop()
+        span.set_attribute("db.rowcount", cursor.rowcount)
+        TRACER.finish(span)
+
+
+def _handle_error(exception_context):
+    spans = (
+        exception_context.connection.info.get("trace_spans")
+        if exception_context.connection
+        else None
+    )
+    if spans:
+        span = spans.pop()
+        span.record_error(exception_context.original_exception)
+        TRACER.finish(span)
+
+
+def instrument_sqlalchemy() -> None:
+    """Record a span for every statement executed by any engine."""
+    if event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(Engine, "handle_error", _handle_error)
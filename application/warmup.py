@@ -0,0 +1,175 @@
+import asyncio
+import inspect
+import logging
+import os
+import threading
+import time
+from contextlib import AsyncExitStack
+from typing import Callable
+
+from sqlalchemy import text
+
+from ai.context import ALL_TOOLS
+from ai.rag import RAGClient
+from ai.router import IntentRouter
+from ai.tools import PENDING_LEAVES_POLICY_QUERY
+from application.metrics import METRICS
+from database import db as database
+from database.db import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Fixed queries the tools send to the policy index; embedded once at warmup.
+TOOL_QUERIES = [PENDING_LEAVES_POLICY_QUERY]
+
+
+def _warmup_connections(pool) -> int:
+    requested = int(os.getenv("WARMUP_DB_CONNECTIONS", "5"))
+    # Connections beyond the pool size would just be discarded when returned.
+    return min(requested, pool.size()) if hasattr(pool, "size") else requested
+
+
+def warm_database_pool() -> dict:
+    """
+    Open the AI and indexing lanes' pooled connections up front so first requests
+    skip connect + auth. Request handlers' pool is warmed by the async step.
+    """
+    engines = {}
+    for lane in database.LANE_POOL_SIZES:
+        # On SQLite every lane shares the base engine.
+        lane_engine = database.engine_for_lane(database.engine, lane)
+        engines.setdefault(id(lane_engine), (lane, lane_engine))
+    pools = {}
+    for lane, lane_engine in engines.values():
+        connections = [
+            lane_engine.connect() for _ in range(_warmup_connections(lane_engine.pool))
+        ]
+        try:
+            for connection in connections:
+                connection.execute(text("SELECT 1"))
+        finally:
+            for connection in connections:
+                connection.close()
+        pools[lane] = len(connections)
+    return {"connections": sum(pools.values()), "pools": pools}
+
+
+async def warm_async_database_pool() -> dict:
+    """Open the request handlers' pooled connections up front."""
+    async with AsyncExitStack() as stack:
+        connections = [
+            await stack.enter_async_context(database.async_engine.connect())
+            for _ in range(_warmup_connections(database.async_engine.pool))
+        ]
+        for connection in connections:
+            await connection.execute(text("SELECT 1"))
+    return {"connections": len(connections)}
+
+
+def warm_imports() -> dict:
+    """Import the document parsers that policy uploads otherwise load lazily."""
+    loaded = []
+    for module in ("pypdf", "docx"):
+        try:
+            __import__(module)
+            loaded.append(module)
+        except ImportError:
+            pass
+    return {"modules": loaded}
+
+
+def warm_provider() -> dict:
+    """Open the provider connection and pin the embeddings of the fixed tool queries."""
+    return {"pinned_queries": RAGClient().pin_query_embeddings(TOOL_QUERIES)}
+
+
+def warm_router() -> dict:
+    if os.getenv("AI_ROUTER_ENABLED", "false").lower() != "true":
+        return {"skipped": "router disabled"}
+    router = IntentRouter(available_tools=[tool["name"] for tool in ALL_TOOLS])
+    return {"exemplars": len(router.exemplar_vectors())}
+
+
+def prewarm_vector_index() -> dict:
+    """Load the embeddings table and its indexes into shared buffers (Postgres only)."""
+    with SessionLocal() as db:
+        dialect = db.get_bind().dialect.name
+        if dialect != "postgresql":
+            return {"skipped": f"unsupported dialect {dialect}"}
+        db.execute(text("CREATE EXTENSION IF NOT EXISTS pg_prewarm"))
+        blocks = db.execute(
+            text(
+                "SELECT coalesce(sum(pg_prewarm(c.oid)), 0) FROM pg_class c "
+                "WHERE c.oid = 'policy_embeddings'::regclass OR c.oid IN ("
+                "SELECT indexrelid FROM pg_index "
+                "WHERE indrelid = 'policy_embeddings'::regclass)"
+            )
+        ).scalar()
+        db.commit()
+    return {"blocks": int(blocks or 0)}
+
+
+WARMUP_STEPS: list[tuple[str, Callable[[], dict]]] = [
+    ("database_pool", warm_database_pool),
+    ("async_database_pool", warm_async_database_pool),
+    ("imports", warm_imports),
+    ("provider", warm_provider),
+    ("router", warm_router),
+    ("vector_index", prewarm_vector_index),
+]
+
+
+class Warmup:
+    """
+    Runs the warmup steps once per process. A failing step is logged and recorded
+    but does not block readiness: a cold pod is better than one that never serves.
+    """
+
+    def __init__(self, steps: list[tuple[str, Callable[[], dict]]] | None = None):
+        self.steps = steps if steps is not None else WARMUP_STEPS
+        self.ready = threading.Event()
+        self.results: dict[str, dict] = {}
+        self.loop: asyncio.AbstractEventLoop | None = None
+
+    def _call(self, step: Callable[[], dict]) -> dict:
+        if not inspect.iscoroutinefunction(step):
+            return step()
+        if self.loop is None:
+            return {"skipped": "no event loop"}
+        # Async pool connections belong to the loop that opened them, so they are
+        # opened on the application's loop.
+        return asyncio.run_coroutine_threadsafe(step(), self.loop).result()
+
+    def run(self) -> None:
+        for name, step in self.steps:
+            started = time.monotonic()
+            try:
+                result = {"status": "ok", **(self._call(step) or {})}
+            except Exception as exc:
+                logger.exception("Warmup step %s failed", name)
+                result = {"status": "failed", "error": str(exc)}
+            result["seconds"] = round(time.monotonic() - started, 3)
+            METRICS.histogram(f"warmup.{name}.seconds").observe(result["seconds"])
+            self.results[name] = result
+        self.ready.set()
+        logger.info("Warmup finished: %s", self.results)
+
+    def start(self, loop: asyncio.AbstractEventLoop | None = None) -> None:
+        """
+        Warm up in the background when WARMUP_ENABLED; otherwise report ready at
+        once. Async steps run on ``loop``, the application's event loop.
+        """
+        if os.getenv("WARMUP_ENABLED", "false").lower() != "true":
+            self.ready.set()
+            return
+        self.loop = loop
+        threading.Thread(target=self.run, name="warmup", daemon=True).start()
+
+    def status(self) -> dict:
+        return {
+            "status": "ready" if self.ready.is_set() else "warming_up",
+            "steps": dict(self.results),
+        }
+
+
+WARMUP = Warmup()
@@ -2,12 +2,15 @@ from datetime import timedelta
 
 from fastapi import Depends, HTTPException
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from application.app import app
 from auth.jwt import JWT_EXPIRE_MINUTES, create_access_token
-from auth.passwords import verify_password
+from auth.passwords import verify_and_rehash_async
+from auth.principals import membership_claims_enabled
 from database.db import get_db
+from organizations.db import fetch_active_organization_ids
 from users.models import User
 
 
@@ -22,16 +25,29 @@ class TokenResponse(BaseModel):
 
 
 @app.post("/login", response_model=TokenResponse)
-async def login(payload: TokenRequest, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.username == payload.username).first()
+async def login(payload: TokenRequest, db: AsyncSession = Depends(get_db)):
+    user = await db.scalar(select(User).where(User.username == payload.username))
     if not user:
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
-    if not verify_password(payload.password, user.password_hash):
+    valid, new_hash = await verify_and_rehash_async(
+        payload.password, user.password_hash
+    )
+    if not valid:
         raise HTTPException(status_code=401, detail="Invalid credentials")
-
+    if new_hash:
+        user.password_hash = new_hash
+        await db.commit()
+
+    membership_claims = {}
+    if membership_claims_enabled():
+        membership_claims = {
+            "organization_ids": await fetch_active_organization_ids(db, str(user.id)),
+            "membership_version": user.membership_version or 0,
+        }
     token = create_access_token(
         {"sub": str(user.id), "user_type": str(user.user_type)},
         expires_delta=timedelta(minutes=JWT_EXPIRE_MINUTES),
+        **membership_claims,
     )
     return TokenResponse(access_token=token, token_type="bearer")
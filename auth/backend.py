@@ -1,5 +1,6 @@
 from typing import Optional, Tuple
 
+from sqlalchemy import select
 from starlette.authentication import (
     AuthCredentials,
     AuthenticationBackend,
@@ -8,16 +9,29 @@ from starlette.authentication import (
 )
 from starlette.requests import HTTPConnection
 
-from auth.jwt import decode_access_token
-from database.db import SessionLocal
+from application.metrics import METRICS
+from auth.jwt import MEMBERSHIP_VERSION_CLAIM, ORGANIZATIONS_CLAIM, decode_access_token
+from auth.principals import PRINCIPALS, membership_claims_enabled, set_current_principal
+from database.db import AsyncSessionLocal
+from organizations.db import fetch_active_organization_ids
 from users.models import User
 
 
 class UserPrincipal(BaseUser):
-    def __init__(self, user_id: str, user_type: str, display_name: str) -> None:
+    def __init__(
+        self,
+        user_id: str,
+        user_type: str,
+        display_name: str,
+        membership_version: int = 0,
+        organization_ids: Optional[Tuple[str, ...]] = None,
+    ) -> None:
         self.user_id = user_id
         self.user_type = user_type
         self._display_name = display_name
+        self.membership_version = membership_version
+        # Active organization ids when membership claims are on, else None.
+        self.organization_ids = organization_ids
 
     @property
     def is_authenticated(self) -> bool:
@@ -28,6 +42,45 @@ class UserPrincipal(BaseUser):
         return self.user_id
 
 
+def _claimed_organization_ids(
+    payload: dict, membership_version: int
+) -> Optional[Tuple[str, ...]]:
+    organization_ids = payload.get(ORGANIZATIONS_CLAIM)
+    if payload.get(MEMBERSHIP_VERSION_CLAIM) != membership_version:
+        return None
+    if not isinstance(organization_ids, list):
+        return None
+    return tuple(str(org) for org in organization_ids)
+
+
+async def _load_principal(user_id: str, payload: dict) -> Optional[UserPrincipal]:
+    async with AsyncSessionLocal() as db:
+        user = await db.scalar(select(User).where(User.id == user_id))
+
+        if not user:
+            return None
+
+        membership_version = user.membership_version or 0
+        organization_ids = None
+        if membership_claims_enabled():
+            organization_ids = _claimed_organization_ids(payload, membership_version)
+            if organization_ids is None:
+                # Token without claims, or issued before the memberships changed.
+                METRICS.counter("auth.membership_claims.refreshed").inc()
+                organization_ids = tuple(
+                    sorted(await fetch_active_organization_ids(db, user_id))
+                )
+
+    user_type = getattr(user.user_type, "value", str(user.user_type))
+    return UserPrincipal(
+        user_id=str(user.id),
+        user_type=user_type,
+        display_name=user.email,
+        membership_version=membership_version,
+        organization_ids=organization_ids,
+    )
+
+
 class JWTAuthBackend(AuthenticationBackend):
     async def authenticate(
         self, conn: HTTPConnection
@@ -40,7 +93,7 @@ class JWTAuthBackend(AuthenticationBackend):
             return AuthCredentials([]), UnauthenticatedUser()
 
         try:
-            payload = decode_access_token(token)
+            payload = PRINCIPALS.claims(token, decode_access_token)
         except ValueError:
             return AuthCredentials([]), UnauthenticatedUser()
 
@@ -48,16 +101,11 @@ class JWTAuthBackend(AuthenticationBackend):
         if not user_id:
             return AuthCredentials([]), UnauthenticatedUser()
 
-        with SessionLocal() as db:
-            user = db.query(User).filter(User.id == user_id).first()
-
-        if not user:
-            return AuthCredentials([]), UnauthenticatedUser()
-
-        user_type = getattr(user.user_type, "value", str(user.user_type))
-        principal = UserPrincipal(
-            user_id=str(user.id),
-            user_type=user_type,
-            display_name=user.email,
-        )
+        principal = PRINCIPALS.get(user_id)
+        if principal is None:
+            principal = await _load_principal(user_id, payload)
+            if principal is None:
+                return AuthCredentials([]), UnauthenticatedUser()
+            PRINCIPALS.set(user_id, principal)
+        set_current_principal(principal)
         return AuthCredentials(["authenticated"]), principal
@@ -3,6 +3,7 @@ from fastapi import HTTPException, Request
 PUBLIC_PATHS = {
     "/",
     "/health",
+    "/ready",
     "/docs",
     "/openapi.json",
     "/redoc",
@@ -8,11 +8,24 @@ JWT_SECRET = os.getenv("JWT_SECRET")
 JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
 JWT_EXPIRE_MINUTES = int(os.getenv("JWT_EXPIRE_MINUTES", "60"))
 
+ORGANIZATIONS_CLAIM = "orgs"
+MEMBERSHIP_VERSION_CLAIM = "mv"
+
 
 def create_access_token(
-    data: dict[str, Any], expires_delta: timedelta | None = None
+    data: dict[str, Any],
+    expires_delta: timedelta | None = None,
+    organization_ids: list[str] | None = None,
+    membership_version: int | None = None,
 ) -> str:
+    """
+    Pass ``organization_ids`` and the user's ``membership_version`` to embed the
+    active memberships, so requests can be authorized without looking them up.
+    """
     to_encode = data.copy()
+    if organization_ids is not None and membership_version is not None:
+        to_encode[ORGANIZATIONS_CLAIM] = sorted(str(org) for org in organization_ids)
+        to_encode[MEMBERSHIP_VERSION_CLAIM] = membership_version
     expire = datetime.now(timezone.utc) + (
         expires_delta or timedelta(minutes=JWT_EXPIRE_MINUTES)
     )
@@ -1,6 +1,24 @@
+import os
+
 from passlib.context import CryptContext
 
-pwd_context = CryptContext(schemes=["bcrypt_sha256", "bcrypt"], deprecated="auto")
+from application.executors import HASHING_LANE, run_in_lane
+
+
+def _build_context() -> CryptContext:
+    settings = {}
+    rounds = os.getenv("PASSWORD_HASH_ROUNDS")
+    if rounds:
+        # Hashes made with fewer rounds are upgraded the next time the user logs in.
+        for scheme in ("bcrypt_sha256", "bcrypt"):
+            settings[f"{scheme}__default_rounds"] = int(rounds)
+            settings[f"{scheme}__min_rounds"] = int(rounds)
+    return CryptContext(
+        schemes=["bcrypt_sha256", "bcrypt"], deprecated="auto", **settings
+    )
+
+
+pwd_context = _build_context()
 
 
 def _normalize_password(password: str) -> str:
@@ -16,3 +34,26 @@ def verify_password(password: str, hashed_password: str) -> bool:
     if hashed_password.startswith("$2"):
         password = _normalize_password(password)
     return pwd_context.verify(password, hashed_password)
+
+
+def verify_and_rehash(password: str, hashed_password: str) -> tuple[bool, str | None]:
+    """
+    Verify ``password``; when it matches a hash made with an outdated scheme or
+    cost, also return a fresh hash to store in its place.
+    """
+    if not verify_password(password, hashed_password):
+        return False, None
+    if pwd_context.needs_update(hashed_password):
+        return True, hash_password(password)
+    return True, None
+
+
+async def hash_password_async(password: str) -> str:
+    """``hash_password`` on the hashing lane, so bcrypt never blocks the event loop."""
+    return await run_in_lane(HASHING_LANE, hash_password, password)
+
+
+async def verify_and_rehash_async(
+    password: str, hashed_password: str
+) -> tuple[bool, str | None]:
+    return await run_in_lane(HASHING_LANE, verify_and_rehash, password, hashed_password)
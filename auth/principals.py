@@ -0,0 +1,222 @@
+import hashlib
+import logging
+import os
+import select
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Callable
+
+from sqlalchemy import event, func
+from sqlalchemy import select as sql_select
+from sqlalchemy.orm import Session
+
+from application.cache import TTLCache
+from application.metrics import METRICS
+from organizations.models import UserOrganization
+from users.models import User
+
+logger = logging.getLogger(__name__)
+
+# Payload that asks every worker to drop all cached principals.
+ALL_USERS = "*"
+
+_PRINCIPAL: ContextVar[Any] = ContextVar("principal", default=None)
+
+
+def token_digest(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+class PrincipalCache:
+    """
+    Caches what authenticating a request needs: the decoded claims of a bearer
+    token (keyed by the token's digest, never beyond its ``exp``) and the
+    principal loaded for its user (keyed by user id). Invalidating a user drops
+    its principal, so the next request reloads it from the database.
+    """
+
+    def __init__(self, ttl: float, max_size: int = 10000):
+        self.ttl = ttl
+        self._claims = TTLCache(ttl=ttl, max_size=max_size)
+        self._principals = TTLCache(ttl=ttl, max_size=max_size)
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def claims(
+        self, token: str, decode: Callable[[str], dict[str, Any]]
+    ) -> dict[str, Any]:
+        """Decoded claims for ``token``; ``decode`` errors propagate and are not cached."""
+        if not self.enabled:
+            return decode(token)
+        key = token_digest(token)
+        claims = self._claims.get(key)
+        if claims is not None:
+            return claims
+        claims = decode(token)
+        ttl = self.ttl
+        expires = claims.get("exp")
+        if isinstance(expires, (int, float)):
+            ttl = min(ttl, expires - time.time())
+        if ttl > 0:
+            self._claims.set(key, claims, ttl=ttl)
+        return claims
+
+    def get(self, user_id: str) -> Any:
+        if not self.enabled:
+            return None
+        principal = self._principals.get(str(user_id))
+        outcome = "misses" if principal is None else "hits"
+        METRICS.counter(f"auth.principal_cache.{outcome}").inc()
+        return principal
+
+    def set(self, user_id: str, principal: Any) -> None:
+        if self.enabled:
+            self._principals.set(str(user_id), principal)
+
+    def invalidate(self, user_id: str) -> None:
+        if user_id == ALL_USERS:
+            self.clear()
+            return
+        self._principals.pop(str(user_id))
+        METRICS.counter("auth.principal_cache.invalidations").inc()
+
+    def clear(self) -> None:
+        self._claims.clear()
+        self._principals.clear()
+
+
+PRINCIPALS = PrincipalCache(
+    ttl=float(os.getenv("AUTH_PRINCIPAL_CACHE_SECONDS", "60")),
+    max_size=int(os.getenv("AUTH_PRINCIPAL_CACHE_SIZE", "10000")),
+)
+
+
+def membership_claims_enabled() -> bool:
+    return os.getenv("AUTH_MEMBERSHIP_CLAIMS", "false").lower() == "true"
+
+
+def set_current_principal(principal: Any) -> None:
+    _PRINCIPAL.set(principal)
+
+
+def principal_organization_ids(user_id: str | None) -> list[str] | None:
+    """
+    Active organization ids of the request's authenticated user, when they came
+    with the principal (membership claims); ``None`` means look them up.
+    """
+    principal = _PRINCIPAL.get()
+    if principal is None or user_id is None or principal.identity != str(user_id):
+        return None
+    organization_ids = getattr(principal, "organization_ids", None)
+    return None if organization_ids is None else list(organization_ids)
+
+
+def invalidation_channel() -> str | None:
+    """Postgres NOTIFY channel shared by workers, if cross-worker invalidation is on."""
+    return os.getenv("AUTH_INVALIDATION_CHANNEL") or None
+
+
+@event.listens_for(Session, "before_flush")
+def _bump_membership_versions(session, flush_context, instances):
+    user_ids = {
+        obj.user_id
+        for obj in (*session.new, *session.dirty, *session.deleted)
+        if isinstance(obj, UserOrganization)
+        and obj.user_id is not None
+        and (obj not in session.dirty or session.is_modified(obj))
+    }
+    for user_id in user_ids:
+        user = session.get(User, user_id)
+        if user is not None and user not in session.deleted:
+            user.membership_version = (user.membership_version or 0) + 1
+
+
+@event.listens_for(Session, "after_flush")
+def _note_user_changes(session, flush_context):
+    changed = {
+        str(obj.id)
+        for obj in (*session.dirty, *session.deleted)
+        if isinstance(obj, User) and obj.id is not None
+    }
+    if not changed:
+        return
+    session.info.setdefault("auth_users_changed", set()).update(changed)
+    channel = invalidation_channel()
+    if channel and session.get_bind().dialect.name == "postgresql":
+        # NOTIFY is transactional: other workers only hear about committed changes.
+        for user_id in changed:
+            session.execute(sql_select(func.pg_notify(channel, user_id)))
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session):
+    for user_id in session.info.pop("auth_users_changed", ()):
+        PRINCIPALS.invalidate(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_after_rollback(session):
+    session.info.pop("auth_users_changed", None)
+
+
+class InvalidationListener:
+    """
+    Background ``LISTEN`` on the invalidation channel, so a user deleted or
+    re-typed through one worker stops being served from the others' caches.
+    """
+
+    def __init__(self, engine, channel: str, reconnect_seconds: float = 5):
+        self.engine = engine
+        self.channel = channel
+        self.reconnect_seconds = reconnect_seconds
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name="auth-invalidation", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                self._listen()
+            except Exception:
+                logger.exception("Principal invalidation listener failed; reconnecting")
+            # Notifications may have been missed while disconnected.
+            PRINCIPALS.clear()
+            self._stopped.wait(self.reconnect_seconds)
+
+    def _listen(self) -> None:
+        connection = self.engine.raw_connection()
+        try:
+            dbapi_connection = connection.dbapi_connection
+            dbapi_connection.autocommit = True
+            with dbapi_connection.cursor() as cursor:
+                cursor.execute(f'LISTEN "{self.channel}"')
+            while not self._stopped.is_set():
+                if select.select([dbapi_connection], [], [], 1.0) == ([], [], []):
+                    continue
+                dbapi_connection.poll()
+                while dbapi_connection.notifies:
+                    notify = dbapi_connection.notifies.pop(0)
+                    PRINCIPALS.invalidate(notify.payload)
+        finally:
+            connection.invalidate()
+
+
+def start_invalidation_listener(engine) -> InvalidationListener | None:
+    channel = invalidation_channel()
+    if not channel or engine.dialect.name != "postgresql":
+        return None
+    listener = InvalidationListener(engine, channel)
+    listener.start()
+    return listener
@@ -1,7 +1,22 @@
+import logging
 import os
+import threading
 
 from sqlalchemy import create_engine, text
-from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, declarative_base, sessionmaker
+
+from application.executors import AI_LANE, INDEXING_LANE, current_lane
+from application.metrics import METRICS
+from database.pool import (
+    configure_pre_ping,
+    connection_budget_problem,
+    engine_options,
+    pool_capacity,
+)
+
+logger = logging.getLogger(__name__)
 
 
 def _build_database_url() -> str:
@@ -16,19 +31,134 @@ def _build_database_url() -> str:
     return f"postgresql+psycopg2://{user}:{password}@{host}:{port}/{db}"
 
 
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+
+def async_database_url(url: str) -> str:
+    """The same database as ``url``, reached through its asyncio driver."""
+    parsed = make_url(url)
+    driver = ASYNC_DRIVERS.get(parsed.get_backend_name())
+    if driver is None:
+        raise ValueError(f"No async driver configured for {parsed.drivername}")
+    return parsed.set(drivername=driver).render_as_string(hide_password=False)
+
+
 DATABASE_URL = _build_database_url()
 
-engine = create_engine(DATABASE_URL, pool_pre_ping=True)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Sync engine: worker threads (agent tools, indexing, metering) and scripts.
+ENGINE_OPTIONS = engine_options(DATABASE_URL, name="crud")
+engine = create_engine(DATABASE_URL, **ENGINE_OPTIONS)
+configure_pre_ping(engine)
+# Async engine: request handlers, so a slow query never blocks the event loop.
+ASYNC_DATABASE_URL = async_database_url(DATABASE_URL)
+ASYNC_ENGINE_OPTIONS = engine_options(ASYNC_DATABASE_URL, name="async", is_async=True)
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **ASYNC_ENGINE_OPTIONS)
+configure_pre_ping(async_engine)
+
+# Separate connection pools for the AI and indexing lanes, so a burst of agent runs
+# cannot take the connections CRUD endpoints need; those use ``async_engine``.
+LANE_POOL_SIZES = {
+    AI_LANE: (
+        int(os.getenv("AI_DB_POOL_SIZE", "5")),
+        int(os.getenv("AI_DB_MAX_OVERFLOW", "5")),
+    ),
+    INDEXING_LANE: (
+        int(os.getenv("INDEXING_DB_POOL_SIZE", "2")),
+        int(os.getenv("INDEXING_DB_MAX_OVERFLOW", "0")),
+    ),
+}
+_LANE_ENGINES: dict[tuple[str, str], Engine] = {}
+_LANE_ENGINES_LOCK = threading.Lock()
+
+
+def _lane_engine_options(url: str, lane: str) -> dict:
+    pool_size, max_overflow = LANE_POOL_SIZES[lane]
+    return engine_options(
+        url, name=lane, pool_size=pool_size, max_overflow=max_overflow
+    )
+
+
+def engine_for_lane(base: Engine, lane: str) -> Engine:
+    if lane not in LANE_POOL_SIZES or base.dialect.name == "sqlite":
+        return base
+    key = (base.url.render_as_string(hide_password=False), lane)
+    with _LANE_ENGINES_LOCK:
+        lane_engine = _LANE_ENGINES.get(key)
+        if lane_engine is None:
+            url = base.url.render_as_string(hide_password=False)
+            lane_engine = _LANE_ENGINES[key] = create_engine(
+                url, **_lane_engine_options(url, lane)
+            )
+            configure_pre_ping(lane_engine)
+        return lane_engine
+
+
+def connection_budget() -> dict[str, int | None]:
+    """
+    Most connections each of this process's Postgres pools may open: the sync and
+    async engines each take DB_POOL_SIZE + DB_MAX_OVERFLOW, each lane its own size.
+    """
+    if engine.dialect.name != "postgresql":
+        return {}
+    return {
+        "crud": pool_capacity(ENGINE_OPTIONS),
+        "async": pool_capacity(ASYNC_ENGINE_OPTIONS),
+        **{
+            lane: pool_capacity(_lane_engine_options(DATABASE_URL, lane))
+            for lane in LANE_POOL_SIZES
+        },
+    }
+
+
+def check_connection_budget() -> None:
+    """
+    Warn at startup when DB_PROCESSES processes (e.g. uvicorn workers), each with
+    every pool full, would exceed Postgres' max_connections.
+    """
+    budget = connection_budget()
+    if not budget:
+        return
+    if None not in budget.values():
+        METRICS.gauge("db.pool.connection_budget").set(sum(budget.values()))
+    try:
+        with engine.connect() as connection:
+            available = connection.execute(
+                text(
+                    "SELECT current_setting('max_connections')::int"
+                    " - current_setting('superuser_reserved_connections')::int"
+                )
+            ).scalar()
+    except Exception:
+        logger.exception("Could not read max_connections to check the pool budget")
+        return
+    problem = connection_budget_problem(
+        budget, available, int(os.getenv("DB_PROCESSES", "1"))
+    )
+    if problem:
+        logger.warning(problem)
+
+
+class LaneSession(Session):
+    """Session that checks connections out of the current executor lane's pool."""
+
+    def get_bind(self, mapper=None, **kwargs):
+        return engine_for_lane(super().get_bind(mapper, **kwargs), current_lane())
+
+
+SessionLocal = sessionmaker(
+    class_=LaneSession, autocommit=False, autoflush=False, bind=engine
+)
+# Objects stay loaded after commit: reloading expired attributes would need IO
+# outside an await.
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, class_=AsyncSession, expire_on_commit=False
+)
 Base = declarative_base()
 
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 
 def init_db():
@@ -39,6 +169,20 @@ def init_db():
     except Exception:
         pass
     Base.metadata.create_all(bind=engine)
+    _add_missing_columns()
+
+
+def _add_missing_columns():
+    """Columns added to existing tables after they were first created."""
+    if engine.dialect.name != "postgresql":
+        return
+    with engine.begin() as connection:
+        connection.execute(
+            text(
+                "ALTER TABLE users ADD COLUMN IF NOT EXISTS "
+                "membership_version INTEGER NOT NULL DEFAULT 0"
+            )
+        )
 
 
 def drop_db():
@@ -0,0 +1,179 @@
+import os
+import time
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from application.metrics import METRICS
+
+PRE_PING_STRATEGIES = ("always", "idle", "never")
+
+
+class _InstrumentedPoolMixin:
+    """
+    Publishes ``db.pool.<name>.*`` metrics: checkout wait (ms), connections in
+    use, current overflow, overflow connections opened and checkout timeouts.
+    The name is the engine's ``pool_logging_name``, which survives pool recreation.
+    """
+
+    @property
+    def metrics_name(self) -> str:
+        return self._orig_logging_name or "default"
+
+    def _publish(self) -> None:
+        prefix = f"db.pool.{self.metrics_name}"
+        METRICS.gauge(f"{prefix}.in_use").set(self.checkedout())
+        METRICS.gauge(f"{prefix}.overflow").set(max(self.overflow(), 0))
+
+    def _do_get(self):
+        prefix = f"db.pool.{self.metrics_name}"
+        overflow_before = self.overflow()
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            METRICS.counter(f"{prefix}.timeouts").inc()
+            raise
+        finally:
+            waited_ms = (time.perf_counter() - started) * 1000
+            METRICS.histogram(f"{prefix}.checkout_wait_ms").observe(waited_ms)
+            if self.overflow() > max(overflow_before, 0):
+                METRICS.counter(f"{prefix}.overflow_connections").inc()
+            self._publish()
+
+    def _do_return_conn(self, record) -> None:
+        super()._do_return_conn(record)
+        self._publish()
+
+
+class InstrumentedQueuePool(_InstrumentedPoolMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def _pre_ping_strategy() -> str:
+    strategy = os.getenv("DB_PRE_PING", "always").lower()
+    if strategy not in PRE_PING_STRATEGIES:
+        raise ValueError(
+            f"DB_PRE_PING must be one of {', '.join(PRE_PING_STRATEGIES)}: {strategy!r}"
+        )
+    return strategy
+
+
+def _session_settings(url) -> dict:
+    """Postgres timeouts applied to every new connection, in the driver's format."""
+    settings = {
+        "statement_timeout": int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0")),
+        "idle_in_transaction_session_timeout": int(
+            os.getenv("DB_IDLE_IN_TRANSACTION_TIMEOUT_MS", "0")
+        ),
+    }
+    settings = {name: value for name, value in settings.items() if value > 0}
+    if not settings or url.get_backend_name() != "postgresql":
+        return {}
+    if url.get_driver_name() == "asyncpg":
+        return {
+            "server_settings": {name: str(value) for name, value in settings.items()}
+        }
+    return {
+        "options": " ".join(f"-c {name}={value}" for name, value in settings.items())
+    }
+
+
+def engine_options(url: str, name: str, is_async: bool = False, **overrides) -> dict:
+    """
+    ``create_engine`` keyword arguments for ``url`` from the ``DB_*`` settings.
+    Pool sizing and instrumentation only apply to Postgres; SQLite keeps
+    SQLAlchemy's defaults.
+    """
+    parsed = make_url(url)
+    options = {"pool_pre_ping": _pre_ping_strategy() == "always"}
+    if parsed.get_backend_name() != "postgresql":
+        return options
+    options.update(
+        poolclass=InstrumentedAsyncQueuePool if is_async else InstrumentedQueuePool,
+        pool_logging_name=name,
+        pool_size=int(os.getenv("DB_POOL_SIZE", "5")),
+        max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "10")),
+        pool_timeout=float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "30")),
+        pool_recycle=int(os.getenv("DB_POOL_RECYCLE_SECONDS", "-1")),
+    )
+    connect_args = _session_settings(parsed)
+    if connect_args:
+        options["connect_args"] = connect_args
+    options.update(overrides)
+    return options
+
+
+def pool_capacity(options: dict) -> int | None:
+    """
+    Most connections an engine built from ``engine_options`` holds at once (pool
+    plus overflow); 0 when it is not pooled here, None when overflow is unbounded.
+    """
+    if "poolclass" not in options:
+        return 0
+    if options["max_overflow"] < 0:
+        return None
+    return options["pool_size"] + options["max_overflow"]
+
+
+def connection_budget_problem(
+    capacities: dict[str, int | None], available: int, processes: int
+) -> str | None:
+    """
+    Why ``processes`` processes, each holding the pools in ``capacities``, could
+    exceed the ``available`` Postgres connections; None when they fit.
+    """
+    unbounded = sorted(
+        name for name, capacity in capacities.items() if capacity is None
+    )
+    if unbounded:
+        return f"Pools {', '.join(unbounded)} have unbounded overflow (max_overflow=-1)"
+    per_process = sum(capacities.values())
+    if per_process * processes <= available:
+        return None
+    pools = ", ".join(f"{name}={capacity}" for name, capacity in capacities.items())
+    return (
+        f"{processes} process(es) x {per_process} pooled connections ({pools}) "
+        f"exceed the {available} connections Postgres accepts; lower DB_POOL_SIZE, "
+        "DB_MAX_OVERFLOW or the lane pool sizes"
+    )
+
+
+def configure_pre_ping(engine) -> None:
+    """
+    With ``DB_PRE_PING=idle``, only connections that sat in the pool longer than
+    ``DB_PRE_PING_IDLE_SECONDS`` are pinged on checkout, instead of every checkout
+    paying the extra round trip.
+    """
+    if _pre_ping_strategy() != "idle":
+        return
+    idle_seconds = float(os.getenv("DB_PRE_PING_IDLE_SECONDS", "30"))
+    engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(engine, "connect")
+    def _mark_connected(dbapi_connection, record):
+        record.info["checked_in_at"] = time.monotonic()
+
+    @event.listens_for(engine, "checkin")
+    def _mark_checked_in(dbapi_connection, record):
+        record.info["checked_in_at"] = time.monotonic()
+
+    @event.listens_for(engine, "checkout")
+    def _ping_if_idle(dbapi_connection, record, proxy):
+        idle = time.monotonic() - record.info.get("checked_in_at", 0.0)
+        if idle < idle_seconds:
+            return
+        try:
+            cursor = dbapi_connection.cursor()
+            try:
+                cursor.execute("SELECT 1")
+            finally:
+                cursor.close()
+        except Exception as error:
+            # The pool discards this connection and checks out a fresh one.
+            raise exc.DisconnectionError() from error
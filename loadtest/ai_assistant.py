@@ -0,0 +1,384 @@
+"""
+Load test for ``POST /ai_assistant``.
+
+Seeds organizations, users, memberships and indexed policies, then drives the
+endpoint in-process (real ``PolicyAgent``/``CohereClient`` loop, tools and RAG
+SQL) at increasing concurrency against the mock or replay provider, and reports
+throughput, latency percentiles, event-loop lag and DB pool checkout wait.
+
+    python -m loadtest.ai_assistant --concurrency 1,8,32 --duration 20 \\
+        --chat-latency lognormal:800,0.4 --output after.json --baseline before.json
+
+Needs a Postgres database with pgvector (``DATABASE_URL``), as in docker compose.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import date
+
+# Provider stand-in and limits must be configured before the app is imported.
+os.environ.setdefault("COHERE_MODE", "mock")
+os.environ.setdefault("AI_USER_RATE_PER_MINUTE", "0")
+
+import httpx  # noqa: E402
+from sqlalchemy import delete  # noqa: E402
+from sqlalchemy.pool import Pool  # noqa: E402
+
+QUESTIONS = (
+    "How many days of annual leave do I get per year?",
+    "What is the sick leave policy?",
+    "How many leaves do I have remaining this year?",
+    "Which organization am I a member of?",
+    "Can I carry over unused vacation days?",
+    "What is my pending leave balance?",
+)
+
+POLICY_TEXT = """{name}
+
+Employees are entitled to {annual} days of annual leave per year.
+Employees are entitled to {sick} days of sick leave per year.
+Unused vacation days may be carried over for up to three months.
+Leave requests must be submitted at least two weeks in advance and approved by a
+manager. Emergency leave is granted at the discretion of the organization.
+"""
+
+
+def percentile(values: list[float], pct: float) -> float | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def _ms(value: float | None) -> float | None:
+    return round(value * 1000, 2) if value is not None else None
+
+
+def summarize(
+    concurrency: int,
+    elapsed: float,
+    latencies: list[float],
+    statuses: dict[int, int],
+    loop_lags: list[float],
+    pool_waits: list[float],
+) -> dict:
+    ok = statuses.get(200, 0)
+    return {
+        "concurrency": concurrency,
+        "requests": sum(statuses.values()),
+        "ok": ok,
+        "rejected": statuses.get(429, 0) + statuses.get(503, 0),
+        "errors": sum(n for code, n in statuses.items() if code not in (200, 429, 503)),
+        "rps": round(ok / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": _ms(percentile(latencies, 50)),
+        "p95_ms": _ms(percentile(latencies, 95)),
+        "p99_ms": _ms(percentile(latencies, 99)),
+        "mean_ms": _ms(statistics.fmean(latencies)) if latencies else None,
+        "loop_lag_p99_ms": _ms(percentile(loop_lags, 99)),
+        "loop_lag_max_ms": _ms(max(loop_lags, default=None)),
+        "pool_wait_p95_ms": _ms(percentile(pool_waits, 95)),
+        "pool_wait_max_ms": _ms(max(pool_waits, default=None)),
+        "statuses": {str(code): n for code, n in sorted(statuses.items())},
+    }
+
+
+@contextmanager
+def measure_pool_waits(waits: list[float]):
+    """Time every connection checkout from any SQLAlchemy pool."""
+    original = Pool.connect
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return original(self)
+        finally:
+            waits.append(time.perf_counter() - started)
+
+    Pool.connect = connect
+    try:
+        yield
+    finally:
+        Pool.connect = original
+
+
+async def measure_loop_lag(lags: list[float], stop: asyncio.Event, interval=0.01):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        started = loop.time()
+        await asyncio.sleep(interval)
+        lags.append(max(loop.time() - started - interval, 0.0))
+
+
+def seed(organizations: int, users_per_org: int, policies_per_org: int) -> dict:
+    from ai.rag import RAGClient
+    from auth.jwt import create_access_token
+    from auth.passwords import hash_password
+    from database.db import SessionLocal
+    from organizations.models import Organization, Policy, UserOrganization
+    from users.choices import UserType
+    from users.models import User
+
+    run_id = uuid.uuid4().hex[:8]
+    password_hash = hash_password(uuid.uuid4().hex)
+    documents = tempfile.mkdtemp(prefix=f"loadtest-{run_id}-")
+    seeded = {"organizations": [], "users": [], "tokens": [], "documents": documents}
+    rag = RAGClient()
+    with SessionLocal() as db:
+        for org_index in range(organizations):
+            org = Organization(
+                name=f"loadtest-{run_id}-org-{org_index}",
+                email=f"org{org_index}@loadtest.invalid",
+                is_active=True,
+            )
+            db.add(org)
+            db.flush()
+            seeded["organizations"].append(str(org.id))
+            policies = []
+            for policy_index in range(policies_per_org):
+                name = f"Leave policy {policy_index}"
+                path = os.path.join(documents, f"{org.id}-{policy_index}.txt")
+                with open(path, "w", encoding="utf-8") as handle:
+                    handle.write(
+                        POLICY_TEXT.format(
+                            name=name, annual=15 + policy_index, sick=10 + org_index
+                        )
+                    )
+                policy = Policy(
+                    organization_id=org.id,
+                    name=name,
+                    document_name=os.path.basename(path),
+                    file=path,
+                    is_active=True,
+                )
+                db.add(policy)
+                policies.append(policy)
+            for user_index in range(users_per_org):
+                username = f"loadtest-{run_id}-{org_index}-{user_index}"
+                user = User(
+                    first_name="load",
+                    last_name="test",
+                    username=username,
+                    password_hash=password_hash,
+                    email=f"{username}@loadtest.invalid",
+                    phone="0000000000",
+                    gender="other",
+                    user_type=UserType.REGULAR,
+                    date_of_birth=date(1990, 1, 1),
+                )
+                db.add(user)
+                db.flush()
+                db.add(
+                    UserOrganization(
+                        user_id=user.id,
+                        organization_id=org.id,
+                        joined_date=date(2020, 1, 1),
+                        is_active=True,
+                    )
+                )
+                seeded["users"].append(str(user.id))
+                seeded["tokens"].append(
+                    create_access_token(
+                        {"sub": str(user.id), "user_type": str(user.user_type)}
+                    )
+                )
+            db.commit()
+            for policy in policies:
+                rag.index_policy_document(
+                    policy_id=str(policy.id),
+                    organization_id=str(org.id),
+                    policy_name=policy.name,
+                    description=None,
+                    document_name=policy.document_name,
+                    file_path=policy.file,
+                )
+    return seeded
+
+
+def cleanup(seeded: dict) -> None:
+    from ai.db import PolicyEmbedding
+    from database.db import SessionLocal
+    from organizations.models import Organization, Policy, UserOrganization
+    from users.models import LeaveRequest, User
+
+    org_ids = [uuid.UUID(org_id) for org_id in seeded["organizations"]]
+    user_ids = [uuid.UUID(user_id) for user_id in seeded["users"]]
+    with SessionLocal() as db:
+        db.execute(
+            delete(PolicyEmbedding).where(PolicyEmbedding.organization_id.in_(org_ids))
+        )
+        db.execute(delete(LeaveRequest).where(LeaveRequest.user_id.in_(user_ids)))
+        db.execute(
+            delete(UserOrganization).where(UserOrganization.user_id.in_(user_ids))
+        )
+        for policy in db.query(Policy).filter(Policy.organization_id.in_(org_ids)):
+            db.delete(policy)
+        db.execute(delete(User).where(User.id.in_(user_ids)))
+        db.execute(delete(Organization).where(Organization.id.in_(org_ids)))
+        db.commit()
+
+
+async def run_level(
+    client: httpx.AsyncClient,
+    tokens: list[str],
+    concurrency: int,
+    duration: float,
+    unique_questions: bool,
+) -> dict:
+    latencies: list[float] = []
+    statuses: dict[int, int] = {}
+    loop_lags: list[float] = []
+    pool_waits: list[float] = []
+    stop = asyncio.Event()
+    rng = random.Random(concurrency)
+
+    async def worker(worker_id: int):
+        ends_at = time.perf_counter() + duration
+        while time.perf_counter() < ends_at:
+            question = rng.choice(QUESTIONS)
+            if unique_questions:
+                question = f"{question} (ref {uuid.uuid4().hex[:6]})"
+            headers = {"Authorization": f"Bearer {rng.choice(tokens)}"}
+            started = time.perf_counter()
+            try:
+                response = await client.post(
+                    "/ai_assistant", json={"question": question}, headers=headers
+                )
+                status = response.status_code
+            except httpx.HTTPError:
+                status = 0
+            if status == 200:
+                latencies.append(time.perf_counter() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    lag_probe = asyncio.create_task(measure_loop_lag(loop_lags, stop))
+    started = time.perf_counter()
+    with measure_pool_waits(pool_waits):
+        await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await lag_probe
+    return summarize(concurrency, elapsed, latencies, statuses, loop_lags, pool_waits)
+
+
+def print_report(results: list[dict], baseline: list[dict] | None = None) -> None:
+    columns = (
+        "concurrency",
+        "ok",
+        "rejected",
+        "errors",
+        "rps",
+        "p50_ms",
+        "p95_ms",
+        "p99_ms",
+        "loop_lag_p99_ms",
+        "pool_wait_p95_ms",
+    )
+    print(" ".join(f"{column:>16}" for column in columns))
+    by_level = {row["concurrency"]: row for row in baseline or []}
+    for row in results:
+        print(" ".join(f"{str(row[column]):>16}" for column in columns))
+        before = by_level.get(row["concurrency"])
+        if before:
+            deltas = []
+            for column in ("rps", "p95_ms", "p99_ms"):
+                if before.get(column) and row.get(column) is not None:
+                    change = (row[column] - before[column]) / before[column] * 100
+                    deltas.append(f"{column} {change:+.1f}%")
+            print(f"{'vs baseline:':>16} " + ", ".join(deltas))
+
+
+async def main(args: argparse.Namespace) -> list[dict]:
+    from application.app import app
+    from application.executors import configure_crud_lane
+    from database.db import init_db
+
+    init_db()
+    configure_crud_lane()
+    seeded = seed(args.organizations, args.users_per_org, args.policies_per_org)
+    results = []
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://loadtest", timeout=None
+        ) as client:
+            for concurrency in args.concurrency:
+                result = await run_level(
+                    client,
+                    seeded["tokens"],
+                    concurrency,
+                    args.duration,
+                    args.unique_questions,
+                )
+                results.append(result)
+                print(json.dumps(result))
+    finally:
+        if not args.keep_data:
+            cleanup(seeded)
+    return results
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--concurrency",
+        type=lambda value: [int(level) for level in value.split(",")],
+        default=[1, 4, 16, 32],
+        help="comma-separated concurrency levels, run in order",
+    )
+    parser.add_argument("--duration", type=float, default=20, help="seconds per level")
+    parser.add_argument("--organizations", type=int, default=5)
+    parser.add_argument("--users-per-org", type=int, default=20)
+    parser.add_argument("--policies-per-org", type=int, default=2)
+    parser.add_argument(
+        "--chat-latency", help="provider chat latency, e.g. lognormal:800,0.4"
+    )
+    parser.add_argument(
+        "--embed-latency", help="provider embed latency, e.g. lognormal:60,0.3"
+    )
+    parser.add_argument(
+        "--recording", help="replay this recording instead of the mock provider"
+    )
+    parser.add_argument(
+        "--unique-questions",
+        action="store_true",
+        help="make every question unique so answer caches never hit",
+    )
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", help="compare against an earlier --output file")
+    parser.add_argument(
+        "--keep-data", action="store_true", help="do not delete the seeded rows"
+    )
+    return parser.parse_args(argv)
+
+
+def configure_provider(args: argparse.Namespace) -> None:
+    if args.recording:
+        os.environ["COHERE_MODE"] = "replay"
+        os.environ["COHERE_RECORDING_PATH"] = args.recording
+    if args.chat_latency:
+        os.environ["COHERE_REPLAY_CHAT_LATENCY"] = args.chat_latency
+    if args.embed_latency:
+        os.environ["COHERE_REPLAY_EMBED_LATENCY"] = args.embed_latency
+
+
+if __name__ == "__main__":
+    arguments = parse_args()
+    configure_provider(arguments)
+    level_results = asyncio.run(main(arguments))
+    baseline_results = None
+    if arguments.baseline:
+        with open(arguments.baseline, encoding="utf-8") as baseline_file:
+            baseline_results = json.load(baseline_file)
+    print_report(level_results, baseline_results)
+    if arguments.output:
+        with open(arguments.output, "w", encoding="utf-8") as output_file:
+            json.dump(level_results, output_file, indent=2)
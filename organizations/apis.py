@@ -1,10 +1,23 @@
 import logging
+import os
+import uuid
+from functools import partial
 
-from fastapi import Depends, File, Form, HTTPException, UploadFile
-from sqlalchemy.orm import Session
+from fastapi import Depends, File, Form, Header, HTTPException, Request, UploadFile
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from application.app import app
+from ai.answer_cache import ANSWER_CACHE
+from ai.context import invalidate_agent_context
 from ai.rag import RAGClient
+from application.executors import INDEXING_LANE, run_in_lane
+from application.idempotency import (
+    IDEMPOTENCY_KEY_HEADER,
+    IdempotencyStore,
+    request_fingerprint,
+    validate_idempotency_key,
+)
 from database.db import get_db
 from organizations.models import (
     Organization,
@@ -14,6 +27,7 @@ from organizations.models import (
     OrganizationsListResponse,
     Policy,
     PolicyItem,
+    PolicyLeaveAllowance,
     PolicyResponse,
     PoliciesListResponse,
     UserOrganization,
@@ -28,11 +42,15 @@ from users.models import User
 
 logger = logging.getLogger(__name__)
 
+POLICY_IDEMPOTENCY = IdempotencyStore(
+    "policies", ttl=float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+)
+
 
 # Organization APIs
 @app.get("/organizations", response_model=OrganizationsListResponse)
-async def get_organizations(db: Session = Depends(get_db)):
-    rows = db.query(Organization).order_by(Organization.created.desc()).all()
+async def get_organizations(db: AsyncSession = Depends(get_db)):
+    rows = (await db.scalars(select(Organization).order_by(Organization.created.desc()))).all()
     organizations = [
         OrganizationItem(
             id=str(row.id),
@@ -56,8 +74,8 @@ async def get_organizations(db: Session = Depends(get_db)):
 
 
 @app.get("/organizations/{organization_id}", response_model=OrganizationItem)
-async def get_organization(organization_id: str, db: Session = Depends(get_db)):
-    org = db.query(Organization).filter(Organization.id == organization_id).first()
+async def get_organization(organization_id: str, db: AsyncSession = Depends(get_db)):
+    org = await db.scalar(select(Organization).where(Organization.id == organization_id))
     if not org:
         raise HTTPException(status_code=404, detail="Organization not found")
     return OrganizationItem(
@@ -74,10 +92,10 @@ async def get_organization(organization_id: str, db: Session = Depends(get_db)):
 
 @app.post("/organizations", response_model=OrganizationResponse)
 async def create_organization(
-    organization: OrganizationRequest, db: Session = Depends(get_db)
+    organization: OrganizationRequest, db: AsyncSession = Depends(get_db)
 ):
     # Check if organization with same name exists
-    existing = db.query(Organization).filter(Organization.name == organization.name).first()
+    existing = await db.scalar(select(Organization).where(Organization.name == organization.name))
     if existing:
         raise HTTPException(status_code=400, detail="Organization with this name already exists")
 
@@ -90,8 +108,8 @@ async def create_organization(
         is_active=organization.is_active,
     )
     db.add(new_org)
-    db.commit()
-    db.refresh(new_org)
+    await db.commit()
+    await db.refresh(new_org)
 
     return OrganizationResponse(
         id=str(new_org.id),
@@ -108,9 +126,9 @@ async def create_organization(
 async def update_organization(
     organization_id: str,
     organization: OrganizationRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
-    org = db.query(Organization).filter(Organization.id == organization_id).first()
+    org = await db.scalar(select(Organization).where(Organization.id == organization_id))
     if not org:
         raise HTTPException(status_code=404, detail="Organization not found")
 
@@ -120,8 +138,9 @@ async def update_organization(
     org.email = organization.email
     org.phone = organization.phone
     org.is_active = organization.is_active
-    db.commit()
-    db.refresh(org)
+    await db.commit()
+    await db.refresh(org)
+    invalidate_agent_context()
 
     return OrganizationResponse(
         id=str(org.id),
@@ -135,22 +154,23 @@ async def update_organization(
 
 
 @app.delete("/organizations/{organization_id}")
-async def delete_organization(organization_id: str, db: Session = Depends(get_db)):
-    org = db.query(Organization).filter(Organization.id == organization_id).first()
+async def delete_organization(organization_id: str, db: AsyncSession = Depends(get_db)):
+    org = await db.scalar(select(Organization).where(Organization.id == organization_id))
     if not org:
         raise HTTPException(status_code=404, detail="Organization not found")
-    db.delete(org)
-    db.commit()
+    await db.delete(org)
+    await db.commit()
+    invalidate_agent_context()
     return {"status": "ok", "message": "Organization deleted"}
 
 
 # Policy APIs
 @app.get("/policies", response_model=PoliciesListResponse)
-async def get_policies(db: Session = Depends(get_db)):
-    rows = db.query(Policy).order_by(Policy.created.desc()).all()
+async def get_policies(db: AsyncSession = Depends(get_db)):
+    rows = (await db.scalars(select(Policy).order_by(Policy.created.desc()))).all()
     policies = []
     for row in rows:
-        org = db.query(Organization).filter(Organization.id == row.organization_id).first()
+        org = await db.scalar(select(Organization).where(Organization.id == row.organization_id))
         policies.append(
             PolicyItem(
                 id=str(row.id),
@@ -174,11 +194,11 @@ async def get_policies(db: Session = Depends(get_db)):
 
 
 @app.get("/policies/{policy_id}", response_model=PolicyItem)
-async def get_policy(policy_id: str, db: Session = Depends(get_db)):
-    policy = db.query(Policy).filter(Policy.id == policy_id).first()
+async def get_policy(policy_id: str, db: AsyncSession = Depends(get_db)):
+    policy = await db.scalar(select(Policy).where(Policy.id == policy_id))
     if not policy:
         raise HTTPException(status_code=404, detail="Policy not found")
-    org = db.query(Organization).filter(Organization.id == policy.organization_id).first()
+    org = await db.scalar(select(Organization).where(Organization.id == policy.organization_id))
     return PolicyItem(
         id=str(policy.id),
         organization_id=str(policy.organization_id),
@@ -193,12 +213,12 @@ async def get_policy(policy_id: str, db: Session = Depends(get_db)):
 
 
 @app.get("/organizations/{organization_id}/policies", response_model=PoliciesListResponse)
-async def get_organization_policies(organization_id: str, db: Session = Depends(get_db)):
-    org = db.query(Organization).filter(Organization.id == organization_id).first()
+async def get_organization_policies(organization_id: str, db: AsyncSession = Depends(get_db)):
+    org = await db.scalar(select(Organization).where(Organization.id == organization_id))
     if not org:
         raise HTTPException(status_code=404, detail="Organization not found")
 
-    rows = db.query(Policy).filter(Policy.organization_id == organization_id).order_by(Policy.created.desc()).all()
+    rows = (await db.scalars(select(Policy).where(Policy.organization_id == organization_id).order_by(Policy.created.desc()))).all()
     policies = [
         PolicyItem(
             id=str(row.id),
@@ -224,15 +244,50 @@ async def get_organization_policies(organization_id: str, db: Session = Depends(
 
 @app.post("/policies", response_model=PolicyResponse)
 async def create_policy(
+    request: Request,
     organization_id: str = Form(...),
     name: str = Form(...),
     description: str = Form(None),
     is_active: bool = Form(True),
     file: UploadFile = File(None),
-    db: Session = Depends(get_db),
+    idempotency_key: str | None = Header(None, alias=IDEMPOTENCY_KEY_HEADER),
+    db: AsyncSession = Depends(get_db),
 ):
+    """
+    A retry that repeats the Idempotency-Key header gets the first response back
+    instead of uploading and indexing the document again.
+    """
+    validate_idempotency_key(idempotency_key)
+    create = partial(
+        _create_policy, organization_id, name, description, is_active, file, db
+    )
+    if idempotency_key is None:
+        return await create()
+    user = request.user
+    return await POLICY_IDEMPOTENCY.respond(
+        (user.identity if user.is_authenticated else None, idempotency_key),
+        request_fingerprint(
+            organization_id,
+            name,
+            description,
+            is_active,
+            file.filename if file else None,
+            file.size if file else None,
+        ),
+        create,
+    )
+
+
+async def _create_policy(
+    organization_id: str,
+    name: str,
+    description: str | None,
+    is_active: bool,
+    file: UploadFile | None,
+    db: AsyncSession,
+) -> PolicyResponse:
     # Verify organization exists
-    org = db.query(Organization).filter(Organization.id == organization_id).first()
+    org = await db.scalar(select(Organization).where(Organization.id == organization_id))
     if not org:
         raise HTTPException(status_code=404, detail="Organization not found")
 
@@ -252,11 +307,13 @@ async def create_policy(
         is_active=is_active,
     )
     db.add(new_policy)
-    db.commit()
-    db.refresh(new_policy)
+    await db.commit()
+    await db.refresh(new_policy)
     if file_path:
         try:
-            RAGClient().index_policy_document(
+            await run_in_lane(
+                INDEXING_LANE,
+                RAGClient().index_policy_document,
                 policy_id=str(new_policy.id),
                 organization_id=str(new_policy.organization_id),
                 policy_name=new_policy.name,
@@ -286,33 +343,46 @@ async def update_policy(
     description: str = Form(None),
     is_active: bool = Form(True),
     file: UploadFile = File(None),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
-    existing_policy = db.query(Policy).filter(Policy.id == policy_id).first()
+    existing_policy = await db.scalar(select(Policy).where(Policy.id == policy_id))
     if not existing_policy:
         raise HTTPException(status_code=404, detail="Policy not found")
 
     # Verify organization exists
-    org = db.query(Organization).filter(Organization.id == organization_id).first()
+    org = await db.scalar(select(Organization).where(Organization.id == organization_id))
     if not org:
         raise HTTPException(status_code=404, detail="Organization not found")
 
     # Handle file upload
+    previous_organization_id = str(existing_policy.organization_id)
+    moved = previous_organization_id != organization_id
+    policy_allowances = PolicyLeaveAllowance.policy_id == existing_policy.id
     if file and file.filename:
         # Delete old file if exists
         delete_file_if_exists(existing_policy.file)
         existing_policy.document_name = file.filename
         existing_policy.file = await save_upload_file(file)
+        # The old document's allowances go; reindexing extracts the new ones.
+        await db.execute(delete(PolicyLeaveAllowance).where(policy_allowances))
+    elif moved:
+        await db.execute(
+            update(PolicyLeaveAllowance)
+            .where(policy_allowances)
+            .values(organization_id=uuid.UUID(organization_id))
+        )
 
     existing_policy.organization_id = organization_id
     existing_policy.name = name
     existing_policy.description = description
     existing_policy.is_active = is_active
-    db.commit()
-    db.refresh(existing_policy)
+    await db.commit()
+    await db.refresh(existing_policy)
     if file and file.filename and existing_policy.file:
         try:
-            RAGClient().index_policy_document(
+            await run_in_lane(
+                INDEXING_LANE,
+                RAGClient().index_policy_document,
                 policy_id=str(existing_policy.id),
                 organization_id=str(existing_policy.organization_id),
                 policy_name=existing_policy.name,
@@ -322,6 +392,19 @@ async def update_policy(
             )
         except Exception as exc:
             logger.exception("Failed to reindex policy document", extra={"error": str(exc)})
+        if moved:
+            # Reindexing only retires the new organization's cached answers.
+            ANSWER_CACHE.invalidate([previous_organization_id])
+    elif moved:
+        try:
+            await run_in_lane(
+                INDEXING_LANE,
+                RAGClient().move_policy_in_index,
+                str(existing_policy.id),
+                str(existing_policy.organization_id),
+            )
+        except Exception as exc:
+            logger.exception("Failed to move policy in index", extra={"error": str(exc)})
 
     return PolicyResponse(
         id=str(existing_policy.id),
@@ -335,32 +418,34 @@ async def update_policy(
 
 
 @app.delete("/policies/{policy_id}")
-async def delete_policy(policy_id: str, db: Session = Depends(get_db)):
-    policy = db.query(Policy).filter(Policy.id == policy_id).first()
+async def delete_policy(policy_id: str, db: AsyncSession = Depends(get_db)):
+    policy = await db.scalar(select(Policy).where(Policy.id == policy_id))
     if not policy:
         raise HTTPException(status_code=404, detail="Policy not found")
 
     # Delete associated file if exists
     delete_file_if_exists(policy.file)
     try:
-        RAGClient().remove_policy_from_index(str(policy.id))
+        await run_in_lane(
+            INDEXING_LANE, RAGClient().remove_policy_from_index, str(policy.id)
+        )
     except Exception as exc:
         logger.exception("Failed to remove policy from index", extra={"error": str(exc)})
 
-    db.delete(policy)
-    db.commit()
+    await db.delete(policy)
+    await db.commit()
     return {"status": "ok", "message": "Policy deleted"}
 
 
 # User Organization (Membership) APIs
 @app.get("/user_organizations", response_model=UserOrganizationsListResponse)
-async def get_user_organizations(db: Session = Depends(get_db)):
+async def get_user_organizations(db: AsyncSession = Depends(get_db)):
     """Get all user-organization memberships."""
-    rows = db.query(UserOrganization).order_by(UserOrganization.created.desc()).all()
+    rows = (await db.scalars(select(UserOrganization).order_by(UserOrganization.created.desc()))).all()
     memberships = []
     for row in rows:
-        user = db.query(User).filter(User.id == row.user_id).first()
-        org = db.query(Organization).filter(Organization.id == row.organization_id).first()
+        user = await db.scalar(select(User).where(User.id == row.user_id))
+        org = await db.scalar(select(Organization).where(Organization.id == row.organization_id))
         memberships.append(
             UserOrganizationItem(
                 id=str(row.id),
@@ -384,14 +469,14 @@ async def get_user_organizations(db: Session = Depends(get_db)):
 
 
 @app.get("/user_organizations/{membership_id}", response_model=UserOrganizationItem)
-async def get_user_organization(membership_id: str, db: Session = Depends(get_db)):
+async def get_user_organization(membership_id: str, db: AsyncSession = Depends(get_db)):
     """Get a specific user-organization membership."""
-    membership = db.query(UserOrganization).filter(UserOrganization.id == membership_id).first()
+    membership = await db.scalar(select(UserOrganization).where(UserOrganization.id == membership_id))
     if not membership:
         raise HTTPException(status_code=404, detail="Membership not found")
 
-    user = db.query(User).filter(User.id == membership.user_id).first()
-    org = db.query(Organization).filter(Organization.id == membership.organization_id).first()
+    user = await db.scalar(select(User).where(User.id == membership.user_id))
+    org = await db.scalar(select(Organization).where(Organization.id == membership.organization_id))
     return UserOrganizationItem(
         id=str(membership.id),
         user_id=str(membership.user_id),
@@ -406,16 +491,16 @@ async def get_user_organization(membership_id: str, db: Session = Depends(get_db
 
 
 @app.get("/organizations/{organization_id}/members", response_model=UserOrganizationsListResponse)
-async def get_members_for_organization(organization_id: str, db: Session = Depends(get_db)):
+async def get_members_for_organization(organization_id: str, db: AsyncSession = Depends(get_db)):
     """Get all members of an organization."""
-    org = db.query(Organization).filter(Organization.id == organization_id).first()
+    org = await db.scalar(select(Organization).where(Organization.id == organization_id))
     if not org:
         raise HTTPException(status_code=404, detail="Organization not found")
 
-    rows = db.query(UserOrganization).filter(UserOrganization.organization_id == organization_id).order_by(UserOrganization.joined_date.desc()).all()
+    rows = (await db.scalars(select(UserOrganization).where(UserOrganization.organization_id == organization_id).order_by(UserOrganization.joined_date.desc()))).all()
     memberships = []
     for row in rows:
-        user = db.query(User).filter(User.id == row.user_id).first()
+        user = await db.scalar(select(User).where(User.id == row.user_id))
         memberships.append(
             UserOrganizationItem(
                 id=str(row.id),
@@ -441,28 +526,26 @@ async def get_members_for_organization(organization_id: str, db: Session = Depen
 @app.post("/user_organizations", response_model=UserOrganizationResponse)
 async def join_organization(
     membership: UserOrganizationRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     """Add a user to an organization (join)."""
     # Verify user exists
-    user = db.query(User).filter(User.id == membership.user_id).first()
+    user = await db.scalar(select(User).where(User.id == membership.user_id))
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
     # Verify organization exists
-    org = db.query(Organization).filter(Organization.id == membership.organization_id).first()
+    org = await db.scalar(select(Organization).where(Organization.id == membership.organization_id))
     if not org:
         raise HTTPException(status_code=404, detail="Organization not found")
 
     # Check if already a member
-    existing = (
-        db.query(UserOrganization)
-        .filter(
+    existing = await db.scalar(
+        select(UserOrganization).where(
             UserOrganization.user_id == membership.user_id,
             UserOrganization.organization_id == membership.organization_id,
             UserOrganization.is_active.is_(True),
         )
-        .first()
     )
     if existing:
         raise HTTPException(status_code=400, detail="User is already a member of this organization")
@@ -475,8 +558,9 @@ async def join_organization(
         is_active=membership.is_active,
     )
     db.add(new_membership)
-    db.commit()
-    db.refresh(new_membership)
+    await db.commit()
+    await db.refresh(new_membership)
+    invalidate_agent_context(str(new_membership.user_id))
 
     return UserOrganizationResponse(
         id=str(new_membership.id),
@@ -492,10 +576,10 @@ async def join_organization(
 async def update_membership(
     membership_id: str,
     update: UserOrganizationUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     """Update a user-organization membership (e.g., set left_date when leaving)."""
-    membership = db.query(UserOrganization).filter(UserOrganization.id == membership_id).first()
+    membership = await db.scalar(select(UserOrganization).where(UserOrganization.id == membership_id))
     if not membership:
         raise HTTPException(status_code=404, detail="Membership not found")
 
@@ -506,8 +590,9 @@ async def update_membership(
     if update.is_active is not None:
         membership.is_active = update.is_active
 
-    db.commit()
-    db.refresh(membership)
+    await db.commit()
+    await db.refresh(membership)
+    invalidate_agent_context(str(membership.user_id))
 
     return UserOrganizationResponse(
         id=str(membership.id),
@@ -520,11 +605,13 @@ async def update_membership(
 
 
 @app.delete("/user_organizations/{membership_id}")
-async def delete_membership(membership_id: str, db: Session = Depends(get_db)):
+async def delete_membership(membership_id: str, db: AsyncSession = Depends(get_db)):
     """Delete a user-organization membership record."""
-    membership = db.query(UserOrganization).filter(UserOrganization.id == membership_id).first()
+    membership = await db.scalar(select(UserOrganization).where(UserOrganization.id == membership_id))
     if not membership:
         raise HTTPException(status_code=404, detail="Membership not found")
-    db.delete(membership)
-    db.commit()
+    user_id = str(membership.user_id)
+    await db.delete(membership)
+    await db.commit()
+    invalidate_agent_context(user_id)
     return {"status": "ok", "message": "Membership deleted"}
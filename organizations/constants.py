@@ -6,21 +6,25 @@ from organizations.db import (
 )
 
 
-def _make_get_my_organization_details(user_id: str):
+def _make_get_my_organization_details(user_id: str, context=None):
     """Return a no-arg callable that fetches org details for the given user_id."""
 
     def _fn(**kwargs):
+        if context is not None:
+            return context.organization_details
         return get_my_organization_details(user_id)
 
     return _fn
 
 
-def get_organization_function_map(user_id: str | None = None):
+def get_organization_function_map(user_id: str | None = None, context=None):
     mapping = {
         "get_organization_details": get_organization_details,
         "get_policies_for_organization": get_policies_for_organization,
         "get_policy_details": get_policy_details,
     }
     if user_id is not None:
-        mapping["get_my_organization_details"] = _make_get_my_organization_details(user_id)
+        mapping["get_my_organization_details"] = _make_get_my_organization_details(
+            user_id, context
+        )
     return mapping
@@ -1,7 +1,17 @@
-from sqlalchemy import func
+from datetime import date
 
+from sqlalchemy import and_, case, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from auth.principals import principal_organization_ids
 from database.db import SessionLocal
-from organizations.models import Organization, Policy, UserOrganization
+from organizations.models import (
+    Organization,
+    Policy,
+    PolicyLeaveAllowance,
+    UserOrganization,
+)
 from users.models import LeaveRequest
 
 
@@ -32,8 +42,9 @@ def get_my_organization_details(user_id: str):
     in UserOrganization and returning the organizations they belong to.
     """
     with SessionLocal() as db:
-        memberships = (
-            db.query(UserOrganization)
+        rows = (
+            db.query(UserOrganization, Organization)
+            .join(Organization, Organization.id == UserOrganization.organization_id)
             .filter(
                 UserOrganization.user_id == user_id,
                 UserOrganization.is_active.is_(True),
@@ -41,26 +52,24 @@ def get_my_organization_details(user_id: str):
             .order_by(UserOrganization.joined_date.desc())
             .all()
         )
-        if not memberships:
+        if not rows:
             return {
                 "detail": "You are not a member of any organization.",
                 "organizations": [],
                 "total": 0,
             }
         organizations = []
-        for m in memberships:
-            org = db.query(Organization).filter(Organization.id == m.organization_id).first()
-            if org:
-                organizations.append({
-                    "id": str(org.id),
-                    "name": org.name,
-                    "description": org.description,
-                    "address": org.address,
-                    "email": org.email,
-                    "phone": org.phone,
-                    "is_active": org.is_active,
-                    "membership_joined_date": str(m.joined_date) if m.joined_date else None,
-                })
+        for m, org in rows:
+            organizations.append({
+                "id": str(org.id),
+                "name": org.name,
+                "description": org.description,
+                "address": org.address,
+                "email": org.email,
+                "phone": org.phone,
+                "is_active": org.is_active,
+                "membership_joined_date": str(m.joined_date) if m.joined_date else None,
+            })
         return {
             "organizations": organizations,
             "total": len(organizations),
@@ -68,18 +77,29 @@ def get_my_organization_details(user_id: str):
         }
 
 
+def active_organization_ids_statement(user_id: str):
+    return select(UserOrganization.organization_id).where(
+        UserOrganization.user_id == user_id,
+        UserOrganization.is_active.is_(True),
+    )
+
+
+def active_organization_ids(db: Session, user_id: str) -> list[str]:
+    return [str(r) for r in db.scalars(active_organization_ids_statement(user_id))]
+
+
+async def fetch_active_organization_ids(db: AsyncSession, user_id: str) -> list[str]:
+    rows = await db.scalars(active_organization_ids_statement(user_id))
+    return [str(r) for r in rows]
+
+
 def get_organization_ids_for_user(user_id: str) -> list[str]:
     """Return list of organization IDs (as strings) the user belongs to (active memberships)."""
+    claimed = principal_organization_ids(user_id)
+    if claimed is not None:
+        return claimed
     with SessionLocal() as db:
-        rows = (
-            db.query(UserOrganization.organization_id)
-            .filter(
-                UserOrganization.user_id == user_id,
-                UserOrganization.is_active.is_(True),
-            )
-            .all()
-        )
-        return [str(r[0]) for r in rows]
+        return active_organization_ids(db, user_id)
 
 
 def get_policies_for_organization(organization_name: str):
@@ -181,3 +201,98 @@ def get_my_approved_leaves_summary(user_id: str) -> dict:
             "total_approved_days": total_approved,
             "organizations": list(by_org.keys()),
         }
+
+
+def leave_balances_statement(user_id: str, on_date: date | None = None):
+    """
+    Allowance, approved days and remaining days per (organization, leave type) for the
+    user's active memberships in the calendar year of ``on_date``. Monthly allowances
+    are annualized; when several active policies state an allowance for the same leave
+    type, the largest one applies.
+    """
+    today = on_date or date.today()
+    year_start, next_year_start = date(today.year, 1, 1), date(today.year + 1, 1, 1)
+    annual_days = case(
+        (PolicyLeaveAllowance.period == "month", PolicyLeaveAllowance.days * 12),
+        else_=PolicyLeaveAllowance.days,
+    )
+    allowed = (
+        select(
+            PolicyLeaveAllowance.organization_id,
+            PolicyLeaveAllowance.leave_type,
+            func.max(annual_days).label("allowed_days"),
+        )
+        .join(Policy, Policy.id == PolicyLeaveAllowance.policy_id)
+        .join(
+            UserOrganization,
+            and_(
+                UserOrganization.organization_id == PolicyLeaveAllowance.organization_id,
+                UserOrganization.user_id == user_id,
+                UserOrganization.is_active.is_(True),
+            ),
+        )
+        .where(Policy.is_active.is_(True))
+        .group_by(PolicyLeaveAllowance.organization_id, PolicyLeaveAllowance.leave_type)
+        .subquery()
+    )
+    used = (
+        select(
+            LeaveRequest.organization_id,
+            LeaveRequest.leave_type,
+            func.count(LeaveRequest.id).label("used_days"),
+        )
+        .where(
+            LeaveRequest.user_id == user_id,
+            LeaveRequest.is_accepted.is_(True),
+            LeaveRequest.date >= year_start,
+            LeaveRequest.date < next_year_start,
+        )
+        .group_by(LeaveRequest.organization_id, LeaveRequest.leave_type)
+        .subquery()
+    )
+    used_days = func.coalesce(used.c.used_days, 0)
+    return (
+        select(
+            allowed.c.organization_id,
+            Organization.name,
+            allowed.c.leave_type,
+            allowed.c.allowed_days,
+            used_days.label("used_days"),
+            (allowed.c.allowed_days - used_days).label("remaining_days"),
+        )
+        .join(Organization, Organization.id == allowed.c.organization_id)
+        .outerjoin(
+            used,
+            and_(
+                used.c.organization_id == allowed.c.organization_id,
+                used.c.leave_type == allowed.c.leave_type,
+            ),
+        )
+        .order_by(Organization.name, allowed.c.leave_type)
+    )
+
+
+def format_leave_balances(rows) -> list[dict]:
+    return [
+        {
+            "organization_id": str(row.organization_id),
+            "organization_name": row.name,
+            "leave_type": str(row.leave_type.value),
+            "allowed_days": float(row.allowed_days),
+            "used_days": int(row.used_days),
+            "remaining_days": float(row.remaining_days),
+        }
+        for row in rows
+    ]
+
+
+def get_my_leave_balances(user_id: str, on_date: date | None = None) -> dict:
+    """Leave balances for the current year, computed in SQL from extracted policy allowances."""
+    with SessionLocal() as db:
+        rows = db.execute(leave_balances_statement(user_id, on_date)).all()
+    balances = format_leave_balances(rows)
+    return {
+        "balances": balances,
+        "year": (on_date or date.today()).year,
+        "total": len(balances),
+    }
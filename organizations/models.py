@@ -2,12 +2,23 @@ import uuid
 from datetime import datetime
 
 from pydantic import BaseModel
-from sqlalchemy import Boolean, Column, Date, DateTime, ForeignKey, String, Text
+from sqlalchemy import (
+    Boolean,
+    Column,
+    Date,
+    DateTime,
+    Enum,
+    Float,
+    ForeignKey,
+    String,
+    Text,
+)
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
 from database.db import Base
+from users.choices import LeaveType
 
 
 # SQLAlchemy Models
@@ -44,6 +55,24 @@ class Policy(Base):
 
     # Relationship to organization
     organization = relationship("Organization", back_populates="policies")
+    allowances = relationship("PolicyLeaveAllowance", back_populates="policy", cascade="all, delete-orphan")
+
+
+class PolicyLeaveAllowance(Base):
+    """Leave allowance stated in a policy document, extracted when the policy is indexed."""
+
+    __tablename__ = "policy_leave_allowances"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    policy_id = Column(UUID(as_uuid=True), ForeignKey("policies.id"), nullable=False, index=True)
+    organization_id = Column(UUID(as_uuid=True), ForeignKey("organizations.id"), nullable=False, index=True)
+    leave_type = Column(Enum(LeaveType, name="leave_type"), nullable=False)
+    days = Column(Float, nullable=False)
+    period = Column(String(20), nullable=False, default="year")
+    source_text = Column(Text, nullable=True)
+    created = Column(DateTime(timezone=True), server_default=func.now())
+
+    policy = relationship("Policy", back_populates="allowances")
 
 
 class UserOrganization(Base):
@@ -8,8 +8,10 @@ import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.ext.asyncio import create_async_engine
 from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 
 PROJECT_ROOT = os.path.dirname(os.path.dirname(__file__))
 if PROJECT_ROOT not in sys.path:
@@ -22,9 +24,15 @@ os.environ.setdefault("JWT_EXPIRE_MINUTES", "60")
 import auth.backend as auth_backend
 import database.db as db
 import organizations.db as organizations_db
+from ai.answer_cache import ANSWER_CACHE
+from ai.catalog import invalidate_catalogs
+from ai.context import invalidate_agent_context
+from ai.metering import METER
+from ai.transcripts import TRANSCRIPTS
 from application.app import app as fastapi_app
 from auth.jwt import create_access_token
 from auth.passwords import hash_password
+from auth.principals import PRINCIPALS
 from organizations.models import Organization, Policy, UserOrganization
 from users.choices import LeaveType, UserType
 from users.models import LeaveRequest, User
@@ -64,10 +72,22 @@ def db_engine(tmp_path_factory):
     return create_engine(url, connect_args=connect_args)
 
 
+@pytest.fixture(scope="session")
+def async_db_engine(db_engine):
+    # NullPool: aiosqlite connections are bound to the event loop that opened them,
+    # and each TestClient runs its own loop.
+    return create_async_engine(
+        db.async_database_url(db_engine.url.render_as_string(hide_password=False)),
+        poolclass=NullPool,
+    )
+
+
 @pytest.fixture()
-def app(db_engine):
+def app(db_engine, async_db_engine):
     db.engine = db_engine
     db.SessionLocal.configure(bind=db_engine)
+    db.async_engine = async_db_engine
+    db.AsyncSessionLocal.configure(bind=async_db_engine)
     return fastapi_app
 
 
@@ -75,6 +95,12 @@ def app(db_engine):
 def clean_db(app, db_engine):
     db.Base.metadata.drop_all(bind=db_engine)
     db.Base.metadata.create_all(bind=db_engine)
+    invalidate_agent_context()
+    ANSWER_CACHE.clear()
+    invalidate_catalogs()
+    TRANSCRIPTS.clear()
+    METER.clear()
+    PRINCIPALS.clear()
     yield
 
 
@@ -0,0 +1,193 @@
+import asyncio
+import threading
+
+import pytest
+
+from ai import apis as ai_apis
+from application.admission import AdmissionRejected, FairAdmissionQueue, RateLimiter
+from application.metrics import METRICS
+
+
+def test_rate_limiter_allows_burst_then_asks_to_retry():
+    limiter = RateLimiter("test", rate_per_minute=60, burst=2)
+
+    assert limiter.check("user-1") == 0
+    assert limiter.check("user-1") == 0
+    retry_after = limiter.check("user-1")
+    assert 0 < retry_after <= 1
+    assert limiter.check("user-2") == 0
+
+
+def test_rate_limiter_disabled_with_zero_rate():
+    limiter = RateLimiter("test-off", rate_per_minute=0, burst=1)
+    assert all(limiter.check("user") == 0 for _ in range(10))
+
+
+def test_queue_admits_round_robin_across_organizations_then_users():
+    async def scenario():
+        gate = FairAdmissionQueue("test-fair", max_concurrency=1, max_queue=10)
+        order = []
+        await gate.acquire("org-1", "holder")
+
+        async def run(org, user):
+            async with gate.slot(org, user):
+                order.append(user)
+                await asyncio.sleep(0)
+
+        tasks = []
+        for org, user in [
+            ("org-1", "a"),
+            ("org-1", "a"),
+            ("org-1", "a"),
+            ("org-1", "b"),
+            ("org-2", "c"),
+        ]:
+            tasks.append(asyncio.create_task(run(org, user)))
+            await asyncio.sleep(0)
+        assert gate.depth == 5
+
+        gate.release()
+        await asyncio.gather(*tasks)
+        return order, gate
+
+    order, gate = asyncio.run(scenario())
+
+    assert order == ["a", "c", "b", "a", "a"]
+    assert gate.in_flight == 0
+    assert gate.depth == 0
+
+
+def test_queue_rejects_when_full_and_times_out_waiters():
+    async def scenario():
+        gate = FairAdmissionQueue("test-full", max_concurrency=1, max_queue=1)
+        await gate.acquire("org", "holder")
+        waiter = asyncio.create_task(gate.acquire("org", "waiting", timeout=0.05))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as full:
+            await gate.acquire("org", "late")
+        with pytest.raises(AdmissionRejected) as timed_out:
+            await waiter
+        return gate, full.value, timed_out.value
+
+    METRICS.reset()
+    gate, full, timed_out = asyncio.run(scenario())
+
+    assert full.reason == "queue_full"
+    assert timed_out.reason == "queue_timeout"
+    assert gate.depth == 0
+    snapshot = METRICS.snapshot()
+    assert snapshot["counters"]["admission.test-full.rejected"] == 1
+    assert snapshot["gauges"]["admission.test-full.queue_depth"] == 0
+
+
+def test_ai_assistant_returns_429_with_retry_after(
+    client, monkeypatch, create_user, auth_headers
+):
+    class DummyAgent:
+        def __init__(self, question, session_id=None, user_id=None):
+            self.session_id = session_id
+
+        def run(self):
+            return {"response": "ok", "session_id": self.session_id, "messages": []}
+
+    monkeypatch.setattr(ai_apis, "PolicyAgent", DummyAgent)
+    monkeypatch.setattr(
+        ai_apis,
+        "AI_USER_RATE_LIMIT",
+        RateLimiter("test-user", rate_per_minute=1, burst=1),
+    )
+    user = create_user(username="limited", email="limited@example.com")
+
+    first = client.post(
+        "/ai_assistant", json={"question": "hi"}, headers=auth_headers(user)
+    )
+    second = client.post(
+        "/ai_assistant", json={"question": "hi"}, headers=auth_headers(user)
+    )
+
+    assert first.status_code == 200
+    assert second.status_code == 429
+    assert 1 <= int(second.headers["Retry-After"]) <= 60
+
+
+def test_org_rate_limit_rejection_does_not_spend_the_user_quota(
+    client, monkeypatch, create_user, auth_headers
+):
+    class DummyAgent:
+        def __init__(self, question, session_id=None, user_id=None):
+            self.session_id = session_id
+
+        def run(self):
+            return {"response": "ok", "session_id": self.session_id, "messages": []}
+
+    user_limit = RateLimiter("test-user-refund", rate_per_minute=1, burst=1)
+    org_limit = RateLimiter("test-org-refund", rate_per_minute=1, burst=1)
+    monkeypatch.setattr(ai_apis, "PolicyAgent", DummyAgent)
+    monkeypatch.setattr(ai_apis, "AI_USER_RATE_LIMIT", user_limit)
+    monkeypatch.setattr(ai_apis, "AI_ORG_RATE_LIMIT", org_limit)
+    monkeypatch.setattr(ai_apis, "_organization_ids", lambda user_id: ["org-1"])
+    user = create_user(username="org-limited", email="org-limited@example.com")
+    org_limit.check("org-1")
+
+    def ask():
+        return client.post(
+            "/ai_assistant", json={"question": "hi"}, headers=auth_headers(user)
+        )
+
+    assert ask().status_code == 429
+    monkeypatch.setattr(
+        ai_apis, "AI_ORG_RATE_LIMIT", RateLimiter("test-org-off", 0, burst=1)
+    )
+    assert ask().status_code == 200
+
+
+def test_ai_assistant_returns_503_when_admission_queue_is_full(
+    client, monkeypatch, create_user, auth_headers
+):
+    monkeypatch.setattr(
+        ai_apis,
+        "AI_ADMISSION",
+        FairAdmissionQueue("test-busy", max_concurrency=0, max_queue=0),
+    )
+    user = create_user(username="busy", email="busy@example.com")
+
+    response = client.post(
+        "/ai_assistant", json={"question": "hi"}, headers=auth_headers(user)
+    )
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "5"
+
+
+def test_ai_assistant_looks_up_organizations_off_the_event_loop(
+    client, monkeypatch, create_user, auth_headers
+):
+    from ai import context as context_module
+
+    threads = []
+
+    def organization_details(user_id):
+        threads.append(threading.current_thread().name)
+        return {"organizations": [{"id": "org-1"}]}
+
+    class DummyAgent:
+        def __init__(self, question, session_id=None, user_id=None):
+            self.session_id = session_id
+
+        def run(self):
+            return {"response": "ok", "session_id": self.session_id, "messages": []}
+
+    monkeypatch.setattr(ai_apis, "PolicyAgent", DummyAgent)
+    monkeypatch.setattr(
+        context_module, "get_my_organization_details", organization_details
+    )
+    context_module.invalidate_agent_context()
+    user = create_user(username="lookup", email="lookup@example.com")
+
+    response = client.post(
+        "/ai_assistant", json={"question": "hi"}, headers=auth_headers(user)
+    )
+
+    assert response.status_code == 200
+    assert len(threads) == 1
+    assert threads[0].startswith("lane-ai")
@@ -1,3 +1,5 @@
+from types import SimpleNamespace
+
 from ai import agent as agent_module
 from ai import apis as ai_apis
 
@@ -199,3 +201,500 @@ def test_policy_prompt_format_no_key_error():
     prompt = POLICY_PROMPT.format(excerpts_text="Sample excerpt", question="How many days?")
     assert "Sample excerpt" in prompt
     assert "How many days?" in prompt
+
+
+class FakeEmbedder:
+    """Embeds text as keyword-count vectors so similarity is predictable."""
+
+    embed_model = "fake-embed"
+    vocabulary = ("policy", "balance", "organization", "acme")
+
+    def embed_queries(self, texts):
+        return [
+            [float(text.lower().count(word)) for word in self.vocabulary] for text in texts
+        ]
+
+
+def test_intent_router_routes_confident_question():
+    from ai.router import PLANNING_ROUTE, IntentRouter
+
+    router = IntentRouter(
+        available_tools=["search_my_organization_policies", "get_my_pending_leaves"],
+        rag_client=FakeEmbedder(),
+        exemplars={
+            "search_my_organization_policies": ["policy"],
+            "get_my_pending_leaves": ["balance"],
+            PLANNING_ROUTE: ["acme"],
+        },
+        threshold=0.9,
+        margin=0.1,
+    )
+
+    decision = router.route("What does the policy say?")
+
+    assert decision is not None
+    assert decision.tool_name == "search_my_organization_policies"
+    assert decision.parameters == {"query": "What does the policy say?"}
+
+
+def test_intent_router_defers_ambiguous_and_planning_questions():
+    from ai.router import PLANNING_ROUTE, IntentRouter
+
+    router = IntentRouter(
+        available_tools=["search_my_organization_policies", "get_my_pending_leaves"],
+        rag_client=FakeEmbedder(),
+        exemplars={
+            "search_my_organization_policies": ["policy"],
+            "get_my_pending_leaves": ["balance"],
+            PLANNING_ROUTE: ["acme"],
+        },
+        threshold=0.9,
+        margin=0.1,
+    )
+
+    assert router.route("policy balance") is None
+    assert router.route("acme policies") is None
+    assert router.route("unrelated") is None
+
+
+def test_policy_agent_routed_question_skips_planning(monkeypatch):
+    from ai.router import RouteDecision
+
+    calls = {}
+
+    class FakeRouter:
+        def __init__(self, available_tools, **kwargs):
+            calls["available_tools"] = set(available_tools)
+
+        query_vector = None
+
+        def route(self, question):
+            return RouteDecision("get_my_pending_leaves", {}, 0.95)
+
+    class FakeCohereClient:
+        def __init__(self, message=None, model=None, user_id=None):
+            self.function_map = {
+                "get_my_pending_leaves": lambda: {"total_approved_days": 3}
+            }
+
+        def generate(self, message, chat_history=None):
+            calls["prompt"] = message
+            return "You used 3 days.", [{"role": "CHATBOT", "message": "You used 3 days."}]
+
+        def ask_llm(self, message=None, chat_history=None, max_steps=8):
+            raise AssertionError("planning loop should be skipped")
+
+    monkeypatch.setenv("AI_ROUTER_ENABLED", "true")
+    monkeypatch.setattr(agent_module, "CohereClient", FakeCohereClient)
+    monkeypatch.setattr(agent_module, "IntentRouter", FakeRouter)
+    agent_module.SESSION_MEMORY.clear()
+
+    result = agent_module.PolicyAgent("How many days do I have left?", user_id="u1").run()
+
+    assert result["response"] == "You used 3 days."
+    assert calls["available_tools"] == {"get_my_pending_leaves"}
+    assert '"total_approved_days": 3' in calls["prompt"]
+
+
+def test_policy_fallback_reuses_the_router_embedding(monkeypatch):
+    from ai import router as router_module
+    from ai.answer_cache import ANSWER_CACHE
+    from ai.router import PLANNING_ROUTE
+
+    question = "What is the leave policy at Acme?"
+    embedded = []
+    searched = []
+
+    class CountingRAGClient(FakeEmbedder):
+        embed_model = "counting-embed"
+
+        def embed_queries(self, texts):
+            embedded.extend(texts)
+            return super().embed_queries(texts)
+
+        def query_policy_index(
+            self, query, top_k=5, organization_ids=None, query_vector=None
+        ):
+            searched.append(query_vector)
+            return [{"policy_name": "Leave", "chunk_index": 0, "text": "20 days"}]
+
+    class FakeCohereClient:
+        def __init__(self, message=None, model=None, user_id=None):
+            self.function_map = {}
+
+        def ask_llm(self, message=None, chat_history=None, max_steps=8):
+            return "20 days.", [{"role": "CHATBOT", "message": "20 days."}]
+
+    monkeypatch.setenv("AI_ROUTER_ENABLED", "true")
+    monkeypatch.setenv("AI_ANSWER_CACHE_ENABLED", "true")
+    monkeypatch.setattr(router_module, "RAGClient", CountingRAGClient)
+    monkeypatch.setattr(router_module, "ROUTE_EXEMPLARS", {PLANNING_ROUTE: ["acme"]})
+    monkeypatch.setattr(agent_module, "RAGClient", CountingRAGClient)
+    monkeypatch.setattr(agent_module, "CohereClient", FakeCohereClient)
+    ANSWER_CACHE.clear()
+
+    result = agent_module.PolicyAgent(question).run()
+
+    assert result["response"] == "20 days."
+    assert embedded.count(question) == 1
+    assert searched == [[1.0, 0.0, 0.0, 1.0]]
+
+
+def test_speculative_retrieval_hands_over_prefetched_matches(monkeypatch):
+    from ai import speculation as speculation_module
+
+    searches = []
+
+    class FakeRAGClient:
+        def query_policy_index(self, query, top_k=5, organization_ids=None):
+            searches.append((query, organization_ids))
+            return [{"policy_name": "Leave", "text": "20 days"}]
+
+    class FakeCohereClient:
+        def __init__(self, message=None, model=None, user_id=None):
+            self.function_map = {
+                "search_my_organization_policies": lambda query, top_k=5: {
+                    "matches": "live search"
+                }
+            }
+
+        def ask_llm(self, message=None, chat_history=None, max_steps=8):
+            output = self.function_map["search_my_organization_policies"](
+                query="Hello there?"
+            )
+            return output["detail"], []
+
+    monkeypatch.setenv("AI_SPECULATIVE_RETRIEVAL", "true")
+    monkeypatch.setattr(speculation_module, "RAGClient", FakeRAGClient)
+    monkeypatch.setattr(
+        speculation_module,
+        "get_agent_context",
+        lambda user_id: SimpleNamespace(organization_ids=["org-1"]),
+    )
+    monkeypatch.setattr(agent_module, "CohereClient", FakeCohereClient)
+    agent_module.SESSION_MEMORY.clear()
+
+    result = agent_module.PolicyAgent("hello there", user_id="u1").run()
+
+    assert result["response"].startswith("Found 1 relevant excerpt")
+    assert searches == [("hello there", ["org-1"])]
+
+
+def test_speculative_retrieval_falls_back_to_tool_after_first_use(monkeypatch):
+    from ai import speculation as speculation_module
+
+    class FakeRAGClient:
+        def query_policy_index(self, query, top_k=5, organization_ids=None):
+            return [{"text": "prefetched"}]
+
+    monkeypatch.setattr(speculation_module, "RAGClient", FakeRAGClient)
+    function_map = {"search_policy_embeddings": lambda query, top_k=5: ["live"]}
+
+    speculation = speculation_module.SpeculativeRetrieval("question", top_k=5)
+    speculation.install(function_map)
+
+    assert function_map["search_policy_embeddings"](query="question") == [
+        {"text": "prefetched"}
+    ]
+    assert function_map["search_policy_embeddings"](query="question") == ["live"]
+    assert function_map["search_policy_embeddings"](query="question", top_k=10) == [
+        "live"
+    ]
+
+
+def test_speculative_retrieval_is_not_used_for_a_rewritten_query(monkeypatch):
+    from ai import speculation as speculation_module
+
+    class FakeRAGClient:
+        def query_policy_index(self, query, top_k=5, organization_ids=None):
+            return [{"text": "prefetched"}]
+
+    monkeypatch.setattr(speculation_module, "RAGClient", FakeRAGClient)
+    searched = []
+
+    def live_search(query, top_k=5):
+        searched.append(query)
+        return ["live"]
+
+    function_map = {"search_policy_embeddings": live_search}
+    speculation = speculation_module.SpeculativeRetrieval(
+        "Can I carry over vacation, and how many sick days do I get?", top_k=5
+    )
+    speculation.install(function_map)
+
+    assert function_map["search_policy_embeddings"](query="carry over vacation") == [
+        "live"
+    ]
+    assert searched == ["carry over vacation"]
+
+
+def test_speculative_retrieval_stops_waiting_at_the_deadline(monkeypatch):
+    import threading
+
+    from ai import speculation as speculation_module
+    from ai.deadline import Deadline, use_deadline
+
+    release = threading.Event()
+
+    class StuckRAGClient:
+        def query_policy_index(self, query, top_k=5, organization_ids=None):
+            release.wait(5)
+            return [{"text": "prefetched"}]
+
+    monkeypatch.setattr(speculation_module, "RAGClient", StuckRAGClient)
+    function_map = {"search_policy_embeddings": lambda query, top_k=5: ["live"]}
+    speculation = speculation_module.SpeculativeRetrieval("question", top_k=5)
+    speculation.install(function_map)
+
+    try:
+        with use_deadline(Deadline(0.1)):
+            assert function_map["search_policy_embeddings"](query="question") == [
+                "live"
+            ]
+    finally:
+        release.set()
+
+
+def test_agent_context_caches_memberships_until_invalidated(
+    app, create_user, create_organization, create_user_organization
+):
+    from ai.context import get_agent_context, invalidate_agent_context
+
+    user = create_user(username="ctx-user", email="ctx@example.com")
+    org_one = create_organization(name="Context Org One")
+    org_two = create_organization(name="Context Org Two")
+    create_user_organization(user_id=user.id, organization_id=org_one.id)
+
+    context = get_agent_context(str(user.id))
+    assert context.organization_ids == [str(org_one.id)]
+    assert get_agent_context(str(user.id)) is context
+
+    create_user_organization(user_id=user.id, organization_id=org_two.id)
+    assert context.organization_ids == [str(org_one.id)]
+
+    invalidate_agent_context(str(user.id))
+    refreshed = get_agent_context(str(user.id))
+    assert refreshed is not context
+    assert set(refreshed.organization_ids) == {str(org_one.id), str(org_two.id)}
+
+
+def test_join_organization_invalidates_agent_context(
+    client, create_user, create_organization, auth_headers
+):
+    from ai.context import get_agent_context
+
+    user = create_user(username="ctx-joiner", email="ctx-joiner@example.com")
+    org = create_organization(name="Joined Org")
+    assert get_agent_context(str(user.id)).organization_ids == []
+
+    response = client.post(
+        "/user_organizations",
+        headers=auth_headers(user),
+        json={
+            "user_id": str(user.id),
+            "organization_id": str(org.id),
+            "joined_date": "2026-01-15T00:00:00",
+        },
+    )
+
+    assert response.status_code == 200
+    assert get_agent_context(str(user.id)).organization_ids == [str(org.id)]
+
+
+def test_cohere_client_function_map_is_isolated_per_request():
+    from ai.clients import CohereClient
+
+    first = CohereClient(user_id="shared-user")
+    first.function_map["search_policy_embeddings"] = lambda **kwargs: []
+    second = CohereClient(user_id="shared-user")
+
+    assert second.context is first.context
+    assert second.function_map["search_policy_embeddings"] is not first.function_map[
+        "search_policy_embeddings"
+    ]
+
+
+def test_extract_leave_allowances_reads_days_and_period():
+    from ai.allowances import extract_leave_allowances
+    from users.choices import LeaveType
+
+    allowances = extract_leave_allowances(
+        "Sick leave requires a medical certificate after 2 days. Employees receive "
+        "10 days of sick leave per year. Earned leave accrues at 1.5 days per month. "
+        "Staff may work from home 2 days a week."
+    )
+
+    by_type = {a["leave_type"]: a for a in allowances}
+    assert set(by_type) == {LeaveType.SICK_LEAVE, LeaveType.PRIVILEGE_LEAVE}
+    assert (by_type[LeaveType.SICK_LEAVE]["days"], by_type[LeaveType.SICK_LEAVE]["period"]) == (10.0, "year")
+    assert (
+        by_type[LeaveType.PRIVILEGE_LEAVE]["days"],
+        by_type[LeaveType.PRIVILEGE_LEAVE]["period"],
+    ) == (1.5, "month")
+
+
+def test_extract_leave_allowances_ignores_rules_about_days():
+    from ai.allowances import extract_leave_allowances
+
+    assert (
+        extract_leave_allowances(
+            "A medical certificate is required for sick leave absences of more "
+            "than 3 days. Vacation requests must be submitted 14 days in advance. "
+            "Sick leave of 2 days or longer must be reported to HR. Annual leave "
+            "notice: 5 days."
+        )
+        == []
+    )
+
+
+def test_get_my_pending_leaves_uses_balances_without_search(
+    app,
+    create_user,
+    create_organization,
+    create_user_organization,
+    create_policy,
+    monkeypatch,
+):
+    from ai import tools as ai_tools
+    from ai.rag import RAGClient
+    from database.db import SessionLocal
+
+    user = create_user(username="balance-tool", email="balance-tool@example.com")
+    org = create_organization(name="Balance Tool Org")
+    create_user_organization(user_id=user.id, organization_id=org.id)
+    policy = create_policy(organization_id=org.id)
+    with SessionLocal() as db:
+        RAGClient()._store_leave_allowances(
+            db, str(policy.id), str(org.id), "You get 12 days of sick leave per year."
+        )
+        db.commit()
+
+    def no_search():
+        raise AssertionError("balance path must not search the policy index")
+
+    monkeypatch.setattr(ai_tools, "RAGClient", no_search)
+    result = ai_tools.get_ai_function_map(user_id=str(user.id))["get_my_pending_leaves"]()
+
+    assert result["balances"][0]["remaining_days"] == 12.0
+    assert result["policy_excerpts"] == []
+    assert result["total_approved_days"] == 0
+
+
+def test_session_follow_up_reranks_previous_retrieval(monkeypatch):
+    vectors = {
+        "How many sick days do I get?": [1.0, 0.0],
+        "and for part-time staff?": [0.8, 0.4],
+        "What is the travel reimbursement rate?": [0.0, 1.0],
+    }
+    searches = []
+    prompts = []
+
+    class FakeRAGClient:
+        embed_model = "test-model"
+
+        def embed_queries(self, texts):
+            return [vectors[text] for text in texts]
+
+        def query_policy_index(
+            self,
+            query,
+            top_k=5,
+            organization_ids=None,
+            query_vector=None,
+            include_vectors=False,
+        ):
+            searches.append((query, top_k, include_vectors))
+            return [
+                {"chunk_index": 0, "text": "Full-time: 10 sick days", "embedding": [1.0, 0.0]},
+                {"chunk_index": 1, "text": "Part-time: 5 sick days", "embedding": [0.8, 0.6]},
+                {"chunk_index": 2, "text": "Travel: 0.5 per km", "embedding": [0.0, 1.0]},
+            ][: top_k]
+
+    class FakeCohereClient:
+        def __init__(self, message=None, model=None, user_id=None):
+            self.context = SimpleNamespace(organization_ids=[])
+            self.function_map = {}
+
+        def ask_llm(self, message=None, chat_history=None, max_steps=8):
+            prompts.append(message)
+            return "answer", [
+                *(chat_history or []),
+                {"role": "USER", "message": message},
+                {"role": "CHATBOT", "message": "answer"},
+            ]
+
+    monkeypatch.setenv("AI_SESSION_RETRIEVAL_REUSE", "true")
+    monkeypatch.setenv("POLICY_RAG_TOP_K", "1")
+    monkeypatch.setattr(agent_module, "RAGClient", FakeRAGClient)
+    monkeypatch.setattr(agent_module, "CohereClient", FakeCohereClient)
+    agent_module.SESSION_MEMORY.clear()
+    agent_module.SESSION_RETRIEVAL.clear()
+
+    agent_module.PolicyAgent("How many sick days do I get?", session_id="s-reuse").run()
+    agent_module.PolicyAgent("and for part-time staff?", session_id="s-reuse").run()
+
+    # The follow-up has no policy keywords but is close to the previous query, so the
+    # previous candidates are re-ranked instead of searching again.
+    assert searches == [("How many sick days do I get?", 2, True)]
+    assert "Part-time: 5 sick days" in prompts[-1]
+    assert "embedding" not in prompts[-1]
+    stored = agent_module.SESSION_RETRIEVAL.get("s-reuse")
+    assert stored["query_vector"].typecode == "f"
+    assert all(match["embedding"].typecode == "f" for match in stored["matches"])
+
+    agent_module.PolicyAgent(
+        "What is the travel reimbursement rate?", session_id="s-reuse"
+    ).run()
+    assert len(searches) == 1  # not a policy question and not similar: no retrieval
+
+
+def test_ai_assistant_delta_mode_returns_only_new_messages(
+    client, monkeypatch, create_user, auth_headers
+):
+    class EchoClient:
+        def __init__(self, message=None, model=None, user_id=None):
+            pass
+
+        def ask_llm(self, message=None, chat_history=None, max_steps=8):
+            answer = f"echo: {message}"
+            return answer, [
+                *(chat_history or []),
+                {"role": "USER", "message": message},
+                {"role": "CHATBOT", "message": answer},
+            ]
+
+    monkeypatch.setattr(agent_module, "CohereClient", EchoClient)
+    agent_module.SESSION_MEMORY.clear()
+    owner = create_user(username="delta-user", email="delta@example.com")
+    other = create_user(username="other-user", email="other@example.com")
+
+    for question in ("hello", "tell me more", "thanks"):
+        response = client.post(
+            "/ai_assistant",
+            json={"question": question, "session_id": "d1", "response_mode": "delta"},
+            headers=auth_headers(owner),
+        )
+        assert response.status_code == 200
+    payload = response.json()
+    assert payload["messages"] == [
+        {"role": "USER", "message": "thanks"},
+        {"role": "CHATBOT", "message": "echo: thanks"},
+    ]
+    assert payload["history_cursor"] == 6
+
+    page = client.get(
+        "/ai_assistant/sessions/d1/messages?cursor=1&limit=4",
+        headers=auth_headers(owner),
+    ).json()
+    assert [m["message"] for m in page["messages"]] == [
+        "echo: hello",
+        "tell me more",
+        "echo: tell me more",
+        "thanks",
+    ]
+    assert (page["cursor"], page["next_cursor"], page["total"]) == (1, 5, 6)
+
+    response = client.get(
+        "/ai_assistant/sessions/d1/messages", headers=auth_headers(other)
+    )
+    assert response.status_code == 404
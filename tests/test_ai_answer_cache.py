@@ -0,0 +1,175 @@
+from types import SimpleNamespace
+
+from ai import agent as agent_module
+from ai.answer_cache import ANSWER_CACHE, AnswerCache
+
+
+def test_exact_tier_matches_normalized_question():
+    cache = AnswerCache(ttl=60, max_size=10)
+    generation = cache.generation(["org-1"])
+    cache.set("How many sick days?", "ns", generation, "Ten days.")
+
+    assert cache.get("how many  SICK days", "ns", generation) == "Ten days."
+    assert cache.get("how many sick days", "other-ns", generation) is None
+
+
+def test_semantic_tier_uses_similarity_threshold():
+    cache = AnswerCache(ttl=60, max_size=10, similarity_threshold=0.9)
+    generation = cache.generation(None)
+    cache.set("sick leave allowance", "ns", generation, "Ten days.", vector=[1.0, 0.0])
+
+    assert cache.get_similar([0.99, 0.05], "ns", generation) == "Ten days."
+    assert cache.get_similar([0.0, 1.0], "ns", generation) is None
+
+
+def test_semantic_tier_keeps_the_latest_candidates_per_namespace():
+    cache = AnswerCache(ttl=60, max_size=10, similarity_threshold=0.9, max_candidates=2)
+    generation = cache.generation(None)
+    cache.set("annual leave", "ns", generation, "Twenty days.", vector=[1.0, 0.0])
+    cache.set("sick leave", "ns", generation, "Ten days.", vector=[0.0, 1.0])
+    cache.set("parental leave", "ns", generation, "Sixteen weeks.", vector=[-1.0, 0.0])
+    cache.set("annual leave", "other-ns", generation, "Other.", vector=[1.0, 0.0])
+
+    assert cache.get_similar([1.0, 0.0], "ns", generation) is None
+    assert cache.get_similar([0.0, 1.0], "ns", generation) == "Ten days."
+    assert cache.get_similar([-1.0, 0.0], "ns", generation) == "Sixteen weeks."
+    assert cache.get_similar([1.0, 0.0], "other-ns", generation) == "Other."
+
+
+def test_invalidation_only_affects_changed_organizations():
+    cache = AnswerCache(ttl=60, max_size=10)
+    org_one = cache.generation(["org-1"])
+    org_two = cache.generation(["org-2"])
+    cache.set("q", "ns", org_one, "one")
+    cache.set("q", "ns", org_two, "two")
+
+    cache.invalidate(["org-1"])
+
+    assert cache.generation(["org-1"]) != org_one
+    assert cache.get("q", "ns", cache.generation(["org-1"])) is None
+    assert cache.get("q", "ns", cache.generation(["org-2"])) == "two"
+
+
+def _fake_clients(monkeypatch, calls):
+    class FakeRAGClient:
+        embed_model = "test-model"
+
+        def embed_queries(self, texts):
+            calls["embed"] += 1
+            return [[1.0, 0.0]]
+
+        def query_policy_index(
+            self, query, top_k=5, organization_ids=None, query_vector=None
+        ):
+            calls["search"].append((query, organization_ids, query_vector))
+            return [{"policy_name": "Leave", "chunk_index": 0, "text": "10 sick days"}]
+
+    class FakeCohereClient:
+        def __init__(self, message=None, model=None, user_id=None):
+            self.context = SimpleNamespace(organization_ids=["org-1"])
+            self.function_map = {}
+
+        def ask_llm(self, message=None, chat_history=None, max_steps=8):
+            calls["llm"] += 1
+            return "You get 10 sick days.", [
+                {"role": "USER", "message": message},
+                {"role": "CHATBOT", "message": "You get 10 sick days."},
+            ]
+
+    monkeypatch.setenv("AI_ANSWER_CACHE_ENABLED", "true")
+    monkeypatch.setattr(agent_module, "RAGClient", FakeRAGClient)
+    monkeypatch.setattr(agent_module, "CohereClient", FakeCohereClient)
+    agent_module.SESSION_MEMORY.clear()
+
+
+def test_agent_serves_repeated_policy_question_from_cache(monkeypatch):
+    calls = {"embed": 0, "llm": 0, "search": []}
+    _fake_clients(monkeypatch, calls)
+
+    first = agent_module.PolicyAgent("How many sick leave days?", user_id="u1").run()
+    second = agent_module.PolicyAgent("how many sick leave days", user_id="u1").run()
+
+    assert first["response"] == second["response"] == "You get 10 sick days."
+    assert calls["llm"] == 1
+    assert calls["embed"] == 1
+    # The query vector from the cache lookup is reused for retrieval.
+    assert calls["search"] == [("How many sick leave days?", ["org-1"], [1.0, 0.0])]
+    assert second["messages"][-1] == {
+        "role": "CHATBOT",
+        "message": "You get 10 sick days.",
+    }
+
+
+def test_agent_cache_is_invalidated_by_reindexing(monkeypatch):
+    calls = {"embed": 0, "llm": 0, "search": []}
+    _fake_clients(monkeypatch, calls)
+
+    agent_module.PolicyAgent("What is the sick leave policy?", user_id="u1").run()
+    ANSWER_CACHE.invalidate(["org-1"])
+    agent_module.PolicyAgent("What is the sick leave policy?", user_id="u1").run()
+
+    assert calls["llm"] == 2
+
+
+def test_agent_cache_is_bypassed_for_sessions_with_history(monkeypatch):
+    calls = {"embed": 0, "llm": 0, "search": []}
+    _fake_clients(monkeypatch, calls)
+
+    agent_module.PolicyAgent("sick leave policy?", session_id="s1", user_id="u1").run()
+    agent_module.PolicyAgent("sick leave policy?", session_id="s1", user_id="u1").run()
+
+    assert calls["llm"] == 2
+
+
+def test_agent_cache_does_not_share_personal_answers(monkeypatch):
+    calls = {"llm": [], "search": []}
+
+    class FakeRAGClient:
+        embed_model = "test-model"
+
+        def embed_queries(self, texts):
+            return [[1.0, 0.0]]
+
+        def query_policy_index(
+            self, query, top_k=5, organization_ids=None, query_vector=None
+        ):
+            return [{"policy_name": "Leave", "chunk_index": 0, "text": "10 sick days"}]
+
+    class FakeCohereClient:
+        def __init__(self, message=None, model=None, user_id=None):
+            self.user_id = user_id
+            self.context = SimpleNamespace(organization_ids=["org-1"])
+            self.function_map = {
+                "get_my_pending_leaves": lambda: {"remaining": {"sick": 3}}
+            }
+
+        def ask_llm(self, message=None, chat_history=None, max_steps=8):
+            calls["llm"].append(self.user_id)
+            balance = self.function_map["get_my_pending_leaves"]()
+            answer = f"You have {balance['remaining']['sick']} sick days left."
+            return answer, [
+                {"role": "USER", "message": message},
+                {"role": "CHATBOT", "message": answer},
+            ]
+
+    monkeypatch.setenv("AI_ANSWER_CACHE_ENABLED", "true")
+    monkeypatch.setattr(agent_module, "RAGClient", FakeRAGClient)
+    monkeypatch.setattr(agent_module, "CohereClient", FakeCohereClient)
+    question = "How many sick leave days do I have left?"
+
+    agent_module.PolicyAgent(question, user_id="alice").run()
+    agent_module.PolicyAgent(question, user_id="bob").run()
+    agent_module.PolicyAgent(question, user_id="alice").run()
+
+    assert calls["llm"] == ["alice", "bob", "alice"]
+
+
+def test_agent_cache_is_shared_within_an_organization(monkeypatch):
+    calls = {"embed": 0, "llm": 0, "search": []}
+    _fake_clients(monkeypatch, calls)
+
+    alice = agent_module.PolicyAgent("What is the sick leave policy?", user_id="alice")
+    bob = agent_module.PolicyAgent("what is the sick leave policy", user_id="bob")
+
+    assert alice.run()["response"] == bob.run()["response"]
+    assert calls["llm"] == 1
@@ -0,0 +1,82 @@
+from ai.catalog import CATALOG_TOOLS, NO_ORGANIZATION_CATALOG, get_catalog
+from ai.clients import CohereClient
+from organizations.models import Policy
+
+
+def _member_with_policy(
+    create_user, create_organization, create_policy, create_user_organization
+):
+    user = create_user()
+    org = create_organization(name="Acme", email="hr@acme.test")
+    policy = create_policy(
+        organization_id=org.id,
+        name="Leave Policy",
+        description="Annual and sick leave",
+        document_name="leave.pdf",
+    )
+    create_user_organization(user_id=user.id, organization_id=org.id)
+    return user, org, policy
+
+
+def test_catalog_replaces_lookup_tools_when_it_fits(
+    monkeypatch,
+    create_user,
+    create_organization,
+    create_policy,
+    create_user_organization,
+):
+    monkeypatch.setenv("AI_PREAMBLE_CATALOG", "true")
+    user, _, _ = _member_with_policy(
+        create_user, create_organization, create_policy, create_user_organization
+    )
+
+    client = CohereClient(user_id=str(user.id))
+
+    assert "- Organization Acme; description: A test organization" in client.preamble
+    assert "email: hr@acme.test" in client.preamble
+    assert "Policy Leave Policy: Annual and sick leave (document: leave.pdf)" in (
+        client.preamble
+    )
+    tool_names = {tool["name"] for tool in client.tools}
+    assert not tool_names & set(CATALOG_TOOLS)
+    assert "search_my_organization_policies" in tool_names
+
+
+def test_catalog_over_budget_keeps_the_tools(
+    monkeypatch,
+    create_user,
+    create_organization,
+    create_policy,
+    create_user_organization,
+):
+    monkeypatch.setenv("AI_PREAMBLE_CATALOG", "true")
+    monkeypatch.setenv("AI_PREAMBLE_CATALOG_TOKEN_BUDGET", "5")
+    user, _, _ = _member_with_policy(
+        create_user, create_organization, create_policy, create_user_organization
+    )
+
+    client = CohereClient(user_id=str(user.id))
+
+    assert client.catalog is None
+    assert "get_my_organization_details" in {tool["name"] for tool in client.tools}
+
+
+def test_catalog_is_rebuilt_after_policy_changes(
+    db_session,
+    create_user,
+    create_organization,
+    create_policy,
+    create_user_organization,
+):
+    _, org, policy = _member_with_policy(
+        create_user, create_organization, create_policy, create_user_organization
+    )
+    assert get_catalog([], 400) == NO_ORGANIZATION_CATALOG
+    assert "Leave Policy" in get_catalog([str(org.id)], 400)
+
+    db_session.get(Policy, policy.id).name = "Time Off Policy"
+    db_session.commit()
+
+    catalog = get_catalog([str(org.id)], 400)
+    assert "Time Off Policy" in catalog
+    assert "Leave Policy" not in catalog
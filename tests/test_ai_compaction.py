@@ -0,0 +1,91 @@
+from types import SimpleNamespace
+
+from ai.compaction import compact_tool_output, payload_size
+
+
+def _match(chunk_index, text, policy_id="p1"):
+    return {
+        "policy_id": policy_id,
+        "organization_id": "org-1",
+        "policy_name": "Leave Policy",
+        "description": "All about leave",
+        "document_name": "leave.pdf",
+        "file_path": "uploads/policies/leave.pdf",
+        "chunk_index": chunk_index,
+        "text": text,
+        "score": None,
+    }
+
+
+def test_compaction_projects_fields_and_merges_adjacent_chunks():
+    output = {
+        "detail": "Found 3 relevant excerpt(s) from your organization's policies.",
+        "matches": [
+            _match(1, "Employees get 20 days of annual leave."),
+            _match(0, "Leave policy overview. Employees get 20"),
+            _match(4, "Sick leave needs a certificate.", policy_id="p2"),
+        ],
+    }
+
+    compacted = compact_tool_output("search_my_organization_policies", output, 500)
+
+    assert compacted["matches"] == [
+        {
+            "policy_name": "Leave Policy",
+            "document_name": "leave.pdf",
+            "chunk_index": "0-1",
+            "text": "Leave policy overview. Employees get 20 days of annual leave.",
+        },
+        {
+            "policy_name": "Leave Policy",
+            "document_name": "leave.pdf",
+            "chunk_index": 4,
+            "text": "Sick leave needs a certificate.",
+        },
+    ]
+    assert output["matches"][0]["file_path"] == "uploads/policies/leave.pdf"
+    assert payload_size(compacted) < payload_size(output)
+
+
+def test_compaction_truncates_to_token_budget():
+    output = [
+        _match(0, "a" * 100, policy_id="p1"),
+        _match(0, "b" * 100, policy_id="p2"),
+    ]
+
+    compacted = compact_tool_output("search_policy_embeddings", output, token_budget=10)
+
+    assert len(compacted) == 1
+    assert compacted[0]["text"] == "a" * 40 + "..."
+
+
+def test_compaction_leaves_unknown_tools_and_errors_untouched():
+    error = {"error": "boom", "tool": "get_policy_details", "parameters": {}}
+    assert compact_tool_output("get_policy_details", error) is error
+    assert compact_tool_output("unknown_tool", {"a": 1}) == {"a": 1}
+
+
+def test_update_tools_results_reports_bytes_saved():
+    from ai.clients import CohereClient
+
+    client = CohereClient(user_id=None)
+    client.function_map["search_policy_embeddings"] = lambda query, top_k=5: [
+        _match(0, "Policy text")
+    ]
+    response = SimpleNamespace(
+        tool_calls=[
+            SimpleNamespace(name="search_policy_embeddings", parameters={"query": "q"})
+        ]
+    )
+
+    results = client.update_tools_results(response)
+
+    assert results[0]["outputs"][0] == [
+        {
+            "policy_name": "Leave Policy",
+            "document_name": "leave.pdf",
+            "chunk_index": 0,
+            "text": "Policy text",
+        }
+    ]
+    assert client.compaction_stats[0]["bytes_saved"] > 0
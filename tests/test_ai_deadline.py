@@ -0,0 +1,93 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from ai.clients import PARTIAL_ANSWER_MESSAGE, CohereClient
+from ai.deadline import Deadline, DeadlineExceeded, current_deadline, use_deadline
+
+
+class ScriptedCohere:
+    """Stands in for cohere.Client; returns the queued responses in order."""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.timeouts = []
+
+    def chat(self, request_options=None, **kwargs):
+        self.timeouts.append(request_options["timeout_in_seconds"])
+        return self.responses.pop(0)
+
+
+def _tool_call(name, **parameters):
+    return SimpleNamespace(
+        text="", tool_calls=[SimpleNamespace(name=name, parameters=parameters)]
+    )
+
+
+def test_deadline_budget_is_capped_and_raises_when_spent():
+    deadline = Deadline(5)
+    assert deadline.budget(cap=1) == 1
+    assert 4 < deadline.budget() <= 5
+
+    deadline.expires_at = time.monotonic() - 1
+    assert deadline.expired
+    with pytest.raises(DeadlineExceeded):
+        deadline.budget()
+
+
+def test_use_deadline_sets_and_restores_current_deadline():
+    deadline = Deadline(1)
+    with use_deadline(deadline):
+        assert current_deadline() is deadline
+    assert current_deadline() is None
+
+
+def test_ask_llm_returns_partial_answer_when_deadline_expires():
+    deadline = Deadline(30)
+
+    def slow_tool(**kwargs):
+        deadline.expires_at = time.monotonic() - 1
+        return {"organizations": []}
+
+    client = CohereClient(user_id=None)
+    client.client = ScriptedCohere([_tool_call("get_organization_details")])
+    client.function_map["get_organization_details"] = slow_tool
+
+    with use_deadline(deadline):
+        text, history = client.ask_llm(message="Tell me about Acme")
+
+    assert text == PARTIAL_ANSWER_MESSAGE
+    assert history[0] == {"role": "USER", "message": "Tell me about Acme"}
+    assert history[-1]["message"] == PARTIAL_ANSWER_MESSAGE
+    assert client.client.timeouts[0] <= client.provider_timeout
+
+
+def test_slow_tool_times_out_without_failing_the_step(monkeypatch):
+    monkeypatch.setenv("AI_TOOL_TIMEOUT_SECONDS", "0.05")
+    client = CohereClient(user_id=None)
+    client.function_map["get_organization_details"] = lambda **kwargs: time.sleep(0.5)
+
+    results = client.update_tools_results(_tool_call("get_organization_details"))
+
+    assert results[0]["outputs"][0]["error"] == "Tool timed out"
+
+
+def test_policy_agent_answers_partially_when_deadline_already_spent(monkeypatch):
+    from ai import agent as agent_module
+
+    class FakeCohereClient:
+        def __init__(self, message=None, model=None, user_id=None):
+            pass
+
+        def ask_llm(self, message=None, chat_history=None, max_steps=8):
+            current_deadline().budget()
+
+    monkeypatch.setattr(agent_module, "CohereClient", FakeCohereClient)
+    deadline = Deadline(0)
+
+    result = agent_module.PolicyAgent("hello", deadline=deadline).run()
+
+    assert result["response"] == PARTIAL_ANSWER_MESSAGE
+    assert result["messages"][-1]["message"] == PARTIAL_ANSWER_MESSAGE
+    assert result["degraded"] is True
@@ -0,0 +1,132 @@
+import uuid
+from types import SimpleNamespace
+
+from ai import agent as agent_module
+from ai.db import OrganizationUsage
+from ai.metering import HARD_LIMITED, NORMAL, SOFT_LIMITED, Meter, metering_organization
+from users.models import UserType
+
+
+def test_flush_accumulates_usage_per_organization_and_day(db_session):
+    meter = Meter(enabled=True, flush_interval=0)
+    org_id = str(uuid.uuid4())
+
+    with metering_organization(org_id):
+        meter.record(chat_calls=1, input_tokens=100, output_tokens=20)
+        meter.record(embed_calls=1, embed_texts=3, embed_tokens=30)
+    assert meter.flush() == 1
+
+    with metering_organization(org_id):
+        meter.record(requests=1, input_tokens=50, provider_latency_ms=12.5)
+    assert meter.flush() == 1
+    assert meter.flush() == 0
+
+    row = db_session.query(OrganizationUsage).one()
+    assert str(row.organization_id) == org_id
+    assert (row.requests, row.chat_calls, row.input_tokens, row.output_tokens) == (
+        1,
+        1,
+        150,
+        20,
+    )
+    assert (row.embed_calls, row.embed_texts, row.embed_tokens) == (1, 3, 30)
+    assert row.provider_latency_ms == 12.5
+
+
+def test_usage_without_organization_is_not_stored(db_session):
+    meter = Meter(enabled=True, flush_interval=0)
+
+    meter.record(chat_calls=1, input_tokens=100)
+
+    assert meter.flush() == 0
+    assert db_session.query(OrganizationUsage).count() == 0
+
+
+def test_budget_modes_follow_daily_token_totals(db_session):
+    meter = Meter(enabled=True, flush_interval=0, soft_budget=100, hard_budget=200)
+    org_id = str(uuid.uuid4())
+
+    assert meter.budget_mode(org_id) == NORMAL
+    with metering_organization(org_id):
+        meter.record(input_tokens=90, output_tokens=20)
+    assert meter.budget_mode(org_id) == SOFT_LIMITED
+
+    meter.flush()
+    with metering_organization(org_id):
+        meter.record(embed_tokens=100)
+    assert meter.tokens_today(org_id) == 210
+    assert meter.budget_mode(org_id) == HARD_LIMITED
+    assert meter.budget_mode(None) == NORMAL
+
+
+def test_hard_limited_organization_gets_single_call_answers(monkeypatch):
+    calls = {"search": [], "generate": 0}
+
+    class FakeRAGClient:
+        embed_model = "test-model"
+
+        def query_policy_index(
+            self, query, top_k=5, organization_ids=None, query_vector=None
+        ):
+            calls["search"].append(top_k)
+            return [{"policy_name": "Leave", "chunk_index": 0, "text": "10 sick days"}]
+
+    class FakeCohereClient:
+        def __init__(self, message=None, model=None, user_id=None):
+            self.context = SimpleNamespace(organization_ids=["org-1"])
+            self.function_map = {}
+
+        def ask_llm(self, message=None, chat_history=None, max_steps=8):
+            raise AssertionError("hard-limited answers must not plan tool calls")
+
+        def generate(self, message, chat_history=None):
+            calls["generate"] += 1
+            return "You get 10 sick days.", [
+                {"role": "USER", "message": message},
+                {"role": "CHATBOT", "message": "You get 10 sick days."},
+            ]
+
+    meter = Meter(enabled=True, flush_interval=0, hard_budget=10)
+    monkeypatch.setattr(agent_module, "METER", meter)
+    monkeypatch.setattr(agent_module, "RAGClient", FakeRAGClient)
+    monkeypatch.setattr(agent_module, "CohereClient", FakeCohereClient)
+    monkeypatch.setattr(meter, "tokens_today", lambda organization_id: 50)
+
+    with metering_organization(str(uuid.uuid4())):
+        agent = agent_module.PolicyAgent("What is the sick leave policy?")
+        result = agent.run()
+
+    assert agent.budget_mode == HARD_LIMITED
+    assert agent.max_steps <= 2
+    assert result["response"] == "You get 10 sick days."
+    assert calls == {"search": [2], "generate": 1}
+
+
+def test_admin_can_read_usage(
+    client, db_session, create_user, create_organization, auth_headers
+):
+    org = create_organization()
+    other = create_organization(name="Other Org", email="other@example.com")
+    meter = Meter(enabled=True, flush_interval=0)
+    for organization_id, tokens in ((org.id, 40), (other.id, 5)):
+        with metering_organization(str(organization_id)):
+            meter.record(requests=1, input_tokens=tokens)
+    meter.flush()
+    admin = create_user(
+        username="usage-admin",
+        email="usage-admin@example.com",
+        user_type=UserType.ADMIN,
+    )
+    member = create_user()
+
+    response = client.get(
+        f"/admin/ai_usage?organization_id={org.id}", headers=auth_headers(admin)
+    )
+    forbidden = client.get("/admin/ai_usage", headers=auth_headers(member))
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["total"] == 1
+    assert body["items"][0]["organization_id"] == str(org.id)
+    assert body["items"][0]["input_tokens"] == 40
+    assert forbidden.status_code == 403
@@ -0,0 +1,109 @@
+import cohere
+import httpx
+import pytest
+
+from ai.clients import CohereClient
+from ai.replay import NO_RECORDING_MESSAGE, LatencyModel, RecordingClient, ReplayClient
+
+
+class ScriptedCohere:
+    """Answers the first chat with a tool call and the follow-up with text."""
+
+    def chat(self, message=None, tool_results=None, **kwargs):
+        if not tool_results:
+            return cohere.NonStreamedChatResponse(
+                text="",
+                tool_calls=[
+                    cohere.ToolCall(
+                        name="get_organization_details",
+                        parameters={"organization_id": "org-1"},
+                    )
+                ],
+            )
+        name = tool_results[0]["outputs"][0]["name"]
+        return cohere.NonStreamedChatResponse(text=f"The organization is {name}.")
+
+    def embed(self, texts, **kwargs):
+        return cohere.EmbedFloatsResponse(
+            id="e1", texts=texts, embeddings=[[0.5, 0.25] for _ in texts]
+        )
+
+
+def _agent_client(provider, tool_calls):
+    client = CohereClient(user_id=None)
+    client.client = provider
+
+    def get_organization_details(organization_id):
+        tool_calls.append(organization_id)
+        return {"name": "Acme"}
+
+    client.function_map["get_organization_details"] = get_organization_details
+    return client
+
+
+def test_recorded_agent_loop_replays_offline(tmp_path):
+    path = tmp_path / "recording.jsonl"
+    tool_calls = []
+    recorder = RecordingClient(ScriptedCohere(), str(path))
+
+    answer, _ = _agent_client(recorder, tool_calls).ask_llm("Who runs org-1?")
+    recorder.embed(texts=["leave policy"], model="m", input_type="search_query")
+    assert answer == "The organization is Acme."
+    assert len(path.read_text().splitlines()) == 3
+
+    replay = ReplayClient(str(path), strict=True)
+    replayed, _ = _agent_client(replay, tool_calls).ask_llm("Who runs org-1?")
+    assert replayed == answer
+    assert tool_calls == ["org-1", "org-1"]
+    embedded = replay.embed(
+        texts=["leave policy"], model="m", input_type="search_query"
+    )
+    assert embedded.embeddings == [[0.5, 0.25]]
+
+
+def test_replay_matches_loosely_and_falls_back(tmp_path):
+    path = tmp_path / "recording.jsonl"
+    recorder = RecordingClient(ScriptedCohere(), str(path))
+    recorder.chat(message="hello", preamble="for user a", chat_history=[])
+
+    replay = ReplayClient(str(path))
+    response = replay.chat(message="hello", preamble="for user b", chat_history=[])
+    assert response.tool_calls[0].name == "get_organization_details"
+
+    assert replay.chat(message="unknown").text == NO_RECORDING_MESSAGE
+    vectors = replay.embed(texts=["a", "a"], input_type="search_query").embeddings
+    assert vectors[0] == vectors[1]
+    assert replay.misses == 2
+
+    with pytest.raises(KeyError):
+        ReplayClient(str(path), strict=True).chat(message="unknown")
+
+
+def test_latency_model_distributions_and_timeouts(tmp_path):
+    assert LatencyModel("fixed:250").sample() == 0.25
+    assert LatencyModel("recorded", scale=2).sample(100) == 0.2
+    samples = [LatencyModel("uniform:10,20", seed=1).sample() for _ in range(5)]
+    assert all(0.01 <= sample <= 0.02 for sample in samples)
+    assert LatencyModel("lognormal:100,0.5", seed=3).sample() > 0
+    with pytest.raises(ValueError):
+        LatencyModel("bimodal:1,2")
+
+    path = tmp_path / "recording.jsonl"
+    RecordingClient(ScriptedCohere(), str(path)).chat(message="hi")
+    replay = ReplayClient(str(path), chat_latency=LatencyModel("fixed:200"))
+    with pytest.raises(httpx.ReadTimeout):
+        replay.chat(message="hi", request_options={"timeout_in_seconds": 0.01})
+
+
+def test_mock_client_drives_the_tool_loop():
+    from ai.replay import MockCohereClient
+
+    mock = MockCohereClient()
+    client = _agent_client(mock, [])
+    client.tools = [{"name": "get_my_organization_details"}]
+    client.function_map["get_my_organization_details"] = lambda: {"name": "Acme"}
+
+    answer, _ = client.ask_llm("Which organization am I in?")
+    assert answer.startswith("Based on 1 tool result(s)")
+    assert "Acme" in answer
+    assert mock.embed(texts=["a"]).embeddings == mock.embed(texts=["a"]).embeddings
@@ -0,0 +1,175 @@
+import threading
+import time
+
+import httpx
+import pytest
+
+from ai.resilience import CircuitBreaker, CircuitOpenError, ResilientCall
+from application.metrics import METRICS
+from users.choices import UserType
+
+
+class ProviderError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"provider returned {status_code}")
+        self.status_code = status_code
+
+
+def _call(name, **breaker_kwargs):
+    call = ResilientCall(name, breaker=CircuitBreaker(name, **breaker_kwargs))
+    call.backoff_base = 0
+    return call
+
+
+def test_retries_retryable_errors_then_succeeds():
+    METRICS.reset()
+    call = _call("test-retry")
+    attempts = []
+
+    def flaky(timeout):
+        attempts.append(timeout)
+        if len(attempts) < 3:
+            raise ProviderError(503)
+        return "ok"
+
+    assert call.call(flaky, timeout_cap=5) == "ok"
+    assert len(attempts) == 3
+    assert METRICS.snapshot()["counters"]["provider.test-retry.retries"] == 2
+
+
+def test_non_retryable_error_is_raised_immediately():
+    call = _call("test-bad-request")
+    attempts = []
+
+    def bad_request(timeout):
+        attempts.append(timeout)
+        raise ProviderError(400)
+
+    with pytest.raises(ProviderError):
+        call.call(bad_request, timeout_cap=5)
+    assert len(attempts) == 1
+
+
+def test_circuit_opens_fails_fast_and_recovers():
+    call = _call("test-circuit", failure_threshold=2, reset_timeout=0.05)
+    call.max_retries = 0
+
+    def down(timeout):
+        raise httpx.ConnectError("connection refused")
+
+    for _ in range(2):
+        with pytest.raises(httpx.ConnectError):
+            call.call(down, timeout_cap=5)
+    assert call.breaker.is_open
+    with pytest.raises(CircuitOpenError):
+        call.call(lambda timeout: "never called", timeout_cap=5)
+
+    time.sleep(0.06)
+    assert call.call(lambda timeout: "back", timeout_cap=5) == "back"
+    assert call.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_hedged_request_wins_when_primary_is_slow():
+    METRICS.reset()
+    call = _call("test-hedge")
+    call.hedge = True
+    call.hedge_min_samples = 1
+    call.latency = METRICS.histogram("provider.test-hedge.latency_seconds")
+    call.latency.observe(0.01)
+    release = threading.Event()
+    calls = []
+
+    def provider(timeout):
+        calls.append(timeout)
+        if len(calls) == 1:
+            release.wait(1)
+            return "primary"
+        return "hedge"
+
+    try:
+        assert call.call(provider, timeout_cap=5) == "hedge"
+    finally:
+        release.set()
+    counters = METRICS.snapshot()["counters"]
+    assert counters["provider.test-hedge.hedges"] == 1
+    assert counters["provider.test-hedge.hedge_wins"] == 1
+
+
+def test_ask_llm_degrades_when_chat_circuit_is_open(monkeypatch):
+    from ai import clients as clients_module
+    from ai.clients import PROVIDER_UNAVAILABLE_MESSAGE, CohereClient
+
+    call = _call("chat-open", failure_threshold=1, reset_timeout=60)
+    call.breaker.record_failure()
+    monkeypatch.setattr(clients_module, "CHAT_CALL", call)
+
+    text, history = CohereClient(user_id=None).ask_llm(message="hi", chat_history=[])
+
+    assert text == PROVIDER_UNAVAILABLE_MESSAGE
+    assert history == []
+
+
+def test_provider_errors_are_not_shown_to_the_user(monkeypatch):
+    from ai.clients import PROVIDER_UNAVAILABLE_MESSAGE, CohereClient
+
+    client = CohereClient(user_id=None)
+
+    def failing_chat(**kwargs):
+        raise RuntimeError("upstream 400: invalid api key sk-123")
+
+    monkeypatch.setattr(client, "chat", failing_chat)
+
+    assert client.ask_llm(message="hi", chat_history=[]) == (
+        PROVIDER_UNAVAILABLE_MESSAGE,
+        [],
+    )
+    assert client.generate(message="hi", chat_history=[]) == (
+        PROVIDER_UNAVAILABLE_MESSAGE,
+        [],
+    )
+
+
+def test_metrics_endpoint_requires_admin(client, create_user, auth_headers):
+    regular = create_user(username="metrics-user", email="metrics@example.com")
+    admin = create_user(
+        username="metrics-admin",
+        email="metrics-admin@example.com",
+        user_type=UserType.ADMIN,
+    )
+
+    assert (
+        client.get("/admin/metrics", headers=auth_headers(regular)).status_code == 403
+    )
+    response = client.get("/admin/metrics", headers=auth_headers(admin))
+    assert response.status_code == 200
+    assert set(response.json()) == {"counters", "gauges", "histograms"}
+
+
+def test_deadline_during_half_open_trial_does_not_wedge_the_circuit():
+    from ai.deadline import Deadline, DeadlineExceeded, use_deadline
+
+    call = _call("test-trial-deadline", failure_threshold=1, reset_timeout=0.01)
+    call.max_retries = 0
+
+    def down(timeout):
+        raise httpx.ConnectError("connection refused")
+
+    def slow(timeout):
+        time.sleep(0.05)
+        raise httpx.ReadTimeout("timed out")
+
+    with pytest.raises(httpx.ConnectError):
+        call.call(down, timeout_cap=5)
+    time.sleep(0.02)
+    with use_deadline(Deadline(0.01)):
+        with pytest.raises(DeadlineExceeded):
+            call.call(slow, timeout_cap=5)
+    assert call.breaker.state == CircuitBreaker.OPEN
+
+    with use_deadline(Deadline(0)):
+        with pytest.raises(DeadlineExceeded):
+            call.call(lambda timeout: "never called", timeout_cap=5)
+    assert call.breaker.state == CircuitBreaker.OPEN
+
+    assert call.call(lambda timeout: "back", timeout_cap=5) == "back"
+    assert call.breaker.state == CircuitBreaker.CLOSED
@@ -1,3 +1,6 @@
+import asyncio
+
+
 def test_root(client):
     response = client.get("/")
     assert response.status_code == 200
@@ -20,3 +23,93 @@ def test_root_includes_docs(client):
     payload = response.json()
     assert "docs" in payload
     assert payload["docs"] == "/docs"
+
+
+def test_ready_reports_warmup_progress(client, monkeypatch):
+    import application.app as app_module
+    from application.warmup import Warmup
+
+    warmup = Warmup(steps=[("noop", lambda: {"done": 1})])
+    monkeypatch.setattr(app_module, "WARMUP", warmup)
+
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.json()["status"] == "warming_up"
+
+    warmup.run()
+    response = client.get("/ready")
+    assert response.status_code == 200
+    payload = response.json()
+    assert payload["status"] == "ready"
+    assert payload["steps"]["noop"]["status"] == "ok"
+    assert payload["steps"]["noop"]["done"] == 1
+
+
+def test_warmup_failed_step_does_not_block_readiness():
+    from application.warmup import Warmup
+
+    def broken():
+        raise RuntimeError("provider down")
+
+    warmup = Warmup(steps=[("provider", broken), ("imports", lambda: {})])
+    warmup.run()
+
+    assert warmup.ready.is_set()
+    assert warmup.results["provider"] == {
+        "status": "failed",
+        "error": "provider down",
+        "seconds": warmup.results["provider"]["seconds"],
+    }
+    assert warmup.results["imports"]["status"] == "ok"
+
+
+def test_warmup_database_pool_step_opens_connections(app):
+    from application.warmup import warm_database_pool
+
+    assert warm_database_pool()["connections"] >= 1
+
+
+def test_warmup_async_database_pool_step_opens_connections(app):
+    from application.warmup import warm_async_database_pool
+
+    assert asyncio.run(warm_async_database_pool())["connections"] >= 1
+
+
+def test_warmup_runs_async_steps_on_the_application_loop(monkeypatch):
+    from application.warmup import Warmup
+
+    monkeypatch.setenv("WARMUP_ENABLED", "true")
+    loops = []
+
+    async def step():
+        loops.append(asyncio.get_running_loop())
+        return {"done": 1}
+
+    async def scenario():
+        warmup = Warmup(steps=[("async_step", step)])
+        warmup.start(loop=asyncio.get_running_loop())
+        await asyncio.to_thread(warmup.ready.wait, 5)
+        return warmup, asyncio.get_running_loop()
+
+    warmup, loop = asyncio.run(scenario())
+
+    assert loops == [loop]
+    assert warmup.results["async_step"]["done"] == 1
+
+
+def test_pinned_query_embeddings_skip_the_provider(monkeypatch):
+    from ai import rag
+
+    calls = []
+
+    def fake_call_embed(self, texts, input_type):
+        calls.append(list(texts))
+        return [[float(len(text))] for text in texts]
+
+    monkeypatch.setattr(rag.RAGClient, "_call_embed", fake_call_embed)
+    monkeypatch.setattr(rag, "PINNED_QUERY_EMBEDDINGS", {})
+    client = rag.RAGClient(embed_model="test-model")
+
+    assert client.pin_query_embeddings(["fixed tool query"]) == 1
+    assert client.embed_queries(["Fixed tool query"]) == [[16.0]]
+    assert calls == [["fixed tool query"]]
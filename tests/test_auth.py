@@ -1,7 +1,16 @@
+import asyncio
+import time
+
 import pytest
+from passlib.context import CryptContext
 
+import auth.backend as auth_backend
+import auth.passwords as auth_passwords
+from application.metrics import METRICS
 from auth.jwt import create_access_token, decode_access_token
 from auth.passwords import hash_password, verify_password
+from auth.principals import PrincipalCache
+from users.choices import UserType
 
 
 def test_create_and_decode_token():
@@ -54,3 +63,112 @@ def test_protected_endpoint_with_invalid_token_returns_401(client):
         headers={"Authorization": "Bearer invalid-token-here"},
     )
     assert response.status_code == 401
+
+
+def _count_principal_loads(monkeypatch):
+    loads = []
+    load_principal = auth_backend._load_principal
+
+    async def counting_load(user_id, payload):
+        loads.append(user_id)
+        return await load_principal(user_id, payload)
+
+    monkeypatch.setattr(auth_backend, "_load_principal", counting_load)
+    return loads
+
+
+def test_principal_is_cached_across_requests(
+    monkeypatch, client, create_user, auth_headers
+):
+    loads = _count_principal_loads(monkeypatch)
+    user = create_user()
+    headers = auth_headers(user)
+
+    for _ in range(3):
+        assert client.get(f"/users/{user.id}", headers=headers).status_code == 200
+
+    assert loads == [str(user.id)]
+
+
+def test_user_type_change_invalidates_cached_principal(
+    monkeypatch, client, db_session, create_user, auth_headers
+):
+    loads = _count_principal_loads(monkeypatch)
+    user = create_user(username="promoted", email="promoted@example.com")
+    headers = auth_headers(user)
+    assert client.get("/users", headers=headers).status_code == 403
+
+    user.user_type = UserType.ADMIN
+    db_session.commit()
+
+    assert client.get("/users", headers=headers).status_code == 200
+    assert len(loads) == 2
+
+
+def test_deleted_user_is_no_longer_authenticated(client, create_user, auth_headers):
+    user = create_user()
+    headers = auth_headers(user)
+    assert client.get(f"/users/{user.id}", headers=headers).status_code == 200
+
+    assert client.delete(f"/users/{user.id}", headers=headers).status_code == 200
+
+    assert client.get(f"/users/{user.id}", headers=headers).status_code == 401
+
+
+def test_token_claims_are_cached_until_expiry():
+    cache = PrincipalCache(ttl=60)
+    decoded = []
+
+    def decode(token):
+        decoded.append(token)
+        return {"sub": "123", "exp": time.time() + (60 if token == "live" else -1)}
+
+    cache.claims("live", decode)
+    cache.claims("live", decode)
+    cache.claims("expired", decode)
+    cache.claims("expired", decode)
+
+    assert decoded == ["live", "expired", "expired"]
+
+
+def test_login_rehashes_outdated_password_hash(
+    monkeypatch, client, db_session, create_user
+):
+    monkeypatch.setattr(
+        auth_passwords,
+        "pwd_context",
+        CryptContext(schemes=["bcrypt_sha256"], bcrypt_sha256__default_rounds=4),
+    )
+    user = create_user(username="rehash", email="rehash@example.com")
+    user.password_hash = auth_passwords.hash_password("secret")
+    db_session.commit()
+    old_hash = user.password_hash
+    monkeypatch.setattr(
+        auth_passwords,
+        "pwd_context",
+        CryptContext(
+            schemes=["bcrypt_sha256"],
+            bcrypt_sha256__default_rounds=5,
+            bcrypt_sha256__min_rounds=5,
+        ),
+    )
+
+    response = client.post("/login", json={"username": "rehash", "password": "secret"})
+
+    assert response.status_code == 200
+    db_session.refresh(user)
+    assert user.password_hash != old_hash
+    assert not auth_passwords.pwd_context.needs_update(user.password_hash)
+    assert auth_passwords.verify_password("secret", user.password_hash)
+
+
+def test_password_hashing_runs_on_the_hashing_lane():
+    hashed = asyncio.run(auth_passwords.hash_password_async("my-pass-123"))
+
+    assert asyncio.run(
+        auth_passwords.verify_and_rehash_async("my-pass-123", hashed)
+    ) == (True, None)
+    assert asyncio.run(
+        auth_passwords.verify_and_rehash_async("wrong-pass", hashed)
+    ) == (False, None)
+    assert METRICS.gauge("lane.hashing.queued").value == 0
@@ -0,0 +1,106 @@
+import sqlite3
+
+import pytest
+from sqlalchemy import create_engine, exc, text
+
+from application.metrics import METRICS
+from database.pool import (
+    InstrumentedAsyncQueuePool,
+    InstrumentedQueuePool,
+    configure_pre_ping,
+    connection_budget_problem,
+    engine_options,
+    pool_capacity,
+)
+
+
+def test_instrumented_pool_publishes_checkout_metrics():
+    METRICS.reset()
+    pool = InstrumentedQueuePool(
+        lambda: sqlite3.connect(":memory:"),
+        pool_size=1,
+        max_overflow=1,
+        timeout=0.05,
+        logging_name="test",
+    )
+
+    first = pool.connect()
+    second = pool.connect()
+    assert METRICS.gauge("db.pool.test.in_use").value == 2
+    assert METRICS.gauge("db.pool.test.overflow").value == 1
+    assert METRICS.counter("db.pool.test.overflow_connections").value == 1
+
+    with pytest.raises(exc.TimeoutError):
+        pool.connect()
+    assert METRICS.counter("db.pool.test.timeouts").value == 1
+
+    first.close()
+    second.close()
+    assert METRICS.gauge("db.pool.test.in_use").value == 0
+    assert METRICS.histogram("db.pool.test.checkout_wait_ms").count == 3
+
+
+def test_engine_options_for_postgres(monkeypatch):
+    monkeypatch.setenv("DB_POOL_SIZE", "8")
+    monkeypatch.setenv("DB_PRE_PING", "idle")
+    monkeypatch.setenv("DB_STATEMENT_TIMEOUT_MS", "5000")
+    monkeypatch.setenv("DB_IDLE_IN_TRANSACTION_TIMEOUT_MS", "10000")
+
+    sync = engine_options("postgresql+psycopg2://u:p@db/app", name="crud")
+    async_ = engine_options(
+        "postgresql+asyncpg://u:p@db/app", name="async", is_async=True, pool_size=2
+    )
+
+    assert sync["poolclass"] is InstrumentedQueuePool
+    assert sync["pool_size"] == 8
+    assert sync["pool_pre_ping"] is False
+    assert sync["connect_args"] == {
+        "options": "-c statement_timeout=5000 "
+        "-c idle_in_transaction_session_timeout=10000"
+    }
+    assert async_["poolclass"] is InstrumentedAsyncQueuePool
+    assert async_["pool_size"] == 2
+    assert async_["connect_args"] == {
+        "server_settings": {
+            "statement_timeout": "5000",
+            "idle_in_transaction_session_timeout": "10000",
+        }
+    }
+    assert engine_options("sqlite:///test.db", name="crud") == {"pool_pre_ping": False}
+
+
+def test_connection_budget_counts_every_pool_per_process(monkeypatch):
+    monkeypatch.setenv("DB_POOL_SIZE", "5")
+    monkeypatch.setenv("DB_MAX_OVERFLOW", "10")
+    url = "postgresql+psycopg2://u:p@db/app"
+    capacities = {
+        "crud": pool_capacity(engine_options(url, name="crud")),
+        "async": pool_capacity(engine_options(url, name="async", is_async=True)),
+        "ai": pool_capacity(
+            engine_options(url, name="ai", pool_size=5, max_overflow=5)
+        ),
+    }
+
+    assert capacities == {"crud": 15, "async": 15, "ai": 10}
+    assert pool_capacity(engine_options("sqlite:///test.db", name="crud")) == 0
+    assert connection_budget_problem(capacities, available=97, processes=2) is None
+    problem = connection_budget_problem(capacities, available=97, processes=4)
+    assert "4 process(es) x 40 pooled connections" in problem
+    assert "max_overflow=-1" in connection_budget_problem(
+        {"crud": None}, available=97, processes=1
+    )
+
+
+def test_idle_pre_ping_replaces_dead_connections(monkeypatch, tmp_path):
+    monkeypatch.setenv("DB_PRE_PING", "idle")
+    monkeypatch.setenv("DB_PRE_PING_IDLE_SECONDS", "0")
+    engine = create_engine(f"sqlite:///{tmp_path / 'pool.db'}")
+    configure_pre_ping(engine)
+
+    with engine.connect() as connection:
+        dead = connection.connection.dbapi_connection
+    dead.close()
+
+    with engine.connect() as connection:
+        assert connection.execute(text("SELECT 1")).scalar() == 1
+        assert connection.connection.dbapi_connection is not dead
@@ -0,0 +1,141 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from ai import apis as ai_apis
+from ai.clients import PARTIAL_ANSWER_MESSAGE
+from application.idempotency import REPLAYED_HEADER, IdempotencyStore
+from organizations.models import Policy
+
+
+def test_concurrent_duplicates_share_one_execution():
+    store = IdempotencyStore("test", ttl=60)
+    calls = []
+
+    async def handler():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"answer": 42}
+
+    async def scenario():
+        first, second = await asyncio.gather(
+            store.respond(("u1", "k1"), "f", handler),
+            store.respond(("u1", "k1"), "f", handler),
+        )
+        third = await store.respond(("u1", "k1"), "f", handler)
+        return first, second, third
+
+    first, second, third = asyncio.run(scenario())
+    assert calls == [1]
+    assert first.body == second.body == third.body == b'{"answer":42}'
+    assert REPLAYED_HEADER.lower() not in first.headers
+    assert second.headers[REPLAYED_HEADER.lower()] == "true"
+
+
+def test_failures_are_not_stored_and_reused_keys_conflict():
+    store = IdempotencyStore("test", ttl=60)
+    attempts = []
+
+    async def flaky():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("provider down")
+        return {"ok": True}
+
+    async def scenario():
+        with pytest.raises(RuntimeError):
+            await store.respond("k", "f", flaky)
+        response = await store.respond("k", "f", flaky)
+        with pytest.raises(HTTPException) as conflict:
+            await store.respond("k", "other body", flaky)
+        return response, conflict.value
+
+    response, conflict = asyncio.run(scenario())
+    assert response.status_code == 200
+    assert len(attempts) == 2
+    assert conflict.status_code == 422
+
+
+def test_policy_upload_retry_is_not_created_twice(
+    client, db_session, create_user, create_organization, auth_headers
+):
+    user = create_user()
+    org = create_organization()
+    request = {
+        "headers": {**auth_headers(user), "Idempotency-Key": "upload-1"},
+        "data": {"organization_id": str(org.id), "name": "Leave Policy"},
+    }
+
+    first = client.post("/policies", **request)
+    retry = client.post("/policies", **request)
+
+    assert first.status_code == retry.status_code == 200
+    assert retry.json()["id"] == first.json()["id"]
+    assert retry.headers[REPLAYED_HEADER] == "true"
+    assert db_session.query(Policy).count() == 1
+
+
+def test_ai_assistant_replays_response_for_repeated_key(
+    client, monkeypatch, create_user, auth_headers
+):
+    runs = []
+
+    class CountingAgent:
+        def __init__(self, question, session_id=None, user_id=None):
+            self.session_id = session_id
+
+        def run(self):
+            runs.append(1)
+            return {"response": f"answer {len(runs)}", "session_id": self.session_id}
+
+    monkeypatch.setattr(ai_apis, "PolicyAgent", CountingAgent)
+    owner = create_user(username="retry-user", email="retry@example.com")
+    other = create_user(username="other-user", email="other@example.com")
+
+    def ask(user, key="q-1"):
+        return client.post(
+            "/ai_assistant",
+            json={"question": "How many leave days?"},
+            headers={**auth_headers(user), "Idempotency-Key": key},
+        )
+
+    first, retry = ask(owner), ask(owner)
+    assert retry.json() == first.json()
+    assert runs == [1]
+    assert ask(other).json()["response"] == "answer 2"
+
+
+def test_ai_assistant_does_not_replay_degraded_answers(
+    client, monkeypatch, create_user, auth_headers
+):
+    runs = []
+
+    class TimingOutAgent:
+        def __init__(self, question, session_id=None, user_id=None):
+            self.session_id = session_id
+
+        def run(self):
+            runs.append(1)
+            if len(runs) == 1:
+                return {
+                    "response": PARTIAL_ANSWER_MESSAGE,
+                    "session_id": self.session_id,
+                    "degraded": True,
+                }
+            return {"response": "20 days", "session_id": self.session_id}
+
+    monkeypatch.setattr(ai_apis, "PolicyAgent", TimingOutAgent)
+    user = create_user(username="timeout-user", email="timeout@example.com")
+
+    def ask():
+        return client.post(
+            "/ai_assistant",
+            json={"question": "How many leave days?"},
+            headers={**auth_headers(user), "Idempotency-Key": "q-1"},
+        )
+
+    assert ask().json()["response"] == PARTIAL_ANSWER_MESSAGE
+    assert ask().json()["response"] == "20 days"
+    assert ask().json()["response"] == "20 days"
+    assert runs == [1, 1]
@@ -1,3 +1,5 @@
+import pytest
+
 from users.choices import LeaveType, UserType
 
 
@@ -353,3 +355,154 @@ def test_delete_leave_request_not_found(client, create_user, auth_headers):
     )
     assert response.status_code == 404
     assert response.json()["detail"] == "Leave request not found"
+
+
+def _index_allowances(policy, text):
+    from ai.rag import RAGClient
+    from database.db import SessionLocal
+
+    with SessionLocal() as db:
+        count = RAGClient()._store_leave_allowances(
+            db, str(policy.id), str(policy.organization_id), text
+        )
+        db.commit()
+    return count
+
+
+def test_leave_balances_computed_from_extracted_allowances(
+    client,
+    create_user,
+    create_organization,
+    create_user_organization,
+    create_policy,
+    create_leave_request,
+    auth_headers,
+):
+    from datetime import date
+
+    user = create_user(username="balance-user", email="balance-user@example.com")
+    org = create_organization(name="Balance Org")
+    create_user_organization(user_id=user.id, organization_id=org.id)
+    policy = create_policy(organization_id=org.id, name="Leave Policy")
+    stored = _index_allowances(
+        policy,
+        "Employees get 12 days of sick leave per year. "
+        "Privilege leave: 1.5 days per month.",
+    )
+    this_year = date.today().year
+    for day in (5, 6):
+        create_leave_request(
+            user_id=user.id,
+            organization_id=org.id,
+            date=date(this_year, 1, day),
+            leave_type=LeaveType.SICK_LEAVE,
+            is_accepted=True,
+        )
+    create_leave_request(
+        user_id=user.id,
+        organization_id=org.id,
+        date=date(this_year - 1, 12, 30),
+        leave_type=LeaveType.SICK_LEAVE,
+        is_accepted=True,
+    )
+    create_leave_request(
+        user_id=user.id,
+        organization_id=org.id,
+        date=date(this_year, 1, 7),
+        leave_type=LeaveType.SICK_LEAVE,
+        is_accepted=False,
+    )
+
+    response = client.get("/leave_balances", headers=auth_headers(user))
+
+    assert stored == 2
+    assert response.status_code == 200
+    data = response.json()
+    assert data["year"] == this_year
+    balances = {item["leave_type"]: item for item in data["balances"]}
+    assert balances[LeaveType.SICK_LEAVE] == {
+        "organization_id": str(org.id),
+        "organization_name": "Balance Org",
+        "leave_type": LeaveType.SICK_LEAVE,
+        "allowed_days": 12.0,
+        "used_days": 2,
+        "remaining_days": 10.0,
+    }
+    assert balances[LeaveType.PRIVILEGE_LEAVE]["allowed_days"] == 18.0
+    assert balances[LeaveType.PRIVILEGE_LEAVE]["remaining_days"] == 18.0
+
+
+def test_failed_indexing_stores_no_allowances(
+    db_session, create_organization, create_policy, monkeypatch
+):
+    from ai.rag import RAGClient
+    from organizations.models import PolicyLeaveAllowance
+
+    org = create_organization(name="Unindexed Org")
+    policy = create_policy(organization_id=org.id)
+    rag = RAGClient()
+    monkeypatch.setattr(
+        rag,
+        "_read_text_from_source",
+        lambda file_path: "Employees get 12 days of sick leave per year.",
+    )
+
+    def failing_embed(texts, input_type):
+        raise RuntimeError("embedding provider down")
+
+    monkeypatch.setattr(rag, "_embed_texts", failing_embed)
+
+    with pytest.raises(RuntimeError):
+        rag.index_policy_document(
+            str(policy.id), str(org.id), policy.name, None, None, "policy.txt"
+        )
+
+    assert db_session.query(PolicyLeaveAllowance).count() == 0
+
+
+def test_leave_balances_empty_without_allowances(
+    client, create_user, create_organization, create_user_organization, auth_headers
+):
+    user = create_user(username="no-balance", email="no-balance@example.com")
+    org = create_organization(name="No Balance Org")
+    create_user_organization(user_id=user.id, organization_id=org.id)
+
+    response = client.get("/leave_balances", headers=auth_headers(user))
+
+    assert response.status_code == 200
+    assert response.json()["balances"] == []
+    assert response.json()["message"] == "No leave allowances found"
+
+
+def test_moving_a_policy_moves_its_allowances(
+    client,
+    db_session,
+    create_user,
+    create_organization,
+    create_user_organization,
+    create_policy,
+    auth_headers,
+):
+    from organizations.models import PolicyLeaveAllowance
+
+    user = create_user(username="moved-user", email="moved-user@example.com")
+    old_org = create_organization(name="Old Org")
+    new_org = create_organization(name="New Org", email="new-org@example.com")
+    create_user_organization(user_id=user.id, organization_id=new_org.id)
+    policy = create_policy(organization_id=old_org.id, name="Leave Policy")
+    _index_allowances(policy, "Employees receive 12 days of sick leave per year.")
+
+    response = client.put(
+        f"/policies/{policy.id}",
+        headers=auth_headers(user),
+        data={"organization_id": str(new_org.id), "name": "Leave Policy"},
+    )
+    balances = client.get("/leave_balances", headers=auth_headers(user)).json()
+
+    assert response.status_code == 200
+    allowance = db_session.query(PolicyLeaveAllowance).one()
+    db_session.refresh(allowance)
+    assert allowance.organization_id == new_org.id
+    assert [item["organization_id"] for item in balances["balances"]] == [
+        str(new_org.id)
+    ]
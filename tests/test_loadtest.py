@@ -0,0 +1,31 @@
+from loadtest.ai_assistant import parse_args, percentile, summarize
+
+
+def test_percentile_uses_nearest_rank():
+    values = [float(value) for value in range(1, 101)]
+    assert percentile(values, 50) == 50.0
+    assert percentile(values, 99) == 99.0
+    assert percentile([], 95) is None
+
+
+def test_summarize_separates_rejections_from_errors():
+    result = summarize(
+        concurrency=4,
+        elapsed=2.0,
+        latencies=[0.1, 0.2, 0.3],
+        statuses={200: 3, 429: 1, 503: 1, 500: 2},
+        loop_lags=[0.001, 0.004],
+        pool_waits=[],
+    )
+    assert result["rps"] == 1.5
+    assert result["rejected"] == 2
+    assert result["errors"] == 2
+    assert result["p50_ms"] == 200.0
+    assert result["loop_lag_max_ms"] == 4.0
+    assert result["pool_wait_p95_ms"] is None
+
+
+def test_parse_args_reads_concurrency_levels():
+    args = parse_args(["--concurrency", "2,8", "--chat-latency", "fixed:100"])
+    assert args.concurrency == [2, 8]
+    assert args.chat_latency == "fixed:100"
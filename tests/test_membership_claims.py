@@ -0,0 +1,108 @@
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from auth.jwt import decode_access_token
+from users.choices import LeaveType
+
+LEAVE_BODY = {"date": "2026-03-20T00:00:00", "leave_type": LeaveType.SICK_LEAVE}
+
+
+@contextmanager
+def _membership_queries(engine):
+    statements = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        if "user_organizations" in statement and statement.startswith("SELECT"):
+            statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", _record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", _record)
+
+
+def _login(client, username):
+    response = client.post("/login", json={"username": username, "password": "secret"})
+    assert response.status_code == 200
+    return response.json()["access_token"]
+
+
+def test_login_embeds_active_memberships(
+    monkeypatch, client, create_user, create_organization, create_user_organization
+):
+    monkeypatch.setenv("AUTH_MEMBERSHIP_CLAIMS", "true")
+    user = create_user(username="member", password="secret")
+    org = create_organization()
+    create_user_organization(user_id=user.id, organization_id=org.id)
+
+    claims = decode_access_token(_login(client, "member"))
+
+    assert claims["orgs"] == [str(org.id)]
+    assert claims["mv"] == 1
+
+
+def test_membership_changes_bump_the_version(
+    db_session, create_user, create_organization, create_user_organization
+):
+    user = create_user()
+    org = create_organization()
+    assert user.membership_version == 0
+
+    membership = create_user_organization(user_id=user.id, organization_id=org.id)
+    membership.is_active = False
+    db_session.commit()
+
+    db_session.refresh(user)
+    assert user.membership_version == 2
+
+
+def test_leave_request_is_authorized_from_claims(
+    monkeypatch,
+    client,
+    db_engine,
+    create_user,
+    create_organization,
+    create_user_organization,
+):
+    monkeypatch.setenv("AUTH_MEMBERSHIP_CLAIMS", "true")
+    user = create_user(username="claims", password="secret")
+    org = create_organization()
+    create_user_organization(user_id=user.id, organization_id=org.id)
+    headers = {"Authorization": f"Bearer {_login(client, 'claims')}"}
+
+    with _membership_queries(db_engine) as statements:
+        response = client.post(
+            "/leave_requests",
+            headers=headers,
+            json={"organization_id": str(org.id), **LEAVE_BODY},
+        )
+
+    assert response.status_code == 200
+    assert statements == []
+
+
+def test_stale_claims_are_refreshed_after_leaving(
+    monkeypatch,
+    client,
+    db_session,
+    create_user,
+    create_organization,
+    create_user_organization,
+):
+    monkeypatch.setenv("AUTH_MEMBERSHIP_CLAIMS", "true")
+    user = create_user(username="leaver", password="secret")
+    org = create_organization()
+    membership = create_user_organization(user_id=user.id, organization_id=org.id)
+    headers = {"Authorization": f"Bearer {_login(client, 'leaver')}"}
+
+    membership.is_active = False
+    db_session.commit()
+    response = client.post(
+        "/leave_requests",
+        headers=headers,
+        json={"organization_id": str(org.id), **LEAVE_BODY},
+    )
+
+    assert response.status_code == 403
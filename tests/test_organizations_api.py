@@ -166,3 +166,42 @@ def test_policy_with_file_upload(client, create_user, create_organization, auth_
     # Clean up - delete the policy
     policy_id = create_response.json()["id"]
     client.delete(f"/policies/{policy_id}", headers=auth_headers(user))
+
+
+def test_moving_a_policy_rescopes_its_index(
+    client, db_session, create_user, create_organization, create_policy, auth_headers
+):
+    from ai.answer_cache import ANSWER_CACHE
+    from ai.db import PolicyEmbedding
+
+    user = create_user(username="move-user", email="move-user@example.com")
+    old_org = create_organization(name="Old Index Org")
+    new_org = create_organization(name="New Index Org", email="new-index@example.com")
+    policy = create_policy(organization_id=old_org.id, name="Travel Policy")
+    db_session.add(
+        PolicyEmbedding(
+            policy_id=policy.id,
+            organization_id=old_org.id,
+            policy_name=policy.name,
+            file_path="travel.pdf",
+            chunk_index=0,
+            text="Economy class only.",
+            embedding=[0.0] * 1024,
+        )
+    )
+    db_session.commit()
+    old_generation = ANSWER_CACHE.generation([str(old_org.id)])
+    new_generation = ANSWER_CACHE.generation([str(new_org.id)])
+
+    response = client.put(
+        f"/policies/{policy.id}",
+        headers=auth_headers(user),
+        data={"organization_id": str(new_org.id), "name": "Travel Policy"},
+    )
+
+    assert response.status_code == 200
+    chunk = db_session.query(PolicyEmbedding).one()
+    db_session.refresh(chunk)
+    assert chunk.organization_id == new_org.id
+    assert ANSWER_CACHE.generation([str(old_org.id)]) != old_generation
+    assert ANSWER_CACHE.generation([str(new_org.id)]) != new_generation
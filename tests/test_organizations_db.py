@@ -1,5 +1,8 @@
 """Unit tests for organizations.db helpers (get_my_organization_details, get_organization_ids_for_user)."""
 
+import asyncio
+
+import database.db as db
 import organizations.db as org_db
 
 
@@ -183,3 +186,18 @@ def test_get_my_approved_leaves_summary_grouped_by_org_and_type(
     assert len(result["approved_leaves"]) == 2
     org_names = {a["organization_name"] for a in result["approved_leaves"]}
     assert org_names == {"Org A", "Org B"}
+
+
+def test_fetch_active_organization_ids_matches_sync_helper(
+    app, db_session, create_user, create_organization, create_user_organization
+):
+    user = create_user(username="async-member", email="async-member@example.com")
+    org = create_organization(name="Async Org")
+    create_user_organization(user_id=user.id, organization_id=org.id)
+
+    async def fetch():
+        async with db.AsyncSessionLocal() as session:
+            return await org_db.fetch_active_organization_ids(session, str(user.id))
+
+    assert asyncio.run(fetch()) == [str(org.id)]
+    assert org_db.active_organization_ids(db_session, str(user.id)) == [str(org.id)]
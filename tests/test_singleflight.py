@@ -0,0 +1,195 @@
+import threading
+import time
+
+import pytest
+
+from application.metrics import METRICS
+from application.singleflight import SingleFlight
+
+
+def _run_concurrently(flight, key, fn, count):
+    results = []
+    errors = []
+
+    def worker():
+        try:
+            results.append(flight.do(key, fn))
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=worker) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, errors
+
+
+def test_concurrent_calls_share_one_execution():
+    METRICS.reset()
+    flight = SingleFlight("test-share")
+    calls = []
+
+    def slow():
+        calls.append(1)
+        time.sleep(0.1)
+        return "answer"
+
+    results, errors = _run_concurrently(flight, "key", slow, 5)
+
+    assert errors == []
+    assert results == ["answer"] * 5
+    assert len(calls) == 1
+    counters = METRICS.snapshot()["counters"]
+    assert counters["singleflight.test-share.executed"] == 1
+    assert counters["singleflight.test-share.shared"] == 4
+
+
+def test_errors_are_shared_and_not_remembered():
+    flight = SingleFlight("test-error")
+
+    def failing():
+        time.sleep(0.05)
+        raise ValueError("boom")
+
+    results, errors = _run_concurrently(flight, "key", failing, 3)
+
+    assert results == []
+    assert len(errors) == 3
+    assert all(isinstance(error, ValueError) for error in errors)
+    assert flight.do("key", lambda: "recovered") == "recovered"
+
+
+def test_waiter_times_out():
+    flight = SingleFlight("test-timeout")
+    started = threading.Event()
+    release = threading.Event()
+
+    def blocking():
+        started.set()
+        release.wait(1)
+        return "late"
+
+    leader = threading.Thread(target=flight.do, args=("key", blocking))
+    leader.start()
+    started.wait(1)
+    with pytest.raises(TimeoutError):
+        flight.do("key", lambda: "unused", timeout=0.01)
+    release.set()
+    leader.join()
+
+
+def test_rag_client_coalesces_equivalent_query_embeddings(monkeypatch):
+    from ai import rag
+
+    calls = []
+    release = threading.Event()
+
+    def fake_call_embed(self, texts, input_type):
+        calls.append(texts)
+        release.wait(1)
+        return [[1.0, 0.0]]
+
+    monkeypatch.setattr(rag.RAGClient, "_call_embed", fake_call_embed)
+    client = rag.RAGClient(embed_model="test-model")
+    results = []
+    questions = ["How many sick days?", "how many  sick days", "HOW MANY SICK DAYS?"]
+    threads = [
+        threading.Thread(target=lambda q=q: results.append(client.embed_queries([q])))
+        for q in questions
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == [[[1.0, 0.0]]] * 3
+
+
+def _ask_concurrently(monkeypatch, askers, personal):
+    from types import SimpleNamespace
+
+    from ai import agent as agent_module
+
+    asked = []
+    release = threading.Event()
+
+    class FakeRAGClient:
+        embed_model = "test-model"
+
+        def query_policy_index(
+            self, query, top_k=5, organization_ids=None, query_vector=None
+        ):
+            return [{"policy_name": "Leave", "chunk_index": 0, "text": "10 sick days"}]
+
+    class FakeCohereClient:
+        def __init__(self, message=None, model=None, user_id=None):
+            self.user_id = user_id
+            self.context = SimpleNamespace(organization_ids=["org-1"])
+            self.function_map = {
+                "get_my_pending_leaves": lambda: {"user": user_id, "sick": 3}
+            }
+
+        def ask_llm(self, message=None, chat_history=None, max_steps=8):
+            asked.append(self.user_id)
+            release.wait(1)
+            if personal:
+                balance = self.function_map["get_my_pending_leaves"]()
+                answer = f"{balance['user']} has {balance['sick']} sick days left."
+            else:
+                answer = "Employees get 10 sick days."
+            return answer, [
+                {"role": "USER", "message": message},
+                {"role": "CHATBOT", "message": answer},
+            ]
+
+    monkeypatch.setenv("AI_COALESCE_ANSWERS", "true")
+    monkeypatch.setattr(agent_module, "RAGClient", FakeRAGClient)
+    monkeypatch.setattr(agent_module, "CohereClient", FakeCohereClient)
+    responses = {}
+
+    def ask(name, user_id):
+        agent = agent_module.PolicyAgent("How many sick leave days?", user_id=user_id)
+        responses[name] = agent.run()["response"]
+
+    threads = [
+        threading.Thread(target=ask, args=(name, user_id)) for name, user_id in askers
+    ]
+    # The first asker leads the flight; the others join while it runs.
+    threads[0].start()
+    while not asked:
+        time.sleep(0.01)
+    for thread in threads[1:]:
+        thread.start()
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join()
+    return asked, responses
+
+
+def test_concurrent_answers_are_shared_across_users(monkeypatch):
+    asked, responses = _ask_concurrently(
+        monkeypatch, [("alice", "alice"), ("bob", "bob"), ("carol", "carol")], False
+    )
+
+    assert len(asked) == 1
+    assert set(responses.values()) == {"Employees get 10 sick days."}
+
+
+def test_personal_answers_are_only_shared_by_the_same_user(monkeypatch):
+    asked, responses = _ask_concurrently(
+        monkeypatch,
+        [("alice", "alice"), ("alice-again", "alice"), ("bob", "bob")],
+        True,
+    )
+
+    assert sorted(asked) == ["alice", "bob"]
+    assert responses == {
+        "alice": "alice has 3 sick days left.",
+        "alice-again": "alice has 3 sick days left.",
+        "bob": "bob has 3 sick days left.",
+    }
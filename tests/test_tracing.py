@@ -0,0 +1,107 @@
+from types import SimpleNamespace
+
+import pytest
+
+from application import tracing
+from application.tracing import InMemoryExporter, start_span
+
+
+@pytest.fixture()
+def spans(monkeypatch):
+    exporter = InMemoryExporter()
+    monkeypatch.setattr(tracing.TRACER, "exporter", exporter)
+    return exporter
+
+
+def test_spans_nest_and_record_errors(spans):
+    with pytest.raises(ValueError):
+        with start_span("outer", step=1) as outer:
+            with start_span("inner") as inner:
+                inner.set_attribute("items", 3)
+            raise ValueError("boom")
+
+    inner_span, outer_span = spans.spans
+    assert inner_span.parent_id == outer.span_id
+    assert inner_span.trace_id == outer_span.trace_id
+    assert inner_span.attributes == {"items": 3}
+    assert outer_span.status == "error"
+    assert outer_span.error == "ValueError: boom"
+    assert outer_span.duration_ms >= inner_span.duration_ms
+
+
+def test_spans_are_noops_when_tracing_is_off(monkeypatch):
+    monkeypatch.setattr(tracing.TRACER, "exporter", None)
+    with start_span("ignored") as span:
+        span.set_attribute("key", "value")
+    assert span is tracing.NOOP_SPAN
+
+
+def test_request_id_is_echoed_and_correlates_spans(client, spans):
+    request_id = "0af7651916cd43dd8448eb211c80319c"
+
+    response = client.get("/health", headers={"X-Request-ID": request_id})
+
+    assert response.headers["X-Request-ID"] == request_id
+    (root,) = spans.find("http.request")
+    assert root.trace_id == request_id
+    assert root.request_id == request_id
+    assert root.attributes["http.path"] == "/health"
+    assert root.attributes["http.status_code"] == 200
+
+
+def test_request_id_is_generated_when_missing(client, spans):
+    response = client.get("/health")
+
+    assert len(response.headers["X-Request-ID"]) == 32
+    assert spans.find("http.request")[0].request_id == response.headers["X-Request-ID"]
+
+
+def test_sql_statements_are_traced(app, create_user, spans):
+    create_user(username="traced-user", email="traced@example.com")
+
+    statements = [span.attributes["db.statement"] for span in spans.find("db.query")]
+    assert any(statement.startswith("INSERT INTO users") for statement in statements)
+
+
+def test_chat_and_tool_spans_carry_tokens_and_sizes(spans):
+    from ai.clients import CohereClient
+
+    responses = [
+        SimpleNamespace(
+            text="",
+            tool_calls=[
+                SimpleNamespace(name="get_organization_details", parameters={})
+            ],
+            meta=SimpleNamespace(
+                billed_units=SimpleNamespace(input_tokens=40, output_tokens=5)
+            ),
+        ),
+        SimpleNamespace(
+            text="Acme is in Berlin.",
+            tool_calls=None,
+            meta=SimpleNamespace(
+                billed_units=SimpleNamespace(input_tokens=90, output_tokens=7)
+            ),
+        ),
+    ]
+    client = CohereClient(user_id=None)
+    client.client = SimpleNamespace(chat=lambda **kwargs: responses.pop(0))
+    client.function_map["get_organization_details"] = lambda **kwargs: {
+        "city": "Berlin"
+    }
+
+    with start_span("agent.run"):
+        text, _ = client.ask_llm(message="Where is Acme?")
+
+    assert text == "Acme is in Berlin."
+    first_chat, second_chat = spans.find("llm.chat")
+    assert (
+        first_chat.attributes["input_tokens"],
+        first_chat.attributes["output_tokens"],
+    ) == (40, 5)
+    assert second_chat.attributes["tool_results_bytes"] > 0
+    (tool_span,) = spans.find("tool.call")
+    assert tool_span.attributes["tool"] == "get_organization_details"
+    assert tool_span.attributes["output_bytes"] == len('{"city": "Berlin"}')
+    (root,) = spans.find("agent.run")
+    assert {first_chat.parent_id, tool_span.parent_id} == {root.span_id}
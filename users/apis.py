@@ -1,11 +1,15 @@
 from datetime import datetime
 
 from fastapi import Depends, HTTPException, Request
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from ai.context import invalidate_agent_context
 from application.app import app
-from auth.passwords import hash_password
+from auth.passwords import hash_password_async
+from auth.principals import PRINCIPALS, principal_organization_ids
 from database.db import drop_leave_requests_table, drop_users_table, get_db
+from organizations.db import format_leave_balances, leave_balances_statement
 from organizations.models import (
     Organization,
     UserOrganization,
@@ -14,6 +18,8 @@ from organizations.models import (
 )
 from users.choices import UserType
 from users.models import (
+    LeaveBalanceItem,
+    LeaveBalancesResponse,
     LeaveRequest,
     LeaveRequestCreate,
     LeaveRequestItem,
@@ -37,10 +43,10 @@ from users.utils import (
 @app.get("/users", response_model=UsersListResponse)
 async def get_users(
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     require_admin(request.user.user_type)
-    rows = db.query(User).order_by(User.created.desc()).all()
+    rows = (await db.scalars(select(User).order_by(User.created.desc()))).all()
     users = [
         UserItem(
             id=str(row.id),
@@ -68,12 +74,12 @@ async def get_users(
 async def get_user(
     user_id: str,
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     current_user = require_authenticated_user(request)
     if current_user.user_id != user_id:
         raise HTTPException(status_code=403, detail="User access restricted")
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.scalar(select(User).where(User.id == user_id))
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return UserItem(
@@ -90,21 +96,22 @@ async def get_user(
 
 
 @app.get("/users/{user_id}/organizations", response_model=UserOrganizationsListResponse)
-async def get_organizations_for_user(user_id: str, db: Session = Depends(get_db)):
+async def get_organizations_for_user(user_id: str, db: AsyncSession = Depends(get_db)):
     """Get all organizations a user belongs to."""
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.scalar(select(User).where(User.id == user_id))
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
     rows = (
-        db.query(UserOrganization)
-        .filter(UserOrganization.user_id == user_id)
-        .order_by(UserOrganization.joined_date.desc())
-        .all()
-    )
+        await db.scalars(
+            select(UserOrganization)
+            .where(UserOrganization.user_id == user_id)
+            .order_by(UserOrganization.joined_date.desc())
+        )
+    ).all()
     memberships = []
     for row in rows:
-        org = db.query(Organization).filter(Organization.id == row.organization_id).first()
+        org = await db.scalar(select(Organization).where(Organization.id == row.organization_id))
         memberships.append(
             UserOrganizationItem(
                 id=str(row.id),
@@ -128,24 +135,24 @@ async def get_organizations_for_user(user_id: str, db: Session = Depends(get_db)
 
 
 @app.post("/users", response_model=UserResponse)
-async def create_user(user: UserRequest, db: Session = Depends(get_db)):
+async def create_user(user: UserRequest, db: AsyncSession = Depends(get_db)):
     username_lower = user.username.lower()
     email_lower = (user.email or "").strip().lower()
 
-    existing_by_username = db.query(User).filter(User.username == username_lower).first()
+    existing_by_username = await db.scalar(select(User).where(User.username == username_lower))
     if existing_by_username:
         raise HTTPException(
             status_code=409,
             detail="A user with this username already exists",
         )
 
-    if email_lower and db.query(User).filter(User.email == email_lower).first():
+    if email_lower and await db.scalar(select(User).where(User.email == email_lower)):
         raise HTTPException(
             status_code=409,
             detail="A user with this email already exists",
         )
 
-    password_hash = hash_password(user.password)
+    password_hash = await hash_password_async(user.password)
     new_user = User(
         first_name=user.first_name.lower(),
         last_name=user.last_name.lower(),
@@ -158,8 +165,8 @@ async def create_user(user: UserRequest, db: Session = Depends(get_db)):
         user_type=user.user_type,
     )
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
 
     return UserResponse(
         id=str(new_user.id),
@@ -175,18 +182,20 @@ async def create_user(user: UserRequest, db: Session = Depends(get_db)):
 
 
 @app.delete("/users/{user_id}")
-async def delete_user(user_id: str, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == user_id).first()
+async def delete_user(user_id: str, db: AsyncSession = Depends(get_db)):
+    user = await db.scalar(select(User).where(User.id == user_id))
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    db.delete(user)
-    db.commit()
+    await db.delete(user)
+    await db.commit()
+    invalidate_agent_context(user_id)
     return {"status": "ok", "message": "User deleted"}
 
 
 @app.delete("/admin/drop-users-db")
 async def drop_users_db_table():
     drop_users_table()
+    PRINCIPALS.clear()
     return {"status": "ok", "message": "Users database table dropped"}
 
 
@@ -194,22 +203,23 @@ async def drop_users_db_table():
 @app.get("/leave_requests", response_model=LeaveRequestsListResponse)
 async def get_leave_requests(
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     """Get all leave requests. Admin sees all, regular users see only their own."""
     current_user = require_authenticated_user(request)
 
     if coerce_user_type(current_user.user_type) == UserType.ADMIN:
-        rows = db.query(LeaveRequest).order_by(LeaveRequest.applied_at.desc()).all()
+        rows = (await db.scalars(select(LeaveRequest).order_by(LeaveRequest.applied_at.desc()))).all()
     else:
         rows = (
-            db.query(LeaveRequest)
-            .filter(LeaveRequest.user_id == current_user.user_id)
-            .order_by(LeaveRequest.applied_at.desc())
-            .all()
-        )
+            await db.scalars(
+                select(LeaveRequest)
+                .where(LeaveRequest.user_id == current_user.user_id)
+                .order_by(LeaveRequest.applied_at.desc())
+            )
+        ).all()
 
-    leave_requests = [build_leave_request_item(row, db) for row in rows]
+    leave_requests = [await build_leave_request_item(row, db) for row in rows]
 
     total = len(leave_requests)
     message = "No leave requests found" if total == 0 else "Leave requests retrieved"
@@ -220,16 +230,38 @@ async def get_leave_requests(
     )
 
 
+@app.get("/leave_balances", response_model=LeaveBalancesResponse)
+async def get_leave_balances(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+):
+    """Get the current user's leave balances for this year, from extracted policy allowances."""
+    current_user = require_authenticated_user(request)
+
+    year = datetime.now().year
+    rows = (await db.execute(leave_balances_statement(current_user.user_id))).all()
+    balances = [LeaveBalanceItem(**item) for item in format_leave_balances(rows)]
+
+    total = len(balances)
+    message = "No leave allowances found" if total == 0 else "Leave balances retrieved"
+    return LeaveBalancesResponse(
+        balances=balances,
+        year=year,
+        total=total,
+        message=message,
+    )
+
+
 @app.get("/leave_requests/{leave_request_id}", response_model=LeaveRequestItem)
 async def get_leave_request(
     leave_request_id: str,
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     """Get a specific leave request."""
     current_user = require_authenticated_user(request)
 
-    leave_request = db.query(LeaveRequest).filter(LeaveRequest.id == leave_request_id).first()
+    leave_request = await db.scalar(select(LeaveRequest).where(LeaveRequest.id == leave_request_id))
     if not leave_request:
         raise HTTPException(status_code=404, detail="Leave request not found")
 
@@ -240,30 +272,31 @@ async def get_leave_request(
     ):
         raise HTTPException(status_code=403, detail="Access denied")
 
-    return build_leave_request_item(leave_request, db)
+    return await build_leave_request_item(leave_request, db)
 
 
 @app.get("/organizations/{organization_id}/leave_requests", response_model=LeaveRequestsListResponse)
 async def get_organization_leave_requests(
     organization_id: str,
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     """Get all leave requests for an organization. Admin only."""
     require_admin(request.user.user_type)
 
-    org = db.query(Organization).filter(Organization.id == organization_id).first()
+    org = await db.scalar(select(Organization).where(Organization.id == organization_id))
     if not org:
         raise HTTPException(status_code=404, detail="Organization not found")
 
     rows = (
-        db.query(LeaveRequest)
-        .filter(LeaveRequest.organization_id == organization_id)
-        .order_by(LeaveRequest.applied_at.desc())
-        .all()
-    )
+        await db.scalars(
+            select(LeaveRequest)
+            .where(LeaveRequest.organization_id == organization_id)
+            .order_by(LeaveRequest.applied_at.desc())
+        )
+    ).all()
 
-    leave_requests = [build_leave_request_item(row, db) for row in rows]
+    leave_requests = [await build_leave_request_item(row, db) for row in rows]
 
     total = len(leave_requests)
     message = "No leave requests found" if total == 0 else "Leave requests retrieved"
@@ -278,40 +311,43 @@ async def get_organization_leave_requests(
 async def apply_leave_request(
     leave_request: LeaveRequestCreate,
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     """Apply for a leave request. User must be a member of the organization."""
     current_user = require_authenticated_user(request)
 
     # Verify organization exists
-    org = db.query(Organization).filter(Organization.id == leave_request.organization_id).first()
+    org = await db.scalar(select(Organization).where(Organization.id == leave_request.organization_id))
     if not org:
         raise HTTPException(status_code=404, detail="Organization not found")
 
     # Verify user is an active member of the organization
-    membership = (
-        db.query(UserOrganization)
-        .filter(
-            UserOrganization.user_id == current_user.user_id,
-            UserOrganization.organization_id == leave_request.organization_id,
-            UserOrganization.is_active.is_(True),
+    claimed = principal_organization_ids(current_user.user_id)
+    if claimed is not None:
+        is_member = str(leave_request.organization_id) in claimed
+    else:
+        is_member = (
+            await db.scalar(
+                select(UserOrganization).where(
+                    UserOrganization.user_id == current_user.user_id,
+                    UserOrganization.organization_id == leave_request.organization_id,
+                    UserOrganization.is_active.is_(True),
+                )
+            )
+            is not None
         )
-        .first()
-    )
-    if not membership:
+    if not is_member:
         raise HTTPException(
             status_code=403, detail="You are not an active member of this organization"
         )
 
     # Check if user already has a leave request for the same date in this organization
-    existing = (
-        db.query(LeaveRequest)
-        .filter(
+    existing = await db.scalar(
+        select(LeaveRequest).where(
             LeaveRequest.user_id == current_user.user_id,
             LeaveRequest.organization_id == leave_request.organization_id,
             LeaveRequest.date == leave_request.date.date(),
         )
-        .first()
     )
     if existing:
         raise HTTPException(
@@ -327,8 +363,8 @@ async def apply_leave_request(
         is_accepted=False,
     )
     db.add(new_leave_request)
-    db.commit()
-    db.refresh(new_leave_request)
+    await db.commit()
+    await db.refresh(new_leave_request)
 
     return LeaveRequestResponse(
         id=str(new_leave_request.id),
@@ -350,20 +386,20 @@ async def review_leave_request(
     leave_request_id: str,
     review: LeaveRequestReview,
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     """Review (accept/reject) a leave request. Admin only."""
     require_admin(request.user.user_type)
 
-    leave_request = db.query(LeaveRequest).filter(LeaveRequest.id == leave_request_id).first()
+    leave_request = await db.scalar(select(LeaveRequest).where(LeaveRequest.id == leave_request_id))
     if not leave_request:
         raise HTTPException(status_code=404, detail="Leave request not found")
 
     leave_request.is_accepted = review.is_accepted
     leave_request.reviewed_by = request.user.user_id
     leave_request.reviewed_at = datetime.now()
-    db.commit()
-    db.refresh(leave_request)
+    await db.commit()
+    await db.refresh(leave_request)
 
     return LeaveRequestResponse(
         id=str(leave_request.id),
@@ -384,12 +420,12 @@ async def review_leave_request(
 async def delete_leave_request(
     leave_request_id: str,
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     """Delete a leave request. Users can delete their own, admins can delete any."""
     current_user = require_authenticated_user(request)
 
-    leave_request = db.query(LeaveRequest).filter(LeaveRequest.id == leave_request_id).first()
+    leave_request = await db.scalar(select(LeaveRequest).where(LeaveRequest.id == leave_request_id))
     if not leave_request:
         raise HTTPException(status_code=404, detail="Leave request not found")
 
@@ -400,8 +436,8 @@ async def delete_leave_request(
     ):
         raise HTTPException(status_code=403, detail="Access denied")
 
-    db.delete(leave_request)
-    db.commit()
+    await db.delete(leave_request)
+    await db.commit()
     return {"status": "ok", "message": "Leave request deleted"}
 
 
@@ -2,7 +2,17 @@ import uuid
 from datetime import datetime
 
 from pydantic import BaseModel
-from sqlalchemy import Boolean, Column, Date, DateTime, Enum, ForeignKey, String, Text
+from sqlalchemy import (
+    Boolean,
+    Column,
+    Date,
+    DateTime,
+    Enum,
+    ForeignKey,
+    Integer,
+    String,
+    Text,
+)
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -26,6 +36,9 @@ class User(Base):
         Enum(UserType, name="user_type"), nullable=False, default=UserType.REGULAR
     )
     date_of_birth = Column(Date, nullable=False)
+    # Bumped whenever the user's organization memberships change, so tokens carrying
+    # membership claims can be recognised as stale.
+    membership_version = Column(Integer, nullable=False, default=0, server_default="0")
     created = Column(DateTime(timezone=True), server_default=func.now())
     modified = Column(DateTime(timezone=True), onupdate=func.now())
 
@@ -145,3 +158,19 @@ class LeaveRequestsListResponse(BaseModel):
 
 class LeaveRequestReview(BaseModel):
     is_accepted: bool
+
+
+class LeaveBalanceItem(BaseModel):
+    organization_id: str
+    organization_name: str | None = None
+    leave_type: LeaveType
+    allowed_days: float
+    used_days: int
+    remaining_days: float
+
+
+class LeaveBalancesResponse(BaseModel):
+    balances: list[LeaveBalanceItem]
+    year: int
+    total: int
+    message: str
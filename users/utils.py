@@ -1,5 +1,5 @@
 from fastapi import HTTPException, Request
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from organizations.models import Organization
 from users.choices import UserType
@@ -28,11 +28,11 @@ def require_authenticated_user(request: Request):
     return request.user
 
 
-def build_leave_request_item(row, db: Session) -> LeaveRequestItem:
+async def build_leave_request_item(row, db: AsyncSession) -> LeaveRequestItem:
     """Build LeaveRequestItem from a LeaveRequest row."""
-    user = db.query(User).filter(User.id == row.user_id).first()
-    org = db.query(Organization).filter(Organization.id == row.organization_id).first()
-    reviewer = db.query(User).filter(User.id == row.reviewed_by).first() if row.reviewed_by else None
+    user = await db.get(User, row.user_id)
+    org = await db.get(Organization, row.organization_id)
+    reviewer = await db.get(User, row.reviewed_by) if row.reviewed_by else None
     return LeaveRequestItem(
         id=str(row.id),
         user_id=str(row.user_id),